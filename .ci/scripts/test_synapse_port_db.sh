@@ -33,6 +33,13 @@ poetry run synapse_port_db --sqlite-database .ci/test_db.db --postgres-config .c
 echo "+++ Run synapse_port_db a second time"
 poetry run synapse_port_db --sqlite-database .ci/test_db.db --postgres-config .ci/postgres-config.yaml
 
+# Port again into a fresh database, this time streaming rows with COPY.
+echo "+++ Run synapse_port_db using COPY"
+psql \
+  -c "DROP DATABASE synapse" \
+  -c "CREATE DATABASE synapse"
+poetry run synapse_port_db --sqlite-database .ci/test_db.db --postgres-config .ci/postgres-config.yaml --use-copy --sqlite-connections 4
+
 #####
 
 # Now do the same again, on an empty database.
@@ -18,6 +18,8 @@ def build(setup_kwargs: Dict[str, Any]) -> None:
         # We force always building in release mode, as we can't tell the
         # difference between using `poetry` in development vs production.
         debug=False,
+        # Optional Cargo features to build, e.g. `native-lru-cache`.
+        features=os.environ.get("SYNAPSE_RUST_FEATURES", "").split(),
     )
     setup_kwargs.setdefault("rust_extensions", []).append(extension)
     setup_kwargs["zip_safe"] = False
@@ -2,6 +2,8 @@ use lazy_static::lazy_static;
 use pyo3::prelude::*;
 use pyo3_log::ResetHandle;
 
+#[cfg(feature = "native-lru-cache")]
+pub mod lru_cache;
 pub mod push;
 
 lazy_static! {
@@ -38,6 +40,8 @@ fn synapse_rust(py: Python<'_>, m: &PyModule) -> PyResult<()> {
     m.add_function(wrap_pyfunction!(get_rust_file_digest, m)?)?;
     m.add_function(wrap_pyfunction!(reset_logging_config, m)?)?;
 
+    #[cfg(feature = "native-lru-cache")]
+    lru_cache::register_module(py, m)?;
     push::register_module(py, m)?;
 
     Ok(())
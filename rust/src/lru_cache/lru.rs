@@ -0,0 +1,383 @@
+// Copyright 2023 The Matrix.org Foundation C.I.C.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+//! A least-recently-used map.
+//!
+//! Entries are stored in a single `Vec`, and the recency list is threaded
+//! through the entries using indices into that `Vec`, so adding an entry
+//! doesn't need any allocations beyond (amortised) growth of the `Vec` and the
+//! hash map, and moving an entry to the front of the list doesn't need to
+//! follow any pointers other than those of its neighbours.
+
+use std::borrow::Borrow;
+use std::collections::HashMap;
+use std::hash::Hash;
+
+/// Marks the end of the recency list.
+const NIL: usize = usize::MAX;
+
+struct Entry<K, V> {
+    key: K,
+    value: V,
+    /// The size of the entry, as counted towards `Lru::total_size`.
+    size: usize,
+    /// The time the entry was last accessed, in whatever units the caller
+    /// uses. Entries are ordered by this in the recency list.
+    last_access: u64,
+    /// The index of the next most recently used entry, or `NIL`.
+    newer: usize,
+    /// The index of the next least recently used entry, or `NIL`.
+    older: usize,
+}
+
+/// A map which keeps track of the order in which its entries were used.
+pub struct Lru<K, V> {
+    map: HashMap<K, usize>,
+    /// Storage for the entries. Vacant slots are listed in `free`.
+    slots: Vec<Option<Entry<K, V>>>,
+    free: Vec<usize>,
+    /// The most recently used entry.
+    newest: usize,
+    /// The least recently used entry.
+    oldest: usize,
+    total_size: usize,
+}
+
+impl<K: Hash + Eq + Clone, V> Default for Lru<K, V> {
+    fn default() -> Self {
+        Self::new()
+    }
+}
+
+impl<K: Hash + Eq + Clone, V> Lru<K, V> {
+    pub fn new() -> Self {
+        Lru {
+            map: HashMap::new(),
+            slots: Vec::new(),
+            free: Vec::new(),
+            newest: NIL,
+            oldest: NIL,
+            total_size: 0,
+        }
+    }
+
+    /// The number of entries.
+    pub fn len(&self) -> usize {
+        self.map.len()
+    }
+
+    pub fn is_empty(&self) -> bool {
+        self.map.is_empty()
+    }
+
+    /// The sum of the sizes of the entries.
+    pub fn total_size(&self) -> usize {
+        self.total_size
+    }
+
+    /// The last access time of the least recently used entry.
+    pub fn oldest_access(&self) -> Option<u64> {
+        if self.oldest == NIL {
+            return None;
+        }
+        Some(self.entry(self.oldest).last_access)
+    }
+
+    pub fn contains_key<Q>(&self, key: &Q) -> bool
+    where
+        K: Borrow<Q>,
+        Q: Hash + Eq + ?Sized,
+    {
+        self.map.contains_key(key)
+    }
+
+    /// Look up an entry. If `touch` is set, the entry is marked as the most
+    /// recently used, as of `now`.
+    pub fn get_mut<Q>(&mut self, key: &Q, touch: bool, now: u64) -> Option<&mut V>
+    where
+        K: Borrow<Q>,
+        Q: Hash + Eq + ?Sized,
+    {
+        let index = *self.map.get(key)?;
+        if touch {
+            self.touch(index, now);
+        }
+        Some(&mut self.entry_mut(index).value)
+    }
+
+    /// Change the size of an existing entry. Returns whether there is such an
+    /// entry.
+    pub fn set_size<Q>(&mut self, key: &Q, size: usize) -> bool
+    where
+        K: Borrow<Q>,
+        Q: Hash + Eq + ?Sized,
+    {
+        let index = match self.map.get(key) {
+            Some(index) => *index,
+            None => return false,
+        };
+
+        let entry = self.entry_mut(index);
+        let old_size = std::mem::replace(&mut entry.size, size);
+        self.total_size = self.total_size - old_size + size;
+
+        true
+    }
+
+    /// Insert a new entry as the most recently used. The key must not already
+    /// be present.
+    pub fn insert_new(&mut self, key: K, value: V, size: usize, now: u64) {
+        debug_assert!(!self.map.contains_key(&key));
+
+        let entry = Entry {
+            key: key.clone(),
+            value,
+            size,
+            last_access: now,
+            newer: NIL,
+            older: NIL,
+        };
+
+        let index = match self.free.pop() {
+            Some(index) => {
+                self.slots[index] = Some(entry);
+                index
+            }
+            None => {
+                self.slots.push(Some(entry));
+                self.slots.len() - 1
+            }
+        };
+
+        self.map.insert(key, index);
+        self.total_size += size;
+        self.push_newest(index);
+    }
+
+    /// Remove an entry, returning its key, value and size.
+    pub fn remove<Q>(&mut self, key: &Q) -> Option<(K, V, usize)>
+    where
+        K: Borrow<Q>,
+        Q: Hash + Eq + ?Sized,
+    {
+        let index = self.map.remove(key)?;
+        Some(self.remove_index(index))
+    }
+
+    /// Remove the least recently used entry.
+    pub fn pop_oldest(&mut self) -> Option<(K, V, usize)> {
+        if self.oldest == NIL {
+            return None;
+        }
+
+        let (key, value, size) = self.remove_index(self.oldest);
+        self.map.remove(&key);
+        Some((key, value, size))
+    }
+
+    /// Remove the least recently used entry, if it was last accessed at or
+    /// before `cutoff`.
+    pub fn pop_accessed_by(&mut self, cutoff: u64) -> Option<(K, V, usize)> {
+        if self.oldest == NIL || self.entry(self.oldest).last_access > cutoff {
+            return None;
+        }
+        self.pop_oldest()
+    }
+
+    /// Remove all the entries, returning them in no particular order.
+    pub fn drain(&mut self) -> Vec<(K, V)> {
+        self.map.clear();
+        self.free.clear();
+        self.newest = NIL;
+        self.oldest = NIL;
+        self.total_size = 0;
+
+        self.slots
+            .drain(..)
+            .flatten()
+            .map(|entry| (entry.key, entry.value))
+            .collect()
+    }
+
+    fn entry(&self, index: usize) -> &Entry<K, V> {
+        self.slots[index]
+            .as_ref()
+            .expect("LRU list refers to a vacant slot")
+    }
+
+    fn entry_mut(&mut self, index: usize) -> &mut Entry<K, V> {
+        self.slots[index]
+            .as_mut()
+            .expect("LRU list refers to a vacant slot")
+    }
+
+    /// Take the entry at `index` out of the list and its slot. The caller is
+    /// responsible for removing it from `map`.
+    fn remove_index(&mut self, index: usize) -> (K, V, usize) {
+        self.unlink(index);
+
+        let entry = self.slots[index]
+            .take()
+            .expect("LRU list refers to a vacant slot");
+        self.free.push(index);
+        self.total_size -= entry.size;
+
+        (entry.key, entry.value, entry.size)
+    }
+
+    fn touch(&mut self, index: usize, now: u64) {
+        self.entry_mut(index).last_access = now;
+        if self.newest != index {
+            self.unlink(index);
+            self.push_newest(index);
+        }
+    }
+
+    fn unlink(&mut self, index: usize) {
+        let (newer, older) = {
+            let entry = self.entry(index);
+            (entry.newer, entry.older)
+        };
+
+        if newer == NIL {
+            self.newest = older;
+        } else {
+            self.entry_mut(newer).older = older;
+        }
+
+        if older == NIL {
+            self.oldest = newer;
+        } else {
+            self.entry_mut(older).newer = newer;
+        }
+
+        let entry = self.entry_mut(index);
+        entry.newer = NIL;
+        entry.older = NIL;
+    }
+
+    fn push_newest(&mut self, index: usize) {
+        let previous_newest = self.newest;
+
+        let entry = self.entry_mut(index);
+        entry.newer = NIL;
+        entry.older = previous_newest;
+
+        if previous_newest == NIL {
+            self.oldest = index;
+        } else {
+            self.entry_mut(previous_newest).newer = index;
+        }
+        self.newest = index;
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::Lru;
+
+    fn keys_oldest_first(lru: &mut Lru<&'static str, u32>) -> Vec<&'static str> {
+        let mut keys = Vec::new();
+        while let Some((key, _, _)) = lru.pop_oldest() {
+            keys.push(key);
+        }
+        keys
+    }
+
+    #[test]
+    fn test_insert_and_get() {
+        let mut lru = Lru::new();
+        lru.insert_new("a", 1, 1, 0);
+        lru.insert_new("b", 2, 3, 0);
+
+        assert_eq!(lru.len(), 2);
+        assert_eq!(lru.total_size(), 4);
+        assert_eq!(lru.get_mut("a", true, 0).copied(), Some(1));
+        assert_eq!(lru.get_mut("c", true, 0).copied(), None);
+        assert!(lru.contains_key("b"));
+    }
+
+    #[test]
+    fn test_order() {
+        let mut lru = Lru::new();
+        lru.insert_new("a", 1, 1, 0);
+        lru.insert_new("b", 2, 1, 0);
+        lru.insert_new("c", 3, 1, 0);
+
+        // Touching moves to the front, peeking doesn't.
+        lru.get_mut("a", true, 0);
+        lru.get_mut("b", false, 0);
+
+        assert_eq!(keys_oldest_first(&mut lru), vec!["b", "c", "a"]);
+        assert!(lru.is_empty());
+        assert_eq!(lru.total_size(), 0);
+    }
+
+    #[test]
+    fn test_set_size() {
+        let mut lru = Lru::new();
+        lru.insert_new("a", 1, 1, 0);
+        lru.insert_new("b", 2, 1, 0);
+
+        assert!(lru.set_size("a", 5));
+        assert!(!lru.set_size("c", 5));
+        assert_eq!(lru.total_size(), 6);
+
+        // Changing the size doesn't count as a use.
+        assert_eq!(keys_oldest_first(&mut lru), vec!["a", "b"]);
+    }
+
+    #[test]
+    fn test_remove_reuses_slots() {
+        let mut lru = Lru::new();
+        lru.insert_new("a", 1, 1, 0);
+        lru.insert_new("b", 2, 1, 0);
+        lru.insert_new("c", 3, 1, 0);
+
+        assert_eq!(lru.remove("b"), Some(("b", 2, 1)));
+        assert_eq!(lru.remove("b"), None);
+        lru.insert_new("d", 4, 1, 0);
+        assert_eq!(lru.slots.len(), 3);
+
+        assert_eq!(keys_oldest_first(&mut lru), vec!["a", "c", "d"]);
+    }
+
+    #[test]
+    fn test_pop_accessed_by() {
+        let mut lru = Lru::new();
+        lru.insert_new("a", 1, 1, 10);
+        lru.insert_new("b", 2, 1, 20);
+        lru.insert_new("c", 3, 1, 30);
+        lru.get_mut("a", true, 40);
+        assert_eq!(lru.oldest_access(), Some(20));
+
+        assert_eq!(lru.pop_accessed_by(20), Some(("b", 2, 1)));
+        assert_eq!(lru.pop_accessed_by(25), None);
+        assert_eq!(lru.len(), 2);
+    }
+
+    #[test]
+    fn test_drain() {
+        let mut lru = Lru::new();
+        lru.insert_new("a", 1, 1, 0);
+        lru.insert_new("b", 2, 1, 0);
+        lru.remove("a");
+
+        assert_eq!(lru.drain(), vec![("b", 2)]);
+        assert!(lru.is_empty());
+
+        lru.insert_new("c", 3, 1, 0);
+        assert_eq!(keys_oldest_first(&mut lru), vec!["c"]);
+    }
+}
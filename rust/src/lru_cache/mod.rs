@@ -0,0 +1,732 @@
+// Copyright 2023 The Matrix.org Foundation C.I.C.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+//! A native store for the entries of
+//! `synapse.util.caches.lrucache.LruCache`, used when `caches.native_lru_cache`
+//! is enabled.
+//!
+//! `LruCache` keeps the metrics, the size callback and the maximum size, and
+//! calls into `NativeLruCache` to store, look up and evict the entries.
+//!
+//! `LruCache` doesn't hold a lock around calls into the cache, so we rely on
+//! the GIL being held for the whole of each call. That means that we must
+//! never run Python code from here, as the interpreter may switch threads
+//! while running it:
+//!
+//! * We only accept keys which are built from the builtin types listed in
+//!   `is_plain_key`, whose hashing and comparison are implemented in C. Any
+//!   other key raises `UnsupportedKeyError`, and `LruCache` moves the entries
+//!   into the Python implementation instead.
+//! * Callbacks are compared by identity, or for bound methods, by the identity
+//!   of their function and instance, rather than with `==`.
+//! * We never call the entries' invalidation callbacks, or drop the values of
+//!   removed entries, as either could run arbitrary Python code. Instead, they
+//!   are returned to `LruCache`.
+
+use std::collections::HashMap;
+use std::hash::{Hash, Hasher};
+
+use pyo3::basic::CompareOp;
+use pyo3::exceptions::{PyTypeError, PyValueError};
+use pyo3::once_cell::GILOnceCell;
+use pyo3::prelude::*;
+use pyo3::types::{
+    PyBool, PyBytes, PyFloat, PyFrozenSet, PyList, PyLong, PySet, PyString, PyTuple, PyType,
+};
+use pyo3::{AsPyPointer, PyTypeInfo};
+
+use self::lru::Lru;
+
+mod lru;
+
+pyo3::create_exception!(
+    lru_cache,
+    UnsupportedKeyError,
+    PyTypeError,
+    "Raised for keys which the native cache can't safely hash and compare."
+);
+
+/// `types.MethodType`, the type of bound methods.
+static METHOD_TYPE: GILOnceCell<Py<PyType>> = GILOnceCell::new();
+
+/// Called when registering modules with python.
+pub fn register_module(py: Python<'_>, m: &PyModule) -> PyResult<()> {
+    let child_module = PyModule::new(py, "lru_cache")?;
+    child_module.add_class::<NativeLruCache>()?;
+    child_module.add("UnsupportedKeyError", py.get_type::<UnsupportedKeyError>())?;
+
+    let method_type: &PyType = py.import("types")?.getattr("MethodType")?.downcast()?;
+    // Only fails if the module has already been registered, in which case the
+    // type is already set.
+    let _ = METHOD_TYPE.set(py, method_type.into());
+
+    m.add_submodule(child_module)?;
+
+    // We need to manually add the module to sys.modules to make `from
+    // synapse.synapse_rust import lru_cache` work.
+    py.import("sys")?
+        .getattr("modules")?
+        .set_item("synapse.synapse_rust.lru_cache", child_module)?;
+
+    Ok(())
+}
+
+/// Whether the key is made up only of builtin types whose hashing and
+/// comparison never run Python code. Subclasses of the types are not allowed,
+/// as they may override `__hash__` or `__eq__`.
+fn is_plain_key(key: &PyAny) -> bool {
+    if key.is_none()
+        || PyString::is_exact_type_of(key)
+        || PyLong::is_exact_type_of(key)
+        || PyBool::is_exact_type_of(key)
+        || PyBytes::is_exact_type_of(key)
+        || PyFloat::is_exact_type_of(key)
+    {
+        return true;
+    }
+
+    if PyTuple::is_exact_type_of(key) {
+        if let Ok(tuple) = key.downcast::<PyTuple>() {
+            return tuple.iter().all(is_plain_key);
+        }
+    }
+
+    if PyFrozenSet::is_exact_type_of(key) {
+        if let Ok(set) = key.downcast::<PyFrozenSet>() {
+            return set.iter().all(is_plain_key);
+        }
+    }
+
+    false
+}
+
+/// A Python object used as a key, along with its hash.
+///
+/// Only plain keys (see `is_plain_key`) can be turned into a `PyKey`, so that
+/// hashing and comparing them doesn't run any Python code.
+#[derive(Clone)]
+struct PyKey {
+    hash: isize,
+    obj: PyObject,
+}
+
+impl PyKey {
+    fn new(obj: &PyAny) -> PyResult<PyKey> {
+        if !is_plain_key(obj) {
+            // We don't include the type in the message, as looking up its name
+            // could run Python code.
+            return Err(UnsupportedKeyError::new_err(
+                "The cache key is not made up of builtin types",
+            ));
+        }
+
+        Ok(PyKey {
+            hash: obj.hash()?,
+            obj: obj.into(),
+        })
+    }
+}
+
+impl Hash for PyKey {
+    fn hash<H: Hasher>(&self, state: &mut H) {
+        self.hash.hash(state);
+    }
+}
+
+impl PartialEq for PyKey {
+    fn eq(&self, other: &PyKey) -> bool {
+        if self.obj.as_ptr() == other.obj.as_ptr() {
+            return true;
+        }
+        if self.hash != other.hash {
+            return false;
+        }
+
+        // Keys are only compared from the methods of `NativeLruCache`, so we
+        // already hold the GIL. Comparing plain keys can't fail, other than by
+        // running out of memory, in which case they are treated as different.
+        Python::with_gil(|py| {
+            self.obj
+                .as_ref(py)
+                .rich_compare(other.obj.as_ref(py), CompareOp::Eq)
+                .and_then(|result| result.is_true())
+                .unwrap_or(false)
+        })
+    }
+}
+
+impl Eq for PyKey {}
+
+/// Split a key of a cache with tuple keys into its parts.
+fn key_parts(key: &PyAny) -> PyResult<Vec<PyKey>> {
+    let tuple: &PyTuple = key
+        .downcast()
+        .map_err(|_| PyTypeError::new_err("The cache key must be a tuple"))?;
+    tuple.iter().map(PyKey::new).collect()
+}
+
+/// A node in the index of the keys of a cache with tuple keys, which allows
+/// all the entries whose keys start with a given prefix to be found.
+enum TreeNode {
+    Branch(HashMap<PyKey, TreeNode>),
+    /// The full key of an entry.
+    Leaf(PyKey),
+}
+
+impl TreeNode {
+    fn collect_leaves(self, keys: &mut Vec<PyKey>) {
+        match self {
+            TreeNode::Leaf(key) => keys.push(key),
+            TreeNode::Branch(children) => {
+                for child in children.into_values() {
+                    child.collect_leaves(keys);
+                }
+            }
+        }
+    }
+
+    fn leaves<'a>(&'a self, keys: &mut Vec<&'a PyKey>) {
+        match self {
+            TreeNode::Leaf(key) => keys.push(key),
+            TreeNode::Branch(children) => {
+                for child in children.values() {
+                    child.leaves(keys);
+                }
+            }
+        }
+    }
+}
+
+fn tree_insert(
+    mut branch: &mut HashMap<PyKey, TreeNode>,
+    parts: Vec<PyKey>,
+    key: PyKey,
+) -> PyResult<()> {
+    let mut parts = parts.into_iter().peekable();
+    while let Some(part) = parts.next() {
+        if parts.peek().is_none() {
+            if let Some(TreeNode::Branch(_)) = branch.get(&part) {
+                return Err(PyValueError::new_err(
+                    "value conflicts with an existing subtree",
+                ));
+            }
+            branch.insert(part, TreeNode::Leaf(key));
+            return Ok(());
+        }
+
+        let node = branch
+            .entry(part)
+            .or_insert_with(|| TreeNode::Branch(HashMap::new()));
+        branch = match node {
+            TreeNode::Branch(children) => children,
+            TreeNode::Leaf(_) => {
+                return Err(PyValueError::new_err(
+                    "value conflicts with an existing subtree",
+                ))
+            }
+        };
+    }
+
+    Err(PyValueError::new_err("The cache key must not be empty"))
+}
+
+/// Remove the node at the given key or prefix, along with any branches which
+/// are left empty.
+fn tree_remove(branch: &mut HashMap<PyKey, TreeNode>, parts: &[PyKey]) -> Option<TreeNode> {
+    let (first, rest) = parts.split_first()?;
+    if rest.is_empty() {
+        return branch.remove(first);
+    }
+
+    let removed = match branch.get_mut(first)? {
+        TreeNode::Branch(children) => tree_remove(children, rest)?,
+        TreeNode::Leaf(_) => return None,
+    };
+
+    if let Some(TreeNode::Branch(children)) = branch.get(first) {
+        if children.is_empty() {
+            branch.remove(first);
+        }
+    }
+
+    Some(removed)
+}
+
+fn tree_find<'a>(branch: &'a HashMap<PyKey, TreeNode>, parts: &[PyKey]) -> Option<&'a TreeNode> {
+    let (first, rest) = parts.split_first()?;
+    let node = branch.get(first)?;
+    if rest.is_empty() {
+        return Some(node);
+    }
+
+    match node {
+        TreeNode::Branch(children) => tree_find(children, rest),
+        TreeNode::Leaf(_) => None,
+    }
+}
+
+/// Whether two callbacks are the same, without running any Python code.
+///
+/// This is the same as `==` for functions and bound methods, which are
+/// created afresh each time they are looked up, so we compare what they are
+/// bound to. Other callables are compared by identity, so we may keep
+/// duplicates of them that `==` would have removed, which at worst means
+/// running an invalidation callback twice.
+fn same_callback(py: Python<'_>, a: &PyAny, b: &PyAny) -> PyResult<bool> {
+    if a.as_ptr() == b.as_ptr() {
+        return Ok(true);
+    }
+
+    if let Some(method_type) = METHOD_TYPE.get(py) {
+        let method_type = method_type.as_ref(py);
+        if a.get_type().as_ptr() == method_type.as_ptr()
+            && b.get_type().as_ptr() == method_type.as_ptr()
+        {
+            return Ok(
+                a.getattr("__self__")?.as_ptr() == b.getattr("__self__")?.as_ptr()
+                    && a.getattr("__func__")?.as_ptr() == b.getattr("__func__")?.as_ptr(),
+            );
+        }
+    }
+
+    Ok(false)
+}
+
+/// Get the callbacks from a list, tuple or set of them. We don't accept other
+/// collections, as iterating over them may run Python code.
+fn callbacks_iter(callbacks: &PyAny) -> PyResult<Vec<&PyAny>> {
+    if PyList::is_exact_type_of(callbacks) {
+        return Ok(callbacks.downcast::<PyList>()?.iter().collect());
+    }
+    if PyTuple::is_exact_type_of(callbacks) {
+        return Ok(callbacks.downcast::<PyTuple>()?.iter().collect());
+    }
+    if PySet::is_exact_type_of(callbacks) {
+        return Ok(callbacks.downcast::<PySet>()?.iter().collect());
+    }
+    if PyFrozenSet::is_exact_type_of(callbacks) {
+        return Ok(callbacks.downcast::<PyFrozenSet>()?.iter().collect());
+    }
+    Err(PyTypeError::new_err(
+        "The callbacks must be a list, tuple or set",
+    ))
+}
+
+struct CacheEntry {
+    value: PyObject,
+    /// The callbacks to run when the entry is removed from the cache. This is
+    /// an `Option` to avoid allocating for the many entries without callbacks.
+    callbacks: Option<Vec<PyObject>>,
+}
+
+impl CacheEntry {
+    /// Add the given callbacks, ignoring any which we already have.
+    fn add_callbacks(&mut self, py: Python<'_>, callbacks: &[&PyAny]) -> PyResult<()> {
+        for &callback in callbacks {
+            let existing = self.callbacks.get_or_insert_with(Vec::new);
+
+            let mut found = false;
+            for other in existing.iter() {
+                if same_callback(py, other.as_ref(py), callback)? {
+                    found = true;
+                    break;
+                }
+            }
+
+            if !found {
+                existing.push(callback.into());
+            }
+        }
+
+        Ok(())
+    }
+
+    /// Move the entry's callbacks into `to_run` and its value into `removed`,
+    /// for the caller to run and drop once we're done with the cache.
+    fn remove_into(self, to_run: &mut Vec<PyObject>, removed: &mut Vec<PyObject>) {
+        if let Some(callbacks) = self.callbacks {
+            to_run.extend(callbacks);
+        }
+        removed.push(self.value);
+    }
+}
+
+/// What was removed from the cache by an operation: the callbacks which the
+/// caller must run, the total size of the removed entries, and the values of
+/// the removed entries, which the caller must drop.
+type Removed = (Vec<PyObject>, usize, Vec<PyObject>);
+
+/// The entries of an LRU cache, in order of use.
+///
+/// Each entry has a size, which is 1 unless the cache has a size callback,
+/// and the time it was last used, which is used for time based expiry.
+#[pyclass]
+pub struct NativeLruCache {
+    lru: Lru<PyKey, CacheEntry>,
+    /// The index of the keys by prefix, if the keys are tuples and we need
+    /// to support operating on prefixes of them.
+    tree: Option<HashMap<PyKey, TreeNode>>,
+    /// Set once the entries have been moved out by `drain`, after which the
+    /// cache can't be used.
+    drained: bool,
+}
+
+impl NativeLruCache {
+    /// Raise `UnsupportedKeyError` if the entries have been moved into the
+    /// Python implementation, so that callers retry with that.
+    fn check_not_drained(&self) -> PyResult<()> {
+        if self.drained {
+            return Err(UnsupportedKeyError::new_err("The cache has been drained"));
+        }
+        Ok(())
+    }
+
+    /// Remove an entry that has been removed from `lru` from the tree.
+    fn remove_from_tree(&mut self, py: Python<'_>, key: &PyKey) -> PyResult<()> {
+        if let Some(tree) = &mut self.tree {
+            let parts = key_parts(key.obj.as_ref(py))?;
+            tree_remove(tree, &parts);
+        }
+        Ok(())
+    }
+
+    /// Evict the least recently used entries until the total size is at most
+    /// `max_size`, adding them to `removed`.
+    fn evict_to(&mut self, py: Python<'_>, max_size: usize, removed: &mut Removed) -> PyResult<()> {
+        while self.lru.total_size() > max_size {
+            let (key, entry, size) = match self.lru.pop_oldest() {
+                Some(popped) => popped,
+                None => break,
+            };
+            self.remove_from_tree(py, &key)?;
+            entry.remove_into(&mut removed.0, &mut removed.2);
+            removed.1 += size;
+        }
+        Ok(())
+    }
+}
+
+/// Returns `None` if nothing was removed, to save building the lists in the
+/// common case.
+fn removed_or_none(removed: Removed) -> Option<Removed> {
+    if removed.0.is_empty() && removed.1 == 0 && removed.2.is_empty() {
+        return None;
+    }
+    Some(removed)
+}
+
+#[pymethods]
+impl NativeLruCache {
+    #[new]
+    #[args(tree = "false")]
+    fn new(tree: bool) -> NativeLruCache {
+        NativeLruCache {
+            lru: Lru::new(),
+            tree: if tree { Some(HashMap::new()) } else { None },
+            drained: false,
+        }
+    }
+
+    fn __len__(&self) -> PyResult<usize> {
+        self.check_not_drained()?;
+        Ok(self.lru.len())
+    }
+
+    /// The sum of the sizes of the entries.
+    #[getter]
+    fn total_size(&self) -> PyResult<usize> {
+        self.check_not_drained()?;
+        Ok(self.lru.total_size())
+    }
+
+    /// The last access time of the least recently used entry, if any.
+    #[getter]
+    fn oldest_access(&self) -> PyResult<Option<u64>> {
+        self.check_not_drained()?;
+        Ok(self.lru.oldest_access())
+    }
+
+    /// Look up an entry, returning `default` if there is no such entry.
+    ///
+    /// If `touch` is set, the entry is marked as the most recently used, at
+    /// time `now`. Any given `callbacks` are added to the entry.
+    #[args(callbacks = "None")]
+    fn get(
+        &mut self,
+        py: Python<'_>,
+        key: &PyAny,
+        default: PyObject,
+        touch: bool,
+        now: u64,
+        callbacks: Option<&PyAny>,
+    ) -> PyResult<PyObject> {
+        self.check_not_drained()?;
+        let key = PyKey::new(key)?;
+        let callbacks = callbacks.map(callbacks_iter).transpose()?;
+        match self.lru.get_mut(&key, touch, now) {
+            Some(entry) => {
+                if let Some(callbacks) = &callbacks {
+                    entry.add_callbacks(py, callbacks)?;
+                }
+                Ok(entry.value.clone_ref(py))
+            }
+            None => Ok(default),
+        }
+    }
+
+    /// Whether there is an entry with the given key or, for tuple keys, any
+    /// entries with keys starting with the given prefix.
+    fn contains(&self, key: &PyAny) -> PyResult<bool> {
+        self.check_not_drained()?;
+        let pykey = PyKey::new(key)?;
+        if self.lru.contains_key(&pykey) {
+            return Ok(true);
+        }
+
+        if let Some(tree) = &self.tree {
+            if PyTuple::is_exact_type_of(key) {
+                let parts = key_parts(key)?;
+                return Ok(tree_find(tree, &parts).is_some());
+            }
+        }
+
+        Ok(false)
+    }
+
+    /// Add or replace an entry, marking it as the most recently used, and
+    /// then evict entries until the total size is at most `max_size`.
+    ///
+    /// If an existing entry is replaced by a different object, its callbacks
+    /// are removed. Unlike the Python implementation, we don't compare the
+    /// values with `==`, as that may run Python code, so replacing a value
+    /// with an equal copy also removes the callbacks. Any given `callbacks` are
+    /// added to the entry.
+    ///
+    /// Returns `None` if nothing was removed. Otherwise, returns the callbacks
+    /// which the caller must run, the total size of the evicted entries, and
+    /// the removed values, including any replaced value.
+    #[args(callbacks = "None")]
+    fn set(
+        &mut self,
+        py: Python<'_>,
+        key: &PyAny,
+        value: PyObject,
+        size: usize,
+        now: u64,
+        max_size: usize,
+        callbacks: Option<&PyAny>,
+    ) -> PyResult<Option<Removed>> {
+        self.check_not_drained()?;
+        let pykey = PyKey::new(key)?;
+        let callbacks = callbacks.map(callbacks_iter).transpose()?;
+        let mut removed: Removed = (Vec::new(), 0, Vec::new());
+
+        match self.lru.get_mut(&pykey, true, now) {
+            Some(entry) => {
+                if entry.value.as_ptr() != value.as_ptr() {
+                    if let Some(old_callbacks) = entry.callbacks.take() {
+                        removed.0.extend(old_callbacks);
+                    }
+                }
+                if let Some(callbacks) = &callbacks {
+                    entry.add_callbacks(py, callbacks)?;
+                }
+                removed.2.push(std::mem::replace(&mut entry.value, value));
+                self.lru.set_size(&pykey, size);
+            }
+            None => {
+                let mut entry = CacheEntry {
+                    value,
+                    callbacks: None,
+                };
+                if let Some(callbacks) = &callbacks {
+                    entry.add_callbacks(py, callbacks)?;
+                }
+
+                if let Some(tree) = &mut self.tree {
+                    tree_insert(tree, key_parts(key)?, pykey.clone())?;
+                }
+                self.lru.insert_new(pykey, entry, size, now);
+            }
+        }
+
+        self.evict_to(py, max_size, &mut removed)?;
+        Ok(removed_or_none(removed))
+    }
+
+    /// Remove an entry.
+    ///
+    /// Returns `None` if there is no such entry. Otherwise, returns the
+    /// entry's value, its callbacks (which the caller must run) and its size.
+    fn pop(
+        &mut self,
+        py: Python<'_>,
+        key: &PyAny,
+    ) -> PyResult<Option<(PyObject, Vec<PyObject>, usize)>> {
+        self.check_not_drained()?;
+        let pykey = PyKey::new(key)?;
+        let (key, entry, size) = match self.lru.remove(&pykey) {
+            Some(removed) => removed,
+            None => return Ok(None),
+        };
+        self.remove_from_tree(py, &key)?;
+
+        Ok(Some((
+            entry.value,
+            entry.callbacks.unwrap_or_default(),
+            size,
+        )))
+    }
+
+    /// Remove an entry or, for tuple keys, all the entries with keys starting
+    /// with the given prefix.
+    ///
+    /// Returns the callbacks of the removed entries, which the caller must run,
+    /// the total size of the removed entries and their values.
+    fn del_multi(&mut self, key: &PyAny) -> PyResult<Removed> {
+        self.check_not_drained()?;
+        let mut removed: Removed = (Vec::new(), 0, Vec::new());
+
+        let keys = match &mut self.tree {
+            Some(tree) => {
+                // Check the key before splitting it up.
+                PyKey::new(key)?;
+
+                let mut keys = Vec::new();
+                if let Some(node) = tree_remove(tree, &key_parts(key)?) {
+                    node.collect_leaves(&mut keys);
+                }
+                keys
+            }
+            None => vec![PyKey::new(key)?],
+        };
+
+        for key in keys {
+            if let Some((_, entry, size)) = self.lru.remove(&key) {
+                entry.remove_into(&mut removed.0, &mut removed.2);
+                removed.1 += size;
+            }
+        }
+
+        Ok(removed)
+    }
+
+    /// Get the keys and values of all the entries with keys starting with the
+    /// given prefix, in no particular order, or `None` if there are no such
+    /// entries. Only supported for tuple keys.
+    ///
+    /// This doesn't count as a use of the entries.
+    fn get_multi(
+        &mut self,
+        py: Python<'_>,
+        key: &PyAny,
+    ) -> PyResult<Option<Vec<(PyObject, PyObject)>>> {
+        self.check_not_drained()?;
+        let tree = match &self.tree {
+            Some(tree) => tree,
+            None => return Err(PyTypeError::new_err("The cache keys are not tuples")),
+        };
+
+        PyKey::new(key)?;
+        let node = match tree_find(tree, &key_parts(key)?) {
+            Some(node) => node,
+            None => return Ok(None),
+        };
+
+        let mut keys = Vec::new();
+        node.leaves(&mut keys);
+
+        let mut items = Vec::with_capacity(keys.len());
+        for key in keys {
+            let key = key.clone();
+            if let Some(entry) = self.lru.get_mut(&key, false, 0) {
+                let value = entry.value.clone_ref(py);
+                items.push((key.obj, value));
+            }
+        }
+
+        Ok(Some(items))
+    }
+
+    /// Evict entries until the total size is at most `max_size`.
+    ///
+    /// Returns the same as `set`.
+    fn evict(&mut self, py: Python<'_>, max_size: usize) -> PyResult<Option<Removed>> {
+        self.check_not_drained()?;
+        let mut removed: Removed = (Vec::new(), 0, Vec::new());
+        self.evict_to(py, max_size, &mut removed)?;
+        Ok(removed_or_none(removed))
+    }
+
+    /// Remove up to `limit` entries which were last used at or before
+    /// `cutoff`, least recently used first.
+    ///
+    /// Returns the number of removed entries, along with the same as
+    /// `del_multi`.
+    fn expire(&mut self, py: Python<'_>, cutoff: u64, limit: usize) -> PyResult<(usize, Removed)> {
+        self.check_not_drained()?;
+        let mut removed: Removed = (Vec::new(), 0, Vec::new());
+        let mut count = 0;
+
+        while count < limit {
+            let (key, entry, size) = match self.lru.pop_accessed_by(cutoff) {
+                Some(popped) => popped,
+                None => break,
+            };
+            self.remove_from_tree(py, &key)?;
+            entry.remove_into(&mut removed.0, &mut removed.2);
+            removed.1 += size;
+            count += 1;
+        }
+
+        Ok((count, removed))
+    }
+
+    /// Remove all the entries.
+    ///
+    /// Returns the same as `del_multi`.
+    fn clear(&mut self) -> PyResult<Removed> {
+        self.check_not_drained()?;
+        if let Some(tree) = &mut self.tree {
+            tree.clear();
+        }
+
+        let mut removed: Removed = (Vec::new(), self.lru.total_size(), Vec::new());
+        for (_, entry) in self.lru.drain() {
+            entry.remove_into(&mut removed.0, &mut removed.2);
+        }
+        Ok(removed)
+    }
+
+    /// Remove all the entries, returning their keys, values and callbacks,
+    /// least recently used first.
+    ///
+    /// Used to move the entries into the Python implementation, so the
+    /// callbacks should be kept rather than run. The cache can't be used
+    /// afterwards.
+    fn drain(&mut self) -> PyResult<Vec<(PyObject, PyObject, Vec<PyObject>)>> {
+        self.check_not_drained()?;
+        self.drained = true;
+
+        if let Some(tree) = &mut self.tree {
+            tree.clear();
+        }
+
+        let mut entries = Vec::with_capacity(self.lru.len());
+        while let Some((key, entry, _)) = self.lru.pop_oldest() {
+            entries.push((key.obj, entry.value, entry.callbacks.unwrap_or_default()));
+        }
+        Ok(entries)
+    }
+}
@@ -0,0 +1,55 @@
+# Copyright 2023 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Any, Callable, Collection, List, Optional, Tuple
+
+_Callbacks = List[Callable[[], None]]
+
+# The callbacks to run, the total size of the removed entries and their values.
+_Removed = Tuple[_Callbacks, int, List[Any]]
+
+class UnsupportedKeyError(TypeError): ...
+
+class NativeLruCache:
+    def __init__(self, tree: bool = False): ...
+    def __len__(self) -> int: ...
+    @property
+    def total_size(self) -> int: ...
+    @property
+    def oldest_access(self) -> Optional[int]: ...
+    def get(
+        self,
+        key: Any,
+        default: Any,
+        touch: bool,
+        now: int,
+        callbacks: Optional[Collection[Callable[[], None]]] = None,
+    ) -> Any: ...
+    def contains(self, key: Any) -> bool: ...
+    def set(
+        self,
+        key: Any,
+        value: Any,
+        size: int,
+        now: int,
+        max_size: int,
+        callbacks: Optional[Collection[Callable[[], None]]] = None,
+    ) -> Optional[_Removed]: ...
+    def pop(self, key: Any) -> Optional[Tuple[Any, _Callbacks, int]]: ...
+    def del_multi(self, key: Any) -> _Removed: ...
+    def get_multi(self, key: tuple) -> Optional[List[Tuple[tuple, Any]]]: ...
+    def evict(self, max_size: int) -> Optional[_Removed]: ...
+    def expire(self, cutoff: int, limit: int) -> Tuple[int, _Removed]: ...
+    def clear(self) -> _Removed: ...
+    def drain(self) -> List[Tuple[Any, Any, _Callbacks]]: ...
@@ -17,6 +17,7 @@
 
 import argparse
 import curses
+import io
 import logging
 import os
 import sys
@@ -210,6 +211,24 @@ end_error_exec_info: Optional[
 R = TypeVar("R")
 
 
+def _escape_copy_value(value: object) -> str:
+    """Formats a value for use in the text format of postgres' `COPY ... FROM`."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        # bytea in hex format, with the leading backslash escaped for COPY.
+        return "\\\\x" + bytes(value).hex()
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
 class Store(
     EventPushActionsStore,
     ClientIpBackgroundUpdateStore,
@@ -259,6 +278,26 @@ class Store(
             logger.exception("Failed to insert: %s", table)
             raise
 
+    def copy_many_txn(
+        self, txn: LoggingTransaction, table: str, headers: List[str], rows: List[Tuple]
+    ) -> None:
+        """Like `insert_many_txn`, but streams the rows to postgres with a single
+        `COPY` statement rather than a series of `INSERT`s.
+        """
+        buf = io.StringIO()
+        for row in rows:
+            buf.write("\t".join(_escape_copy_value(col) for col in row))
+            buf.write("\n")
+        buf.seek(0)
+
+        sql = "COPY %s (%s) FROM STDIN" % (table, ", ".join(k for k in headers))
+
+        try:
+            txn.txn.copy_expert(sql, buf)  # type: ignore[attr-defined]
+        except Exception:
+            logger.exception("Failed to copy: %s", table)
+            raise
+
     # Note: the parent method is an `async def`.
     def set_room_is_public(self, room_id: str, is_public: bool) -> NoReturn:
         raise Exception(
@@ -296,11 +335,13 @@ class Porter:
         progress: "Progress",
         batch_size: int,
         hs_config: HomeServerConfig,
+        use_copy: bool = False,
     ):
         self.sqlite_config = sqlite_config
         self.progress = progress
         self.batch_size = batch_size
         self.hs_config = hs_config
+        self.use_copy = use_copy
 
     async def setup_table(self, table: str) -> Tuple[str, int, int, int, int]:
         if table in APPEND_ONLY_TABLES:
@@ -449,6 +490,9 @@ class Porter:
         do_forward = [True]
         do_backward = [True]
 
+        start_time = time.time()
+        start_size = postgres_size
+
         while True:
 
             def r(
@@ -491,7 +535,12 @@ class Porter:
 
                 def insert(txn: LoggingTransaction) -> None:
                     assert headers is not None
-                    self.postgres_store.insert_many_txn(txn, table, headers[1:], rows)
+                    if self.use_copy:
+                        self.postgres_store.copy_many_txn(txn, table, headers[1:], rows)
+                    else:
+                        self.postgres_store.insert_many_txn(
+                            txn, table, headers[1:], rows
+                        )
 
                     self.postgres_store.db_pool.simple_update_one_txn(
                         txn,
@@ -509,6 +558,14 @@ class Porter:
 
                 self.progress.update(table, postgres_size)
             else:
+                duration = time.time() - start_time
+                logger.info(
+                    "Table %s: ported %i rows in %.1fs (%.0f rows/s)",
+                    table,
+                    postgres_size - start_size,
+                    duration,
+                    (postgres_size - start_size) / max(duration, 0.001),
+                )
                 return
 
     async def handle_search_table(
@@ -1126,9 +1183,11 @@ class Porter:
 
 class TableProgress(TypedDict):
     start: int
+    start_time: float
     num_done: int
     total: int
     perc: int
+    rate: int
 
 
 class Progress:
@@ -1142,9 +1201,11 @@ class Progress:
     def add_table(self, table: str, cur: int, size: int) -> None:
         self.tables[table] = {
             "start": cur,
+            "start_time": time.time(),
             "num_done": cur,
             "total": size,
             "perc": int(cur * 100 / size),
+            "rate": 0,
         }
 
     def update(self, table: str, num_done: int) -> None:
@@ -1152,6 +1213,10 @@ class Progress:
         data["num_done"] = num_done
         data["perc"] = int(num_done * 100 / data["total"])
 
+        # The number of rows per second ported for this table during this run.
+        duration = time.time() - data["start_time"]
+        data["rate"] = int((num_done - data["start"]) / max(duration, 0.001))
+
     def done(self) -> None:
         pass
 
@@ -1253,7 +1318,8 @@ class CursesProgress(Progress):
             self.stdscr.addstr(
                 i + 2,
                 left_margin + max_len + middle_space,
-                "%s %3d%% (%d/%d)" % (progress, perc, data["num_done"], data["total"]),
+                "%s %3d%% (%d/%d, %d rows/s)"
+                % (progress, perc, data["num_done"], data["total"], data["rate"]),
             )
 
         if self.finished:
@@ -1282,7 +1348,8 @@ class TerminalProgress(Progress):
         data = self.tables[table]
 
         print(
-            "%s: %d%% (%d/%d)" % (table, data["perc"], data["num_done"], data["total"])
+            "%s: %d%% (%d/%d, %d rows/s)"
+            % (table, data["perc"], data["num_done"], data["total"], data["rate"])
         )
 
     def set_state(self, state: str) -> None:
@@ -1323,6 +1390,21 @@ def main() -> None:
         " iteration [default=1000]",
     )
 
+    parser.add_argument(
+        "--sqlite-connections",
+        type=int,
+        default=1,
+        help="The number of connections to open to the SQLite database, allowing"
+        " several tables to be read concurrently [default=1]",
+    )
+
+    parser.add_argument(
+        "--use-copy",
+        action="store_true",
+        help="stream rows into PostgreSQL with COPY rather than INSERT, which is"
+        " considerably faster for large databases",
+    )
+
     args = parser.parse_args()
 
     logging.basicConfig(
@@ -1343,7 +1425,7 @@ def main() -> None:
         "args": {
             "database": args.sqlite_database,
             "cp_min": 1,
-            "cp_max": 1,
+            "cp_max": args.sqlite_connections,
             "check_same_thread": False,
         },
     }
@@ -1378,6 +1460,7 @@ def main() -> None:
             progress=progress,
             batch_size=args.batch_size,
             hs_config=config,
+            use_copy=args.use_copy,
         )
 
         @defer.inlineCallbacks
@@ -63,6 +63,7 @@ from synapse.events.spamcheck import load_legacy_spam_checkers
 from synapse.events.third_party_rules import load_legacy_third_party_event_rules
 from synapse.handlers.auth import load_legacy_password_auth_providers
 from synapse.http.site import SynapseSite
+from synapse.http.slow_requests import SlowRequestCapture
 from synapse.logging.context import PreserveLoggingContext
 from synapse.logging.opentracing import init_tracer
 from synapse.metrics import install_gc_manager, register_threadpool
@@ -358,6 +359,7 @@ def listen_http(
     max_request_body_size: int,
     context_factory: Optional[IOpenSSLContextFactory],
     reactor: ISynapseReactor = reactor,
+    slow_request_capture: Optional[SlowRequestCapture] = None,
 ) -> List[Port]:
     port = listener_config.port
     bind_addresses = listener_config.bind_addresses
@@ -377,6 +379,7 @@ def listen_http(
         version_string,
         max_request_body_size=max_request_body_size,
         reactor=reactor,
+        slow_request_capture=slow_request_capture,
     )
     if tls:
         # refresh_certificate should have been called before this.
@@ -539,6 +542,9 @@ async def start(hs: "HomeServer") -> None:
     # If we've configured an expiry time for caches, start the background job now.
     setup_expire_lru_cache_entries(hs)
 
+    if hs.config.caches.factor_autotuning_enabled:
+        await hs.get_cache_factor_autotuner().start()
+
     # It is now safe to start your Synapse.
     hs.start_listening()
     hs.get_datastores().main.db_pool.start_profiling()
@@ -552,6 +558,9 @@ async def start(hs: "HomeServer") -> None:
     setup_sentry(hs)
     setup_sdnotify(hs)
 
+    if hs.config.metrics.sampling_profiler_enabled:
+        hs.get_sampling_profiler().start()
+
     # If background tasks are running on the main process or this is the worker in
     # charge of them, start collecting the phone home stats and shared usage metrics.
     if hs.config.worker.run_background_tasks:
@@ -589,6 +598,8 @@ def reload_cache_config(config: HomeServerConfig) -> None:
               HomeServer ->  SyncHandler -> ResponseCache.
         - track_memory_usage. This affects synapse.util.caches.TRACK_MEMORY_USAGE which
               influences Synapse's self-reported metrics.
+        - native_lru_cache: only affects caches created at startup, so changing it
+              requires a restart.
 
     Also, the HTTPConnectionPool in SimpleHTTPClient sets its maxPersistentPerHost
     parameter based on the global_factor. This won't be applied on a config reload.
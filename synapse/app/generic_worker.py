@@ -229,6 +229,7 @@ class GenericWorkerServer(HomeServer):
             max_request_body_size(self.config),
             self.tls_server_context_factory,
             reactor=self.get_reactor(),
+            slow_request_capture=self.get_slow_request_capture(),
         )
 
     def start_listening(self) -> None:
@@ -283,6 +284,10 @@ def start(config_options: List[str]) -> None:
 
     synapse.events.USE_FROZEN_DICTS = config.server.use_frozen_dicts
     synapse.util.caches.TRACK_MEMORY_USAGE = config.caches.track_memory_usage
+    synapse.util.caches.USE_NATIVE_LRU_CACHE = config.caches.native_lru_cache
+    synapse.util.caches.TRACE_REQUEST_CACHE_LOOKUPS = (
+        config.metrics.slow_request_capture_enabled
+    )
 
     if config.server.gc_seconds:
         synapse.metrics.MIN_TIME_BETWEEN_GCS = config.server.gc_seconds
@@ -146,6 +146,7 @@ class SynapseHomeServer(HomeServer):
             max_request_body_size(self.config),
             self.tls_server_context_factory,
             reactor=self.get_reactor(),
+            slow_request_capture=self.get_slow_request_capture(),
         )
 
         return ports
@@ -308,6 +309,10 @@ def setup(config_options: List[str]) -> SynapseHomeServer:
 
     events.USE_FROZEN_DICTS = config.server.use_frozen_dicts
     synapse.util.caches.TRACK_MEMORY_USAGE = config.caches.track_memory_usage
+    synapse.util.caches.USE_NATIVE_LRU_CACHE = config.caches.native_lru_cache
+    synapse.util.caches.TRACE_REQUEST_CACHE_LOOKUPS = (
+        config.metrics.slow_request_capture_enabled
+    )
 
     if config.server.gc_seconds:
         synapse.metrics.MIN_TIME_BETWEEN_GCS = config.server.gc_seconds
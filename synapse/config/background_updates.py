@@ -35,3 +35,7 @@ class BackgroundUpdateConfig(Config):
         self.min_batch_size = bg_update_config.get("min_batch_size", 1)
 
         self.default_batch_size = bg_update_config.get("default_batch_size", 100)
+
+        self.max_db_scheduling_time_ms = bg_update_config.get(
+            "max_db_scheduling_time_ms"
+        )
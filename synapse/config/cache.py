@@ -47,6 +47,10 @@ class CacheProperties:
         os.environ.get(_CACHE_PREFIX, _DEFAULT_FACTOR_SIZE)
     )
     resize_all_caches_func: Optional[Callable[[], None]] = None
+    # Cache factors chosen by the cache factor autotuner, by canonical cache name.
+    # These take precedence over the global factor, but not over any factors
+    # given in the config.
+    tuned_factors: Dict[str, float] = attr.Factory(dict)
 
 
 properties = CacheProperties()
@@ -66,6 +70,20 @@ def _canonicalise_cache_name(cache_name: str) -> str:
     return cache_name.lower()
 
 
+def set_tuned_cache_factors(tuned_factors: Dict[str, float]) -> None:
+    """Set the cache factors chosen by the cache factor autotuner, and resize the
+    caches accordingly.
+
+    Args:
+        tuned_factors: map from canonical cache name to cache factor. Replaces
+            any previously tuned factors.
+    """
+    properties.tuned_factors = dict(tuned_factors)
+
+    if properties.resize_all_caches_func:
+        properties.resize_all_caches_func()
+
+
 def add_resizable_cache(
     cache_name: str, cache_resize_callback: Callable[[float], None]
 ) -> None:
@@ -100,8 +118,15 @@ class CacheConfig(Config):
     cache_factors: Dict[str, float]
     global_factor: float
     track_memory_usage: bool
+    native_lru_cache: bool
     expiry_time_msec: Optional[int]
+    expiry_tick_budget_ms: int
     sync_response_cache_duration: int
+    factor_autotuning_enabled: bool
+    factor_autotuning_interval_ms: int
+    factor_autotuning_min_factor: float
+    factor_autotuning_max_factor: float
+    factor_autotuning_max_step: float
 
     @staticmethod
     def reset() -> None:
@@ -110,6 +135,7 @@ class CacheConfig(Config):
             os.environ.get(_CACHE_PREFIX, _DEFAULT_FACTOR_SIZE)
         )
         properties.resize_all_caches_func = None
+        properties.tuned_factors = {}
         with _CACHES_LOCK:
             _CACHES.clear()
 
@@ -161,6 +187,17 @@ class CacheConfig(Config):
         if self.track_memory_usage:
             check_requirements("cache-memory")
 
+        self.native_lru_cache = cache_config.get("native_lru_cache", False)
+        if self.native_lru_cache:
+            try:
+                import synapse.synapse_rust.lru_cache  # noqa: F401
+            except ImportError:
+                raise ConfigError(
+                    "The native LRU cache is not available in this build of Synapse. "
+                    "It is built if the `native-lru-cache` Cargo feature is enabled.",
+                    ("caches", "native_lru_cache"),
+                )
+
         expire_caches = cache_config.get("expire_caches", True)
         cache_entry_ttl = cache_config.get("cache_entry_ttl", "30m")
 
@@ -185,6 +222,12 @@ class CacheConfig(Config):
             )
             self.expiry_time_msec = self.parse_duration(expiry_time)
 
+        self.expiry_tick_budget_ms = self.parse_duration(
+            cache_config.get("expiry_tick_budget", 10)
+        )
+        if self.expiry_tick_budget_ms <= 0:
+            raise ConfigError("Must be positive", ("caches", "expiry_tick_budget"))
+
         self.cache_autotuning = cache_config.get("cache_autotuning")
         if self.cache_autotuning:
             max_memory_usage = self.cache_autotuning.get("max_cache_memory_usage")
@@ -200,6 +243,36 @@ class CacheConfig(Config):
             min_cache_ttl = self.cache_autotuning.get("min_cache_ttl")
             self.cache_autotuning["min_cache_ttl"] = self.parse_duration(min_cache_ttl)
 
+        factor_autotuning = cache_config.get("factor_autotuning") or {}
+        if not isinstance(factor_autotuning, dict):
+            raise ConfigError("caches.factor_autotuning must be a dictionary")
+        self.factor_autotuning_enabled = factor_autotuning.get("enabled", False)
+        self.factor_autotuning_interval_ms = self.parse_duration(
+            factor_autotuning.get("interval", "10m")
+        )
+        self.factor_autotuning_min_factor = factor_autotuning.get(
+            "min_factor", self.global_factor / 4
+        )
+        self.factor_autotuning_max_factor = factor_autotuning.get(
+            "max_factor", self.global_factor * 4
+        )
+        self.factor_autotuning_max_step = factor_autotuning.get("max_step", 0.1)
+        for option in ("min_factor", "max_factor", "max_step"):
+            value = getattr(self, "factor_autotuning_" + option)
+            if type(value) not in (int, float) or value <= 0:
+                raise ConfigError(
+                    "Must be a positive number", ("caches", "factor_autotuning", option)
+                )
+        if self.factor_autotuning_min_factor > self.factor_autotuning_max_factor:
+            raise ConfigError(
+                "Must not be greater than max_factor",
+                ("caches", "factor_autotuning", "min_factor"),
+            )
+        if self.factor_autotuning_max_step >= 1:
+            raise ConfigError(
+                "Must be less than 1", ("caches", "factor_autotuning", "max_step")
+            )
+
         self.sync_response_cache_duration = self.parse_duration(
             cache_config.get("sync_response_cache_duration", "2m")
         )
@@ -220,5 +293,9 @@ class CacheConfig(Config):
         # block other threads from modifying _CACHES while we iterate it.
         with _CACHES_LOCK:
             for cache_name, callback in _CACHES.items():
-                new_factor = self.cache_factors.get(cache_name, self.global_factor)
+                new_factor = self.cache_factors.get(cache_name)
+                if new_factor is None:
+                    new_factor = properties.tuned_factors.get(
+                        cache_name, self.global_factor
+                    )
                 callback(new_factor)
@@ -186,3 +186,27 @@ class ExperimentalConfig(Config):
 
         # MSC2659: Application service ping endpoint
         self.msc2659_enabled = experimental.get("msc2659_enabled", False)
+
+        # Send stream updates over replication as a single RDATA_BATCH command per
+        # batch of updates, rather than an RDATA command per row. All workers must
+        # be running a version of Synapse which understands RDATA_BATCH before
+        # this is enabled.
+        self.replication_batch_rdata: bool = experimental.get(
+            "replication_batch_rdata", False
+        )
+
+        # When using Redis, publish updates to each replication stream on its own
+        # channel, so that each process only receives the streams it uses. All
+        # processes must be running a version of Synapse which subscribes to
+        # these channels before this is enabled.
+        self.replication_stream_channels: bool = experimental.get(
+            "replication_stream_channels", False
+        )
+
+        # Send bulk cache invalidations (e.g. when purging history) to workers
+        # as a few batched rows on the caches stream, rather than a row per
+        # entry. All workers must be running a version of Synapse which
+        # understands the batched rows before this is enabled.
+        self.replication_bulk_cache_invalidation: bool = experimental.get(
+            "replication_bulk_cache_invalidation", False
+        )
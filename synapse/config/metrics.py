@@ -56,6 +56,56 @@ class MetricsConfig(Config):
         else:
             self.metrics_flags = MetricsFlags.all_off()
 
+        sampling_profiler_config = config.get("sampling_profiler") or {}
+        self.sampling_profiler_enabled = sampling_profiler_config.get("enabled", False)
+        self.sampling_profiler_interval_ms = self.parse_duration(
+            sampling_profiler_config.get("sample_interval", 10)
+        )
+        if self.sampling_profiler_interval_ms <= 0:
+            raise ConfigError(
+                "Must be positive", ("sampling_profiler", "sample_interval")
+            )
+        self.sampling_profiler_max_stacks = sampling_profiler_config.get(
+            "max_stacks", 10000
+        )
+        if (
+            not isinstance(self.sampling_profiler_max_stacks, int)
+            or self.sampling_profiler_max_stacks <= 0
+        ):
+            raise ConfigError(
+                "Must be a positive integer", ("sampling_profiler", "max_stacks")
+            )
+
+        slow_request_config = config.get("slow_request_capture") or {}
+        self.slow_request_capture_enabled = slow_request_config.get("enabled", False)
+        # Each of the thresholds can be set to null to disable it.
+        db_time_threshold = slow_request_config.get("db_time_threshold", "1s")
+        self.slow_request_db_time_threshold_ms: Optional[int] = None
+        if db_time_threshold is not None:
+            self.slow_request_db_time_threshold_ms = self.parse_duration(
+                db_time_threshold
+            )
+        cpu_time_threshold = slow_request_config.get("cpu_time_threshold", "1s")
+        self.slow_request_cpu_time_threshold_ms: Optional[int] = None
+        if cpu_time_threshold is not None:
+            self.slow_request_cpu_time_threshold_ms = self.parse_duration(
+                cpu_time_threshold
+            )
+        response_size_threshold = slow_request_config.get("response_size_threshold")
+        self.slow_request_response_size_threshold: Optional[int] = None
+        if response_size_threshold is not None:
+            self.slow_request_response_size_threshold = self.parse_size(
+                response_size_threshold
+            )
+        self.slow_request_max_captured = slow_request_config.get("max_captured", 100)
+        if (
+            not isinstance(self.slow_request_max_captured, int)
+            or self.slow_request_max_captured <= 0
+        ):
+            raise ConfigError(
+                "Must be a positive integer", ("slow_request_capture", "max_captured")
+            )
+
         self.sentry_enabled = "sentry" in config
         if self.sentry_enabled:
             check_requirements("sentry")
@@ -201,6 +201,7 @@ class ContentRepositoryConfig(Config):
             )
 
         self.dynamic_thumbnails = config.get("dynamic_thumbnails", False)
+        self.deduplicate_media = config.get("deduplicate_media", False)
         self.thumbnail_requirements = parse_thumbnail_requirements(
             config.get("thumbnail_sizes", DEFAULT_THUMBNAIL_SIZES)
         )
@@ -255,6 +256,13 @@ class ContentRepositoryConfig(Config):
                 remote_media_lifetime
             )
 
+        self.media_retention_remote_media_max_size = None
+        remote_media_max_size = media_retention.get("remote_media_max_size")
+        if remote_media_max_size is not None:
+            self.media_retention_remote_media_max_size = self.parse_size(
+                remote_media_max_size
+            )
+
     def generate_config_section(self, data_dir_path: str, **kwargs: Any) -> str:
         assert data_dir_path is not None
         media_store = os.path.join(data_dir_path, "media_store")
@@ -229,13 +229,17 @@ class FederationRemoteSendQueue(AbstractFederationSender):
         # nothing to do here: the replication listener will handle it.
 
     def send_presence_to_destinations(
-        self, states: Iterable[UserPresenceState], destinations: Iterable[str]
+        self,
+        states: Iterable[UserPresenceState],
+        destinations: Iterable[str],
+        skip_unchanged: bool = False,
     ) -> None:
         """As per FederationSender
 
         Args:
             states
             destinations
+            skip_unchanged
         """
         for state in states:
             pos = self._next_pos()
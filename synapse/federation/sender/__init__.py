@@ -213,12 +213,17 @@ class AbstractFederationSender(metaclass=abc.ABCMeta):
 
     @abc.abstractmethod
     def send_presence_to_destinations(
-        self, states: Iterable[UserPresenceState], destinations: Iterable[str]
+        self,
+        states: Iterable[UserPresenceState],
+        destinations: Iterable[str],
+        skip_unchanged: bool = False,
     ) -> None:
         """Send the given presence states to the given destinations.
 
         Args:
             destinations:
+            skip_unchanged: Whether to skip states which a destination was
+                recently sent and which have not changed since.
         """
         raise NotImplementedError()
 
@@ -817,7 +822,10 @@ class FederationSender(AbstractFederationSender):
             queue.flush_read_receipts_for_room(room_id)
 
     def send_presence_to_destinations(
-        self, states: Iterable[UserPresenceState], destinations: Iterable[str]
+        self,
+        states: Iterable[UserPresenceState],
+        destinations: Iterable[str],
+        skip_unchanged: bool = False,
     ) -> None:
         """Send the given presence states to the given destinations.
         destinations (list[str])
@@ -840,7 +848,7 @@ class FederationSender(AbstractFederationSender):
                 continue
 
             self._get_per_destination_queue(destination).send_presence(
-                states, start_loop=False
+                states, start_loop=False, skip_unchanged=skip_unchanged
             )
 
             self._destination_wakeup_queue.add_to_queue(destination)
@@ -16,7 +16,17 @@
 import datetime
 import logging
 from types import TracebackType
-from typing import TYPE_CHECKING, Dict, Hashable, Iterable, List, Optional, Tuple, Type
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+)
 
 import attr
 from prometheus_client import Counter
@@ -45,6 +55,15 @@ if TYPE_CHECKING:
 # This is defined in the Matrix spec and enforced by the receiver.
 MAX_EDUS_PER_TRANSACTION = 100
 
+# How long after sending a user's presence to a destination we will skip sending
+# it again if it has not changed. While a user is currently active, their last
+# active time moving forward by less than this is not considered a change.
+PRESENCE_RESEND_INTERVAL_MS = 5 * 60 * 1000
+
+# The maximum number of users whose recently sent presence we remember for each
+# destination.
+MAX_RECENTLY_SENT_PRESENCE = 10000
+
 logger = logging.getLogger(__name__)
 
 
@@ -58,6 +77,11 @@ sent_edus_by_type = Counter(
     ["type"],
 )
 
+suppressed_presence_counter = Counter(
+    "synapse_federation_client_suppressed_presence",
+    "Number of presence updates not sent to a destination as it already had them",
+)
+
 
 class PerDestinationQueue:
     """
@@ -136,6 +160,14 @@ class PerDestinationQueue:
         # destination
         self._pending_presence: Dict[str, UserPresenceState] = {}
 
+        # Map of user_id -> (time sent, UserPresenceState) of the presence we
+        # recently sent to this destination, in the order it was sent.
+        self._recently_sent_presence: Dict[str, Tuple[int, UserPresenceState]] = {}
+
+        # The users whose presence is in the transaction currently being sent to
+        # this destination.
+        self._presence_in_flight: Set[str] = set()
+
         # List of room_id -> receipt_type -> user_id -> receipt_dict,
         #
         # Each receipt can only have a single receipt per
@@ -180,7 +212,10 @@ class PerDestinationQueue:
         self.attempt_new_transaction()
 
     def send_presence(
-        self, states: Iterable[UserPresenceState], start_loop: bool = True
+        self,
+        states: Iterable[UserPresenceState],
+        start_loop: bool = True,
+        skip_unchanged: bool = False,
     ) -> None:
         """Add presence updates to the queue.
 
@@ -188,12 +223,20 @@ class PerDestinationQueue:
             states: Presence updates to send
             start_loop: Whether to start the transmission loop if not already
                 running.
-
-        Args:
-            states: presence to send
+            skip_unchanged: Whether to drop updates which would not tell the
+                destination anything new, as we recently sent it the same
+                presence for that user.
         """
-        self._pending_presence.update({state.user_id: state for state in states})
-        self._new_data_to_send = True
+        now = self._clock.time_msec()
+        for state in states:
+            if skip_unchanged and self._is_presence_unchanged(state, now):
+                # Any queued update is older than the one the destination has.
+                self._pending_presence.pop(state.user_id, None)
+                suppressed_presence_counter.inc()
+                continue
+
+            self._pending_presence[state.user_id] = state
+            self._new_data_to_send = True
 
         if start_loop:
             self.attempt_new_transaction()
@@ -390,6 +433,7 @@ class PerDestinationQueue:
                 self._pending_edus = []
                 self._pending_edus_keyed = {}
                 self._pending_presence = {}
+                self._recently_sent_presence = {}
                 self._pending_receipt_edus = []
 
                 self._start_catching_up()
@@ -670,6 +714,60 @@ class PerDestinationQueue:
 
         return edus, stream_id
 
+    def _is_presence_unchanged(self, state: UserPresenceState, now: int) -> bool:
+        """Whether the given presence is the same as what we recently sent to
+        this destination for that user.
+        """
+        # We don't know whether the destination will end up with the presence
+        # that is being sent to it, so can't tell if this would be a change.
+        if state.user_id in self._presence_in_flight:
+            return False
+
+        sent = self._recently_sent_presence.get(state.user_id)
+        if sent is None:
+            return False
+
+        sent_ts, sent_state = sent
+        if now - sent_ts >= PRESENCE_RESEND_INTERVAL_MS:
+            return False
+
+        if (
+            state.state != sent_state.state
+            or state.status_msg != sent_state.status_msg
+            or state.currently_active != sent_state.currently_active
+        ):
+            return False
+
+        if state.currently_active:
+            return (
+                0
+                <= state.last_active_ts - sent_state.last_active_ts
+                < PRESENCE_RESEND_INTERVAL_MS
+            )
+
+        return state.last_active_ts == sent_state.last_active_ts
+
+    def _record_sent_presence(self, states: Iterable[UserPresenceState]) -> None:
+        """Record that the given presence was successfully sent to this
+        destination.
+        """
+        now = self._clock.time_msec()
+        for state in states:
+            # Move the user to the end, so that the map stays in sent order.
+            self._recently_sent_presence.pop(state.user_id, None)
+            self._recently_sent_presence[state.user_id] = (now, state)
+
+        # Drop the entries that are too old to be used, or that don't fit, which
+        # are at the start.
+        while self._recently_sent_presence:
+            user_id, (sent_ts, _) = next(iter(self._recently_sent_presence.items()))
+            if (
+                now - sent_ts < PRESENCE_RESEND_INTERVAL_MS
+                and len(self._recently_sent_presence) <= MAX_RECENTLY_SENT_PRESENCE
+            ):
+                break
+            del self._recently_sent_presence[user_id]
+
     def _start_catching_up(self) -> None:
         """
         Marks this destination as being in catch-up mode.
@@ -692,6 +790,7 @@ class _TransactionQueueManager:
     _device_list_id: Optional[int] = None
     _last_stream_ordering: Optional[int] = None
     _pdus: List[EventBase] = attr.Factory(list)
+    _presence: List[UserPresenceState] = attr.Factory(list)
 
     async def __aenter__(self) -> Tuple[List[EventBase], List[Edu]]:
         # First we calculate the EDUs we want to send, if any.
@@ -711,6 +810,8 @@ class _TransactionQueueManager:
 
         # Add presence EDU.
         if self.queue._pending_presence:
+            self._presence = list(self.queue._pending_presence.values())
+            self.queue._presence_in_flight = set(self.queue._pending_presence)
             pending_edus.append(
                 Edu(
                     origin=self.queue._server_name,
@@ -721,7 +822,7 @@ class _TransactionQueueManager:
                             format_user_presence_state(
                                 presence, self.queue._clock.time_msec()
                             )
-                            for presence in self.queue._pending_presence.values()
+                            for presence in self._presence
                         ]
                     },
                 )
@@ -798,8 +899,14 @@ class _TransactionQueueManager:
         exc: Optional[BaseException],
         tb: Optional[TracebackType],
     ) -> None:
+        self.queue._presence_in_flight = set()
+
         if exc_type is not None:
-            # Failed to send transaction, so we bail out.
+            # Failed to send transaction, so we bail out. The destination may
+            # or may not have received the presence, so we forget what we'd
+            # previously sent for those users.
+            for presence in self._presence:
+                self.queue._recently_sent_presence.pop(presence.user_id, None)
             return
 
         # Successfully sent transactions, so we remove pending PDUs from the queue
@@ -809,6 +916,9 @@ class _TransactionQueueManager:
         # Succeeded to send the transaction so we record where we have sent up
         # to in the various streams
 
+        if self._presence:
+            self.queue._record_sent_presence(self._presence)
+
         if self._device_stream_id:
             await self.queue._store.delete_device_msgs_for_remote(
                 self.queue._destination, self._device_stream_id
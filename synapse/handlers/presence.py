@@ -324,7 +324,9 @@ class BasePresenceHandler(abc.ABC):
         )
 
         for destination, host_states in hosts_to_states.items():
-            self._federation.send_presence_to_destinations(host_states, [destination])
+            self._federation.send_presence_to_destinations(
+                host_states, [destination], skip_unchanged=True
+            )
 
     async def send_full_presence_to_users(self, user_ids: StrCollection) -> None:
         """
@@ -705,7 +707,8 @@ class PresenceHandler(BasePresenceHandler):
         self._next_serial = 1
 
         # Keeps track of the number of *ongoing* syncs on this process. While
-        # this is non zero a user will never go offline.
+        # this is non zero a user will never go offline. Users are removed once
+        # they have no ongoing syncs.
         self.user_to_num_current_syncs: Dict[str, int] = {}
 
         # Keeps track of the number of *ongoing* syncs on other processes.
@@ -935,13 +938,16 @@ class PresenceHandler(BasePresenceHandler):
 
         timers_fired_counter.inc(len(states))
 
+        # We only need to know which of the users we're checking are syncing,
+        # which is much cheaper to calculate than the full set of syncing users
+        # on large servers.
         syncing_user_ids = {
             user_id
-            for user_id, count in self.user_to_num_current_syncs.items()
-            if count
+            for user_id in users_to_check
+            if self.user_to_num_current_syncs.get(user_id)
         }
         for user_ids in self.external_process_to_current_syncs.values():
-            syncing_user_ids.update(user_ids)
+            syncing_user_ids.update(users_to_check.intersection(user_ids))
 
         changes = handle_timeouts(
             states,
@@ -1046,6 +1052,8 @@ class PresenceHandler(BasePresenceHandler):
         async def _end() -> None:
             try:
                 self.user_to_num_current_syncs[user_id] -= 1
+                if self.user_to_num_current_syncs[user_id] == 0:
+                    del self.user_to_num_current_syncs[user_id]
 
                 prev_state = await self.current_state_for_user(user_id)
                 await self._update_states(
@@ -2014,9 +2022,12 @@ async def get_interested_parties(
     """
     room_ids_to_states: Dict[str, List[UserPresenceState]] = {}
     users_to_states: Dict[str, List[UserPresenceState]] = {}
+
+    # Look up the rooms for all the users at once, rather than one at a time.
+    rooms_by_user = await store.get_rooms_for_users({state.user_id for state in states})
+
     for state in states:
-        room_ids = await store.get_rooms_for_user(state.user_id)
-        for room_id in room_ids:
+        for room_id in rooms_by_user.get(state.user_id, ()):
             room_ids_to_states.setdefault(room_id, []).append(state)
 
         # Always notify self
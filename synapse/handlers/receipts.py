@@ -12,7 +12,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import logging
-from typing import TYPE_CHECKING, Iterable, List, Optional, Sequence, Tuple
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from prometheus_client import Counter
+
+from twisted.internet.defer import CancelledError
 
 from synapse.api.constants import EduTypes, ReceiptTypes
 from synapse.appservice import ApplicationService
@@ -24,12 +28,28 @@ from synapse.types import (
     UserID,
     get_domain_from_id,
 )
+from synapse.util.async_helpers import yieldable_gather_results
+from synapse.util.batching_queue import BatchingQueue
 
 if TYPE_CHECKING:
     from synapse.server import HomeServer
 
 logger = logging.getLogger(__name__)
 
+client_receipts_counter = Counter(
+    "synapse_handler_receipts_client_receipts",
+    "Number of read receipts received from local clients",
+)
+client_receipts_stored_counter = Counter(
+    "synapse_handler_receipts_client_receipts_stored",
+    "Number of read receipts from local clients that were stored, after"
+    " coalescing receipts that were sent together",
+)
+client_receipt_batches_counter = Counter(
+    "synapse_handler_receipts_client_receipt_batches",
+    "Number of batches that read receipts from local clients were processed in",
+)
+
 
 class ReceiptsHandler:
     def __init__(self, hs: "HomeServer"):
@@ -63,6 +83,16 @@ class ReceiptsHandler:
         self.clock = self.hs.get_clock()
         self.state = hs.get_state_handler()
 
+        # Receipts from clients that arrive at the same time are processed
+        # together, so that we only wake up the notifier and pushers once.
+        self._client_receipts_queue: BatchingQueue[
+            ReadReceipt, List[Tuple[ReadReceipt, Exception]]
+        ] = BatchingQueue(
+            "client_receipts",
+            self.clock,
+            self._handle_client_receipts,
+        )
+
     async def _received_remote_receipt(self, origin: str, content: JsonDict) -> None:
         """Called when we receive an EDU of type m.receipt from a remote HS."""
         receipts = []
@@ -109,27 +139,109 @@ class ReceiptsHandler:
                         )
                     )
 
-        await self._handle_new_receipts(receipts)
+        _, failures = await self._handle_new_receipts(receipts)
+        if failures:
+            raise failures[0][1]
 
-    async def _handle_new_receipts(self, receipts: List[ReadReceipt]) -> bool:
-        """Takes a list of receipts, stores them and informs the notifier."""
-        min_batch_id: Optional[int] = None
-        max_batch_id: Optional[int] = None
+    async def _handle_new_receipts(
+        self, receipts: List[ReadReceipt]
+    ) -> Tuple[List[ReadReceipt], List[Tuple[ReadReceipt, Exception]]]:
+        """Takes a list of receipts, stores them and informs the notifier.
 
-        for receipt in receipts:
-            res = await self.store.insert_receipt(
-                receipt.room_id,
-                receipt.receipt_type,
-                receipt.user_id,
-                receipt.event_ids,
-                receipt.thread_id,
-                receipt.data,
+        A receipt which can't be stored doesn't stop the others from being
+        stored.
+
+        Returns:
+            A tuple of the receipts that were new, i.e. not older than a receipt
+            we already had, and the receipts which couldn't be stored along with
+            the exception raised when storing them.
+        """
+        failures: List[Tuple[ReadReceipt, Exception]] = []
+        try:
+            new_receipts, stream_ids = await self.store.insert_receipts(receipts)
+        except CancelledError:
+            raise
+        except Exception:
+            if len(receipts) == 1:
+                raise
+
+            # Something in the batch couldn't be stored, so we fall back to
+            # storing the receipts individually to find out which.
+            logger.warning(
+                "Failed to store a batch of %d receipts, storing them individually",
+                len(receipts),
+                exc_info=True,
             )
+            new_receipts, stream_ids, failures = await self._insert_receipts_singly(
+                receipts
+            )
+
+        if stream_ids is None:
+            # no new receipts
+            return [], failures
+
+        min_batch_id, max_batch_id = stream_ids
+        affected_room_ids = list({r.room_id for r in new_receipts})
+
+        self.notifier.on_new_event(
+            StreamKeyType.RECEIPT, max_batch_id, rooms=affected_room_ids
+        )
+        # Note that the min here shouldn't be relied upon to be accurate.
+        await self.hs.get_pusherpool().on_new_receipts(
+            min_batch_id, max_batch_id, affected_room_ids
+        )
+
+        return new_receipts, failures
+
+    async def _insert_receipts_singly(
+        self, receipts: List[ReadReceipt]
+    ) -> Tuple[
+        List[ReadReceipt],
+        Optional[Tuple[int, int]],
+        List[Tuple[ReadReceipt, Exception]],
+    ]:
+        """Stores each of the receipts in its own transaction, noting any that
+        fail.
+
+        Returns:
+            A tuple of the receipts that were new, the lowest stream ID and the
+            highest persisted token of the new receipts (if there were any), and
+            the receipts which couldn't be stored along with the exception.
+        """
+
+        async def insert_receipt(
+            receipt: ReadReceipt,
+        ) -> Union[Optional[Tuple[int, int]], Exception]:
+            try:
+                return await self.store.insert_receipt(
+                    receipt.room_id,
+                    receipt.receipt_type,
+                    receipt.user_id,
+                    receipt.event_ids,
+                    receipt.thread_id,
+                    receipt.data,
+                )
+            except CancelledError:
+                raise
+            except Exception as e:
+                return e
+
+        results = await yieldable_gather_results(insert_receipt, receipts)
+
+        min_batch_id: Optional[int] = None
+        max_batch_id: Optional[int] = None
+        new_receipts = []
+        failures: List[Tuple[ReadReceipt, Exception]] = []
+        for receipt, res in zip(receipts, results):
+            if isinstance(res, Exception):
+                failures.append((receipt, res))
+                continue
 
             if not res:
                 # res will be None if this receipt is 'old'
                 continue
 
+            new_receipts.append(receipt)
             stream_id, max_persisted_id = res
 
             if min_batch_id is None or stream_id < min_batch_id:
@@ -139,20 +251,46 @@ class ReceiptsHandler:
 
         # Either both of these should be None or neither.
         if min_batch_id is None or max_batch_id is None:
-            # no new receipts
-            return False
+            return [], None, failures
 
-        affected_room_ids = list({r.room_id for r in receipts})
+        return new_receipts, (min_batch_id, max_batch_id), failures
 
-        self.notifier.on_new_event(
-            StreamKeyType.RECEIPT, max_batch_id, rooms=affected_room_ids
-        )
-        # Note that the min here shouldn't be relied upon to be accurate.
-        await self.hs.get_pusherpool().on_new_receipts(
-            min_batch_id, max_batch_id, affected_room_ids
-        )
+    async def _handle_client_receipts(
+        self, receipts: List[ReadReceipt]
+    ) -> List[Tuple[ReadReceipt, Exception]]:
+        """Processes a batch of receipts from local clients, and sends the new
+        ones out over federation.
 
-        return True
+        Returns:
+            The receipts which couldn't be stored, along with the exception
+            raised when storing them. Only the requests which sent those
+            receipts should fail.
+        """
+        client_receipts_counter.inc(len(receipts))
+        client_receipt_batches_counter.inc()
+
+        new_receipts, failures = await self._handle_new_receipts(receipts)
+        client_receipts_stored_counter.inc(len(new_receipts))
+
+        if self.federation_sender:
+            # If a user sent several receipts in the batch only the most recent
+            # needs to be sent to other servers.
+            latest_receipts: Dict[Tuple[str, str, str, Optional[str]], ReadReceipt] = {}
+            for receipt in new_receipts:
+                if receipt.receipt_type == ReceiptTypes.READ_PRIVATE:
+                    continue
+                key = (
+                    receipt.room_id,
+                    receipt.receipt_type,
+                    receipt.user_id,
+                    receipt.thread_id,
+                )
+                latest_receipts[key] = receipt
+
+            for receipt in latest_receipts.values():
+                await self.federation_sender.send_read_receipt(receipt)
+
+        return failures
 
     async def received_client_receipt(
         self,
@@ -174,12 +312,10 @@ class ReceiptsHandler:
             data={"ts": int(self.clock.time_msec())},
         )
 
-        is_new = await self._handle_new_receipts([receipt])
-        if not is_new:
-            return
-
-        if self.federation_sender and receipt_type != ReceiptTypes.READ_PRIVATE:
-            await self.federation_sender.send_read_receipt(receipt)
+        failures = await self._client_receipts_queue.add_to_queue(receipt)
+        for failed_receipt, e in failures:
+            if failed_receipt is receipt:
+                raise e
 
 
 class ReceiptEventSource(EventSource[int, JsonDict]):
@@ -26,6 +26,7 @@ from synapse.metrics.background_process_metrics import run_as_background_process
 from synapse.storage.databases.main.user_directory import SearchResult
 from synapse.storage.roommember import ProfileInfo
 from synapse.types import UserID
+from synapse.util.caches.response_cache import ResponseCache
 from synapse.util.metrics import Measure
 from synapse.util.retryutils import NotRetryingDestination
 from synapse.util.stringutils import non_null_str_or_none
@@ -48,6 +49,10 @@ MAX_SERVERS_TO_REFRESH_PROFILES_FOR_IN_ONE_GO = 5
 # every 15 seconds.
 INTERVAL_TO_ADD_MORE_SERVERS_TO_REFRESH_PROFILES = 15
 
+# How long to keep the results of a user directory search, in case the same
+# search is made again.
+SEARCH_RESULTS_CACHE_TIMEOUT_MS = 10 * 1000
+
 
 def calculate_time_of_next_retry(now_ts: int, retry_count: int) -> int:
     """
@@ -97,6 +102,19 @@ class UserDirectoryHandler(StateDeltasHandler):
         self.spam_checker = hs.get_spam_checker()
         self._hs = hs
 
+        # Clients search the directory as the user types, and often send the
+        # same search more than once in quick succession, so we keep the results
+        # of each search for a short while. They are dropped when this process
+        # updates the directory; changes made by other processes show up once
+        # the results time out.
+        self._search_response_cache: ResponseCache[
+            Tuple[str, str, int]
+        ] = ResponseCache(
+            hs.get_clock(),
+            "user_directory_search",
+            timeout_ms=SEARCH_RESULTS_CACHE_TIMEOUT_MS,
+        )
+
         # The current position in the current_state_delta stream
         self.pos: Optional[int] = None
 
@@ -144,16 +162,28 @@ class UserDirectoryHandler(StateDeltasHandler):
                     ]
                 }
         """
-        results = await self.store.search_user_dir(user_id, search_term, limit)
+        results = await self._search_response_cache.wrap(
+            (user_id, search_term, limit),
+            self.store.search_user_dir,
+            user_id,
+            search_term,
+            limit,
+        )
 
-        # Remove any spammy users from the results.
+        # Remove any spammy users from the results. We do this each time, rather
+        # than caching the filtered results, so that the spam checker is always
+        # consulted.
         non_spammy_users = []
         for user in results["results"]:
             if not await self.spam_checker.check_username_for_spam(user):
                 non_spammy_users.append(user)
-        results["results"] = non_spammy_users
 
-        return results
+        return {"limited": results["limited"], "results": non_spammy_users}
+
+    def _invalidate_search_results(self) -> None:
+        """Drop the cached search results, as the directory has changed."""
+        for key in list(self._search_response_cache.keys()):
+            self._search_response_cache.unset(key)
 
     def notify_new_event(self) -> None:
         """Called when there may be more deltas to process"""
@@ -185,12 +215,14 @@ class UserDirectoryHandler(StateDeltasHandler):
             await self.store.update_profile_in_user_dir(
                 user_id, profile.display_name, profile.avatar_url
             )
+            self._invalidate_search_results()
 
     async def handle_local_user_deactivated(self, user_id: str) -> None:
         """Called when a user ID is deactivated"""
         # FIXME(#3714): We should probably do this in the same worker as all
         # the other changes.
         await self.store.remove_from_user_dir(user_id)
+        self._invalidate_search_results()
 
     async def _unsafe_process(self) -> None:
         # If self.pos is None then means we haven't fetched it from DB
@@ -232,6 +264,8 @@ class UserDirectoryHandler(StateDeltasHandler):
 
                 logger.debug("Handling %d state deltas", len(deltas))
                 await self._handle_deltas(deltas)
+                if deltas:
+                    self._invalidate_search_results()
 
                 self.pos = max_pos
 
@@ -747,3 +781,4 @@ class UserDirectoryHandler(StateDeltasHandler):
                     display_name=non_null_str_or_none(profile.get("displayname")),
                     avatar_url=non_null_str_or_none(profile.get("avatar_url")),
                 )
+                self._invalidate_search_results()
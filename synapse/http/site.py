@@ -29,10 +29,12 @@ from twisted.web.server import Request, Site
 from synapse.config.server import ListenerConfig
 from synapse.http import get_request_user_agent, redact_uri
 from synapse.http.request_metrics import RequestMetrics, requests_counter
+from synapse.http.slow_requests import SlowRequestCapture
 from synapse.logging.context import (
     ContextRequest,
     LoggingContext,
     PreserveLoggingContext,
+    RequestTrace,
 )
 from synapse.types import Requester
 
@@ -167,6 +169,15 @@ class SynapseRequest(Request):
         # If there's no authenticated entity, it was the requester.
         self.logcontext.request.authenticated_entity = authenticated_entity or requester
 
+    def set_servlet_name(self, servlet_name: str) -> None:
+        """Record the name of the servlet which is processing this request, for
+        use in metrics.
+        """
+        self.request_metrics.name = servlet_name
+
+        if self.logcontext is not None and self.logcontext.request is not None:
+            self.logcontext.request.servlet_name = servlet_name
+
     def set_opentracing_span(self, span: "opentracing.Span") -> None:
         """attach an opentracing span to this request
 
@@ -403,14 +414,18 @@ class SynapseRequest(Request):
             servlet_name: the name of the servlet which will be
                 processing this request. This is used in the metrics.
 
-                It is possible to update this afterwards by updating
-                self.request_metrics.name.
+                It is possible to update this afterwards by calling
+                set_servlet_name.
         """
         self.start_time = time.time()
         self.request_metrics = RequestMetrics()
         self.request_metrics.start(
             self.start_time, name=servlet_name, method=self.get_method()
         )
+        if self.logcontext is not None and self.logcontext.request is not None:
+            self.logcontext.request.servlet_name = servlet_name
+            if self.synapse_site.slow_request_capture is not None:
+                self.logcontext.request.trace = RequestTrace()
 
         self.synapse_site.access_logger.debug(
             "%s - %s - Received request: %s %s",
@@ -490,6 +505,17 @@ class SynapseRequest(Request):
         except Exception as e:
             logger.warning("Failed to stop metrics: %r", e)
 
+        slow_request_capture = self.synapse_site.slow_request_capture
+        request = self.logcontext.request
+        if (
+            slow_request_capture is not None
+            and request is not None
+            and request.trace is not None
+        ):
+            slow_request_capture.maybe_capture(
+                request, usage, code, processing_time, self.sentLength
+            )
+
     def _should_log_request(self) -> bool:
         """Whether we should log at INFO that we processed the request."""
         if self.path == b"/health":
@@ -598,6 +624,7 @@ class SynapseSite(Site):
         server_version_string: str,
         max_request_body_size: int,
         reactor: IReactorTime,
+        slow_request_capture: Optional[SlowRequestCapture] = None,
     ):
         """
 
@@ -611,6 +638,8 @@ class SynapseSite(Site):
             max_request_body_size: Maximum request body length to allow before
                 dropping the connection
             reactor: reactor to be used to manage connection timeouts
+            slow_request_capture: where to record requests which exceed the
+                slow request thresholds, if enabled
         """
         Site.__init__(self, resource, reactor=reactor)
 
@@ -625,6 +654,10 @@ class SynapseSite(Site):
 
         self.experimental_cors_msc3886 = config.http_options.experimental_cors_msc3886
 
+        self.slow_request_capture: Optional[SlowRequestCapture] = None
+        if slow_request_capture is not None and slow_request_capture.enabled:
+            self.slow_request_capture = slow_request_capture
+
         def request_factory(channel: HTTPChannel, queued: bool) -> Request:
             return request_class(
                 channel,
@@ -0,0 +1,155 @@
+# Copyright 2023 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+from collections import deque
+from typing import TYPE_CHECKING, Deque, List, Optional
+
+from prometheus_client import Counter
+
+from synapse.logging.context import ContextRequest, ContextResourceUsage, RequestTrace
+from synapse.types import JsonDict
+
+if TYPE_CHECKING:
+    from synapse.server import HomeServer
+
+logger = logging.getLogger(__name__)
+
+slow_requests_captured = Counter(
+    "synapse_http_server_slow_requests_captured",
+    "Number of requests which exceeded a slow request capture threshold",
+    ["method", "servlet"],
+)
+
+
+class SlowRequestCapture:
+    """Keeps a bounded record of the requests which exceeded any of the
+    configured database time, CPU time or response size thresholds, along with
+    the details recorded in their `RequestTrace`.
+    """
+
+    def __init__(self, hs: "HomeServer"):
+        config = hs.config.metrics
+        self._clock = hs.get_clock()
+
+        self.enabled = config.slow_request_capture_enabled
+
+        self._db_time_threshold_sec: Optional[float] = None
+        if config.slow_request_db_time_threshold_ms is not None:
+            self._db_time_threshold_sec = (
+                config.slow_request_db_time_threshold_ms / 1000
+            )
+        self._cpu_time_threshold_sec: Optional[float] = None
+        if config.slow_request_cpu_time_threshold_ms is not None:
+            self._cpu_time_threshold_sec = (
+                config.slow_request_cpu_time_threshold_ms / 1000
+            )
+        self._response_size_threshold = config.slow_request_response_size_threshold
+
+        # The captured requests, oldest first.
+        self._captured: Deque[JsonDict] = deque(maxlen=config.slow_request_max_captured)
+
+    def maybe_capture(
+        self,
+        request: ContextRequest,
+        usage: ContextResourceUsage,
+        code: str,
+        processing_time_sec: float,
+        response_size: int,
+    ) -> None:
+        """Capture the given completed request, if it exceeded any of the
+        thresholds.
+
+        Args:
+            request: the request's ContextRequest, which must have a `trace`.
+            usage: the resources used by the request.
+            code: the response code, as logged.
+            processing_time_sec: how long the request handler took.
+            response_size: the number of bytes sent in the response.
+        """
+        trace = request.trace
+        assert trace is not None
+
+        exceeded: List[str] = []
+        if (
+            self._db_time_threshold_sec is not None
+            and usage.db_txn_duration_sec >= self._db_time_threshold_sec
+        ):
+            exceeded.append("db_time")
+        if (
+            self._cpu_time_threshold_sec is not None
+            and usage.ru_utime + usage.ru_stime >= self._cpu_time_threshold_sec
+        ):
+            exceeded.append("cpu_time")
+        if (
+            self._response_size_threshold is not None
+            and response_size >= self._response_size_threshold
+        ):
+            exceeded.append("response_size")
+
+        if not exceeded:
+            return
+
+        slow_requests_captured.labels(request.method, request.servlet_name).inc()
+        self._captured.append(
+            {
+                "request_id": request.request_id,
+                "captured_ts": self._clock.time_msec(),
+                "method": request.method,
+                "servlet": request.servlet_name,
+                "url": request.url,
+                "requester": request.requester,
+                "code": code,
+                "exceeded_thresholds": exceeded,
+                "processing_time_sec": processing_time_sec,
+                "response_size": response_size,
+                "ru_utime_sec": usage.ru_utime,
+                "ru_stime_sec": usage.ru_stime,
+                "db_txn_count": usage.db_txn_count,
+                "db_txn_duration_sec": usage.db_txn_duration_sec,
+                "db_sched_duration_sec": usage.db_sched_duration_sec,
+                "evt_db_fetch_count": usage.evt_db_fetch_count,
+                **_trace_to_json(trace),
+            }
+        )
+
+    def get_captured_requests(self) -> List[JsonDict]:
+        """Get the captured requests, most recent first."""
+        return list(reversed(self._captured))
+
+    def clear(self) -> None:
+        self._captured.clear()
+
+
+def _trace_to_json(trace: RequestTrace) -> JsonDict:
+    # We take a copy, as background work started by the request may still be
+    # updating the trace.
+    trace = trace.copy()
+    cache_hits = trace.cache_hits
+    cache_misses = trace.cache_misses
+
+    return {
+        "db_txns": [
+            {"desc": desc, "duration_sec": duration}
+            for desc, duration in trace.transactions
+        ],
+        "dropped_db_txns": trace.dropped_transactions,
+        "caches": {
+            cache_name: {
+                "hits": cache_hits.get(cache_name, 0),
+                "misses": cache_misses.get(cache_name, 0),
+            }
+            for cache_name in sorted(cache_hits.keys() | cache_misses.keys())
+        },
+    }
@@ -22,15 +22,17 @@ them.
 
 See doc/log_contexts.rst for details on how this works.
 """
+import collections.abc
 import logging
 import threading
-import typing
 import warnings
 from types import TracebackType
 from typing import (
     TYPE_CHECKING,
     Awaitable,
     Callable,
+    Dict,
+    List,
     Optional,
     Tuple,
     Type,
@@ -191,6 +193,61 @@ class ContextResourceUsage:
         return res
 
 
+# The maximum number of database transactions to record in a `RequestTrace`.
+_MAX_TRACED_TRANSACTIONS = 1000
+
+
+@attr.s(slots=True, auto_attribs=True)
+class RequestTrace:
+    """A detailed record of the resources used while processing a request, kept
+    for requests which might be captured as slow requests.
+
+    Unlike ContextResourceUsage, this is shared by every logcontext derived
+    from the request's logcontext (via the ContextRequest), so may be updated
+    from database threads as well as the reactor thread. All access to the
+    fields should therefore hold `lock` (or use `copy`).
+    """
+
+    # The description and duration of each database transaction, in the order
+    # that they completed.
+    transactions: List[Tuple[str, float]] = attr.Factory(list)
+    # The number of transactions which were not recorded, as there were already
+    # _MAX_TRACED_TRANSACTIONS in `transactions`.
+    dropped_transactions: int = 0
+
+    # The number of hits and misses for each cache, by cache name.
+    cache_hits: Dict[str, int] = attr.Factory(dict)
+    cache_misses: Dict[str, int] = attr.Factory(dict)
+
+    lock: threading.Lock = attr.ib(
+        factory=threading.Lock, init=False, eq=False, repr=False
+    )
+
+    def record_transaction(self, desc: str, duration_sec: float) -> None:
+        with self.lock:
+            if len(self.transactions) < _MAX_TRACED_TRANSACTIONS:
+                self.transactions.append((desc, duration_sec))
+            else:
+                self.dropped_transactions += 1
+
+    def record_cache_lookup(self, cache_name: str, hit: bool) -> None:
+        with self.lock:
+            counts = self.cache_hits if hit else self.cache_misses
+            counts[cache_name] = counts.get(cache_name, 0) + 1
+
+    def copy(self) -> "RequestTrace":
+        """Take a consistent copy of the trace, which won't be updated by any
+        work still running for the request.
+        """
+        with self.lock:
+            return RequestTrace(
+                transactions=list(self.transactions),
+                dropped_transactions=self.dropped_transactions,
+                cache_hits=dict(self.cache_hits),
+                cache_misses=dict(self.cache_misses),
+            )
+
+
 @attr.s(slots=True, auto_attribs=True)
 class ContextRequest:
     """
@@ -212,6 +269,11 @@ class ContextRequest:
     url: str
     protocol: str
     user_agent: str
+    # The name of the servlet handling the request, if known.
+    servlet_name: Optional[str] = None
+    # A detailed record of the resources used by the request, if slow request
+    # capture is enabled.
+    trace: Optional[RequestTrace] = None
 
 
 LoggingContextOrSentinel = Union["LoggingContext", "_Sentinel"]
@@ -432,7 +494,7 @@ class LoggingContext:
 
         # If we haven't already started record the thread resource usage so
         # far
-        if self.usage_start:
+        if self.usage_start is not None:
             logcontext_error("Re-starting already-active log context %s" % (self,))
         else:
             self.usage_start = rusage
@@ -454,11 +516,11 @@ class LoggingContext:
                 logcontext_error("Stopped logcontext %s on different thread" % (self,))
                 return
 
-            if not rusage:
+            if rusage is None:
                 return
 
             # Record the cpu used since we started
-            if not self.usage_start:
+            if self.usage_start is None:
                 logcontext_error(
                     "Called stop on logcontext %s without recording a start rusage"
                     % (self,)
@@ -530,10 +592,13 @@ class LoggingContext:
             utime_delta: additional user time, in seconds, spent in this context.
             stime_delta: additional system time, in seconds, spent in this context.
         """
-        self._resource_usage.ru_utime += utime_delta
-        self._resource_usage.ru_stime += stime_delta
-        if self.parent_context:
-            self.parent_context.add_cputime(utime_delta, stime_delta)
+        # This is called on every context switch, so walk up the parents in a
+        # loop rather than recursing.
+        context: Optional[LoggingContext] = self
+        while context is not None:
+            context._resource_usage.ru_utime += utime_delta
+            context._resource_usage.ru_stime += stime_delta
+            context = context.parent_context
 
     def add_database_transaction(self, duration_sec: float) -> None:
         """Record the use of a database transaction and the length of time it took.
@@ -653,12 +718,41 @@ class PreserveLoggingContext:
 _thread_local = threading.local()
 _thread_local.current_context = SENTINEL_CONTEXT
 
+# The ID of a thread whose current logging context is also kept in
+# `_tracked_thread_context`, so that it can be read from other threads. See
+# `track_current_context_of_thread`.
+_tracked_thread_id: Optional[int] = None
+_tracked_thread_context: LoggingContextOrSentinel = SENTINEL_CONTEXT
+
 
 def current_context() -> LoggingContextOrSentinel:
     """Get the current logging context from thread local storage"""
     return getattr(_thread_local, "current_context", SENTINEL_CONTEXT)
 
 
+def track_current_context_of_thread(thread_id: Optional[int]) -> None:
+    """Start keeping track of the current logging context of the given thread, so
+    that other threads can read it with `get_tracked_thread_context`.
+
+    Only one thread can be tracked at a time. Pass None to stop tracking.
+    """
+    global _tracked_thread_id, _tracked_thread_context
+    if thread_id == threading.get_ident():
+        _tracked_thread_context = current_context()
+    else:
+        _tracked_thread_context = SENTINEL_CONTEXT
+    _tracked_thread_id = thread_id
+
+
+def get_tracked_thread_context() -> LoggingContextOrSentinel:
+    """Get the current logging context of the thread passed to
+    `track_current_context_of_thread`.
+
+    Returns the sentinel context if no thread is being tracked.
+    """
+    return _tracked_thread_context
+
+
 def set_current_context(context: LoggingContextOrSentinel) -> LoggingContextOrSentinel:
     """Set the current logging context in thread local storage
     Args:
@@ -667,18 +761,29 @@ def set_current_context(context: LoggingContextOrSentinel) -> LoggingContextOrSe
     Returns:
         The context that was previously active
     """
+    global _tracked_thread_context
+
     # everything blows up if we allow current_context to be set to None, so sanity-check
     # that now.
     if context is None:
         raise TypeError("'context' argument may not be None")
 
-    current = current_context()
+    current = getattr(_thread_local, "current_context", SENTINEL_CONTEXT)
 
     if current is not context:
+        # This is called on every context switch, so we avoid calling the
+        # sentinel's no-op `start` and `stop` methods.
         rusage = get_thread_resource_usage()
-        current.stop(rusage)
+        if current is not SENTINEL_CONTEXT:
+            current.stop(rusage)
         _thread_local.current_context = context
-        context.start(rusage)
+        if (
+            _tracked_thread_id is not None
+            and threading.get_ident() == _tracked_thread_id
+        ):
+            _tracked_thread_context = context
+        if context is not SENTINEL_CONTEXT:
+            context.start(rusage)
 
     return current
 
@@ -809,12 +914,15 @@ def run_in_background(  # type: ignore[misc]
 
     # `res` may be a coroutine, `Deferred`, some other kind of awaitable, or a plain
     # value. Convert it to a `Deferred`.
-    if isinstance(res, typing.Coroutine):
+    #
+    # We check against the `collections.abc` classes rather than their `typing`
+    # aliases, as `isinstance` checks against the latter are noticeably slower.
+    if isinstance(res, collections.abc.Coroutine):
         # Wrap the coroutine in a `Deferred`.
         res = defer.ensureDeferred(res)
     elif isinstance(res, defer.Deferred):
         pass
-    elif isinstance(res, Awaitable):
+    elif isinstance(res, collections.abc.Awaitable):
         # `res` is probably some kind of completed awaitable, such as a `DoneAwaitable`
         # or `Future` from `make_awaitable`.
         res = defer.ensureDeferred(_unwrap_awaitable(res))
@@ -30,7 +30,11 @@ from synapse.api.errors import Codes, SynapseError, cs_error
 from synapse.http.server import finish_request, respond_with_json
 from synapse.http.site import SynapseRequest
 from synapse.logging.context import make_deferred_yieldable
-from synapse.util.stringutils import is_ascii, parse_and_validate_server_name
+from synapse.util.stringutils import (
+    is_ascii,
+    parse_and_validate_server_name,
+    random_string,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -50,6 +54,10 @@ TEXT_CONTENT_TYPES = [
     "text/xml",
 ]
 
+# The most ranges we'll serve for a single request. Requests for more than this
+# get the whole file, to stop clients making us do lots of tiny reads.
+MAX_RANGES_PER_REQUEST = 16
+
 
 def parse_media_id(request: Request) -> Tuple[str, str, Optional[str]]:
     """Parses the server name, media ID and optional file name from the request URI
@@ -269,8 +277,22 @@ async def respond_with_responder(
 
         logger.debug("Responding to media request with responder %s", responder)
         add_file_headers(request, media_type, file_size, upload_name)
+
+        ranges = None
+        if file_size is not None and responder.supports_ranges:
+            request.setHeader(b"Accept-Ranges", b"bytes")
+            range_header = request.getHeader(b"Range")
+            if range_header is not None:
+                ranges = parse_range_header(
+                    range_header.decode("ascii", errors="replace"), file_size
+                )
+
         try:
-            await responder.write_to_consumer(request)
+            if ranges is None:
+                await responder.write_to_consumer(request)
+            else:
+                assert file_size is not None
+                await _write_ranges_to_request(request, responder, file_size, ranges)
         except Exception as e:
             # The majority of the time this will be due to the client having gone
             # away. Unfortunately, Twisted simply throws a generic exception at us
@@ -284,6 +306,114 @@ async def respond_with_responder(
     finish_request(request)
 
 
+def parse_range_header(
+    range_header: str, file_size: int
+) -> Optional[List[Tuple[int, int]]]:
+    """Parses the value of an HTTP `Range` header, as defined in RFC9110
+    section 14.2.
+
+    Args:
+        range_header: The value of the header.
+        file_size: The size in bytes of the media being requested.
+
+    Returns:
+        None if the header should be ignored, i.e. it is malformed, not in bytes
+        or asks for too many ranges. Otherwise the list of `(start, end)` byte
+        offsets to return, with `end` being exclusive, which is empty if none of
+        the ranges are satisfiable.
+    """
+    unit, _, range_set = range_header.partition("=")
+    if unit.strip().lower() != "bytes":
+        return None
+
+    specs = range_set.split(",")
+    if len(specs) > MAX_RANGES_PER_REQUEST:
+        return None
+
+    ranges = []
+    for spec in specs:
+        first, sep, last = spec.strip().partition("-")
+        if not sep or (first and not first.isdigit()) or (last and not last.isdigit()):
+            return None
+
+        if first:
+            start = int(first)
+            end = int(last) + 1 if last else file_size
+            if last and end <= start:
+                return None
+        elif last:
+            # A suffix range, i.e. the last N bytes of the media.
+            start = max(file_size - int(last), 0)
+            end = file_size
+        else:
+            return None
+
+        end = min(end, file_size)
+        if start >= end:
+            # This range is not satisfiable.
+            continue
+
+        ranges.append((start, end))
+
+    return ranges
+
+
+async def _write_ranges_to_request(
+    request: SynapseRequest,
+    responder: "Responder",
+    file_size: int,
+    ranges: List[Tuple[int, int]],
+) -> None:
+    """Responds to a range request with the given ranges of the media, as
+    returned by `parse_range_header`. Expects the headers for the whole media
+    to have already been added.
+    """
+    if not ranges:
+        request.setResponseCode(416)
+        request.setHeader(b"Content-Range", b"bytes */%d" % (file_size,))
+        request.setHeader(b"Content-Length", b"0")
+        return
+
+    request.setResponseCode(206)
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        request.setHeader(
+            b"Content-Range", b"bytes %d-%d/%d" % (start, end - 1, file_size)
+        )
+        request.setHeader(b"Content-Length", b"%d" % (end - start,))
+        await responder.write_range_to_consumer(request, start, end - start)
+        return
+
+    # Multiple ranges are sent as a multipart/byteranges response, as defined in
+    # RFC9110 section 14.6.
+    content_types = request.responseHeaders.getRawHeaders(b"Content-Type")
+    assert content_types
+    content_type = content_types[0]
+    boundary = random_string(16).encode("ascii")
+    part_headers = [
+        b"\r\n--%s\r\nContent-Type: %s\r\nContent-Range: bytes %d-%d/%d\r\n\r\n"
+        % (boundary, content_type, start, end - 1, file_size)
+        for start, end in ranges
+    ]
+    closing = b"\r\n--%s--\r\n" % (boundary,)
+
+    content_length = len(closing) + sum(
+        len(part_header) + end - start
+        for part_header, (start, end) in zip(part_headers, ranges)
+    )
+
+    request.setHeader(
+        b"Content-Type", b"multipart/byteranges; boundary=%s" % (boundary,)
+    )
+    request.setHeader(b"Content-Length", b"%d" % (content_length,))
+
+    for part_header, (start, end) in zip(part_headers, ranges):
+        request.write(part_header)
+        await responder.write_range_to_consumer(request, start, end - start)
+    request.write(closing)
+
+
 class Responder(ABC):
     """Represents a response that can be streamed to the requester.
 
@@ -291,6 +421,9 @@ class Responder(ABC):
     held can be cleaned up.
     """
 
+    # Whether `write_range_to_consumer` can be used to serve range requests.
+    supports_ranges = False
+
     @abstractmethod
     def write_to_consumer(self, consumer: IConsumer) -> Awaitable:
         """Stream response into consumer
@@ -303,6 +436,22 @@ class Responder(ABC):
         """
         raise NotImplementedError()
 
+    def write_range_to_consumer(
+        self, consumer: IConsumer, offset: int, length: int
+    ) -> Awaitable:
+        """Stream part of the response into consumer. Only called if
+        `supports_ranges` is set.
+
+        Args:
+            consumer: The consumer to stream into.
+            offset: The offset in bytes of the start of the part.
+            length: The length in bytes of the part.
+
+        Returns:
+            Resolves once the part has finished being written
+        """
+        raise NotImplementedError()
+
     def __enter__(self) -> None:  # noqa: B027
         pass
 
@@ -17,9 +17,10 @@ import logging
 import os
 import shutil
 from io import BytesIO
-from typing import IO, TYPE_CHECKING, Dict, List, Optional, Set, Tuple
+from typing import IO, TYPE_CHECKING, Dict, Iterable, List, Optional, Set, Tuple
 
 from matrix_common.types.mxc_uri import MXCUri
+from prometheus_client import Counter
 
 import twisted.internet.error
 import twisted.web.http
@@ -64,6 +65,16 @@ UPDATE_RECENTLY_ACCESSED_TS = 60 * 1000  # 1 minute
 # How often to run the background job to check for local and remote media
 # that should be purged according to the configured media retention settings.
 MEDIA_RETENTION_CHECK_PERIOD_MS = 60 * 60 * 1000  # 1 hour
+# How often to run the background job that deduplicates local media uploaded
+# before deduplication was enabled, and how many pieces of media it checks each
+# time.
+DEDUPLICATE_MEDIA_PERIOD_MS = 60 * 1000  # 1 minute
+DEDUPLICATE_MEDIA_BATCH_SIZE = 100
+
+deduplicated_media_bytes_counter = Counter(
+    "synapse_media_deduplicated_bytes",
+    "Number of bytes of local media not stored again as identical media was stored",
+)
 
 
 class MediaRepository:
@@ -127,11 +138,15 @@ class MediaRepository:
         self._media_retention_remote_media_lifetime_ms = (
             hs.config.media.media_retention_remote_media_lifetime_ms
         )
+        self._media_retention_remote_media_max_size = (
+            hs.config.media.media_retention_remote_media_max_size
+        )
 
         # Check whether local or remote media retention is configured
         if (
             hs.config.media.media_retention_local_media_lifetime_ms is not None
             or hs.config.media.media_retention_remote_media_lifetime_ms is not None
+            or hs.config.media.media_retention_remote_media_max_size is not None
         ):
             # Run the background job to apply media retention rules routinely,
             # with the duration between runs dictated by the homeserver config.
@@ -140,6 +155,14 @@ class MediaRepository:
                 MEDIA_RETENTION_CHECK_PERIOD_MS,
             )
 
+        self._deduplicate_media = hs.config.media.deduplicate_media
+        # Only one instance deduplicates the existing media, so that several
+        # instances don't hash and link the same files at once.
+        if self._deduplicate_media and hs.config.worker.run_background_tasks:
+            self.clock.looping_call(
+                self._start_deduplicate_local_media, DEDUPLICATE_MEDIA_PERIOD_MS
+            )
+
     def _start_update_recently_accessed(self) -> Deferred:
         return run_as_background_process(
             "update_recently_accessed_media", self._update_recently_accessed
@@ -150,6 +173,11 @@ class MediaRepository:
             "apply_media_retention_rules", self._apply_media_retention_rules
         )
 
+    def _start_deduplicate_local_media(self) -> Deferred:
+        return run_as_background_process(
+            "deduplicate_local_media", self._deduplicate_local_media
+        )
+
     async def _update_recently_accessed(self) -> None:
         remote_media = self.recently_accessed_remotes
         self.recently_accessed_remotes = set()
@@ -198,7 +226,27 @@ class MediaRepository:
 
         file_info = FileInfo(server_name=None, file_id=media_id)
 
-        fname = await self.media_storage.store_file(content, file_info)
+        sha256 = None
+        existing_media_id = None
+        if self._deduplicate_media:
+            sha256 = await self.media_storage.hash_file(content)
+            existing_media_id = await self.store.get_local_media_id_by_sha256(sha256)
+
+        fname = None
+        if existing_media_id is not None:
+            fname = await self.media_storage.store_file_as_link(
+                FileInfo(server_name=None, file_id=existing_media_id), file_info
+            )
+            if fname is not None:
+                deduplicated_media_bytes_counter.inc(content_length)
+                logger.info(
+                    "Stored local media as a link to identical media %s",
+                    existing_media_id,
+                )
+
+        if fname is None:
+            existing_media_id = None
+            fname = await self.media_storage.store_file(content, file_info)
 
         logger.info("Stored local media in file %r", fname)
 
@@ -209,12 +257,118 @@ class MediaRepository:
             upload_name=upload_name,
             media_length=content_length,
             user_id=auth_user,
+            sha256=sha256,
         )
 
-        await self._generate_thumbnails(None, media_id, media_id, media_type)
+        if existing_media_id is None or not await self._link_local_thumbnails(
+            existing_media_id, media_id, media_type
+        ):
+            await self._generate_thumbnails(None, media_id, media_id, media_type)
 
         return MXCUri(self.server_name, media_id)
 
+    async def _link_local_thumbnails(
+        self, existing_media_id: str, media_id: str, media_type: str
+    ) -> bool:
+        """Reuse the thumbnails of a local piece of media for a new upload with
+        identical content, by linking to them.
+
+        Args:
+            existing_media_id: The media ID of the identical media.
+            media_id: The media ID of the new upload.
+            media_type: The content type of the new upload.
+
+        Returns:
+            True if the thumbnails were reused, or False if they need generating.
+        """
+        existing_media_info = await self.store.get_local_media(existing_media_id)
+        if not existing_media_info or existing_media_info["media_type"] != media_type:
+            # The thumbnails we want depend on the content type.
+            return False
+
+        thumbnails = await self.store.get_local_media_thumbnails(existing_media_id)
+        if not thumbnails:
+            return False
+
+        # Link all the thumbnails before storing any of them, so that we can
+        # back out if one can't be linked. The links share their inodes with the
+        # existing media's thumbnails, so we mustn't leave any of them behind
+        # for `_generate_thumbnails` to write over.
+        linked_fnames = []
+        for thumbnail in thumbnails:
+            thumbnail_info = ThumbnailInfo(
+                width=thumbnail["thumbnail_width"],
+                height=thumbnail["thumbnail_height"],
+                method=thumbnail["thumbnail_method"],
+                type=thumbnail["thumbnail_type"],
+            )
+            fname = await self.media_storage.store_file_as_link(
+                FileInfo(None, existing_media_id, thumbnail=thumbnail_info),
+                FileInfo(None, media_id, thumbnail=thumbnail_info),
+            )
+            if fname is None:
+                for linked_fname in linked_fnames:
+                    os.remove(linked_fname)
+                return False
+
+            linked_fnames.append(fname)
+
+        for thumbnail in thumbnails:
+            await self.store.store_local_thumbnail(
+                media_id,
+                thumbnail["thumbnail_width"],
+                thumbnail["thumbnail_height"],
+                thumbnail["thumbnail_type"],
+                thumbnail["thumbnail_method"],
+                thumbnail["thumbnail_length"],
+            )
+
+        return True
+
+    async def _deduplicate_local_media(self) -> None:
+        """Hash a batch of the local media that was stored before deduplication
+        was enabled, and replace any of it that is identical to other media with
+        a link.
+        """
+        from_media_id = await self.store.get_local_media_deduplication_position()
+        media_ids = await self.store.get_local_media_without_sha256(
+            from_media_id, DEDUPLICATE_MEDIA_BATCH_SIZE
+        )
+
+        for media_id in media_ids:
+            file_info = FileInfo(server_name=None, file_id=media_id)
+
+            try:
+                with open(self.filepaths.local_media_filepath(media_id), "rb") as f:
+                    sha256 = await self.media_storage.hash_file(f)
+            except OSError:
+                # The media isn't in the local media store, e.g. because it was
+                # only kept in a storage provider.
+                continue
+
+            existing_media_id = await self.store.get_local_media_id_by_sha256(sha256)
+            if existing_media_id is not None:
+                try:
+                    freed = self.media_storage.replace_with_link(
+                        FileInfo(server_name=None, file_id=existing_media_id),
+                        file_info,
+                    )
+                    deduplicated_media_bytes_counter.inc(freed)
+                except OSError as e:
+                    logger.warning(
+                        "Unable to deduplicate local media %s: %s", media_id, e
+                    )
+
+            await self.store.set_local_media_sha256(media_id, sha256)
+
+        # Once we reach the end, start again from the beginning, to pick up any
+        # media stored while deduplication was disabled. Media which has been
+        # hashed isn't returned again, so later passes are cheap.
+        if len(media_ids) < DEDUPLICATE_MEDIA_BATCH_SIZE:
+            await self.store.set_local_media_deduplication_position("")
+        else:
+            await self.store.set_local_media_deduplication_position(media_ids[-1])
+
     async def get_local_media(
         self, request: SynapseRequest, media_id: str, name: Optional[str]
     ) -> None:
@@ -542,6 +696,8 @@ class MediaRepository:
             )
             return None
 
+        thumbnailer.draft(t_width, t_height)
+
         if thumbnailer.transpose_method is not None:
             m_width, m_height = thumbnailer.transpose()
 
@@ -757,6 +913,13 @@ class MediaRepository:
                 )
                 return None
 
+            # All the thumbnails are generated from the same decoded image, so
+            # it only needs to be as large as the largest of them.
+            thumbnailer.draft(
+                max(requirement.width for requirement in requirements),
+                max(requirement.height for requirement in requirements),
+            )
+
             if thumbnailer.transpose_method is not None:
                 m_width, m_height = await defer_to_thread(
                     self.hs.get_reactor(), thumbnailer.transpose
@@ -897,6 +1060,21 @@ class MediaRepository:
                 before_ts=remote_media_threshold_timestamp_ms
             )
 
+        # Then evict the least recently accessed remote media until the cache
+        # fits within its configured size
+        if self._media_retention_remote_media_max_size is not None:
+            media_to_evict = await self.store.get_remote_media_to_evict(
+                self._media_retention_remote_media_max_size
+            )
+            if media_to_evict:
+                logger.info(
+                    "Evicting %d remote media to keep the remote media cache under"
+                    " %d bytes",
+                    len(media_to_evict),
+                    self._media_retention_remote_media_max_size,
+                )
+                await self._delete_remote_media(media_to_evict)
+
         # And now do the same for local media
         if self._media_retention_local_media_lifetime_ms is not None:
             # This works the same as the remote media threshold
@@ -921,12 +1099,27 @@ class MediaRepository:
             before_ts, include_quarantined_media=False
         )
 
+        deleted = await self._delete_remote_media(old_media)
+
+        return {"deleted": deleted}
+
+    async def _delete_remote_media(self, media: Iterable[Dict[str, str]]) -> int:
+        """Delete the given media from the remote media cache, along with any
+        thumbnails.
+
+        Args:
+            media: dicts with the `media_origin`, `media_id` and `filesystem_id`
+                of the remote media to delete.
+
+        Returns:
+            The number of media deleted.
+        """
         deleted = 0
 
-        for media in old_media:
-            origin = media["media_origin"]
-            media_id = media["media_id"]
-            file_id = media["filesystem_id"]
+        for media_info in media:
+            origin = media_info["media_origin"]
+            media_id = media_info["media_id"]
+            file_id = media_info["filesystem_id"]
             key = (origin, media_id)
 
             logger.info("Deleting: %r", key)
@@ -952,7 +1145,7 @@ class MediaRepository:
                 await self.store.delete_remote_media(origin, media_id)
                 deleted += 1
 
-        return {"deleted": deleted}
+        return deleted
 
     async def delete_local_media_ids(
         self, media_ids: List[str]
@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import contextlib
+import hashlib
 import logging
 import os
 import shutil
@@ -100,6 +101,83 @@ class MediaStorage:
         """Asynchronously write the `source` to `output`."""
         await defer_to_thread(self.reactor, _write_file_synchronously, source, output)
 
+    async def hash_file(self, source: IO) -> str:
+        """Asynchronously calculate the hex encoded SHA-256 hash of `source`."""
+        return await defer_to_thread(self.reactor, _sha256_file_synchronously, source)
+
+    async def store_file_as_link(
+        self, existing_file_info: FileInfo, file_info: FileInfo
+    ) -> Optional[str]:
+        """Store a file by hard linking it to an identical file that is already
+        in the local media store, rather than writing another copy. The file is
+        still passed to the spam checker and written to any configured storage
+        providers.
+
+        Args:
+            existing_file_info: Info about the identical file that is stored.
+            file_info: Info about the file to store.
+
+        Returns:
+            The file path written to in the primary media store, or None if the
+            existing file couldn't be linked to, in which case the file should
+            be stored as normal.
+        """
+        existing_fname = os.path.join(
+            self.local_media_directory, self._file_info_to_path(existing_file_info)
+        )
+
+        try:
+            with self.store_into_file(file_info) as (f, fname, finish_cb):
+                # Swap the empty file we were given for a link to the existing one.
+                os.remove(fname)
+                os.link(existing_fname, fname)
+                await finish_cb()
+        except OSError as e:
+            logger.info("Unable to link %r to %r: %s", file_info, existing_fname, e)
+            return None
+
+        return fname
+
+    def replace_with_link(
+        self, existing_file_info: FileInfo, file_info: FileInfo
+    ) -> int:
+        """Replace a file in the local media store with a hard link to an
+        identical file.
+
+        Args:
+            existing_file_info: Info about the file to link to.
+            file_info: Info about the file to replace.
+
+        Returns:
+            The number of bytes freed, which is zero if the files were already
+            the same.
+
+        Raises:
+            OSError if the file couldn't be replaced.
+        """
+        existing_fname = os.path.join(
+            self.local_media_directory, self._file_info_to_path(existing_file_info)
+        )
+        fname = os.path.join(
+            self.local_media_directory, self._file_info_to_path(file_info)
+        )
+
+        if os.path.samefile(existing_fname, fname):
+            return 0
+
+        length = os.path.getsize(fname)
+
+        # Link to a temporary path first, so that the file is replaced atomically.
+        temp_fname = fname + ".link"
+        os.link(existing_fname, temp_fname)
+        try:
+            os.replace(temp_fname, fname)
+        except OSError:
+            os.remove(temp_fname)
+            raise
+
+        return length
+
     @contextlib.contextmanager
     def store_into_file(
         self, file_info: FileInfo
@@ -302,6 +380,17 @@ class MediaStorage:
         return self.filepaths.local_media_filepath_rel(file_info.file_id)
 
 
+def _sha256_file_synchronously(source: IO) -> str:
+    """Calculate the hex encoded SHA-256 hash of the file like `source`
+    synchronously. Should be called from a thread.
+    """
+    source.seek(0)  # Ensure we read from the start of the file
+    sha256 = hashlib.sha256()
+    for chunk in iter(lambda: source.read(2**16), b""):
+        sha256.update(chunk)
+    return sha256.hexdigest()
+
+
 def _write_file_synchronously(source: IO, dest: IO) -> None:
     """Write `source` to the file like `dest` synchronously. Should be called
     from a thread.
@@ -322,6 +411,8 @@ class FileResponder(Responder):
             is closed when finished streaming.
     """
 
+    supports_ranges = True
+
     def __init__(self, open_file: IO):
         self.open_file = open_file
 
@@ -330,6 +421,16 @@ class FileResponder(Responder):
             FileSender().beginFileTransfer(self.open_file, consumer)
         )
 
+    def write_range_to_consumer(
+        self, consumer: IConsumer, offset: int, length: int
+    ) -> Deferred:
+        self.open_file.seek(offset)
+        return make_deferred_yieldable(
+            FileSender().beginFileTransfer(
+                _LimitedFileReader(self.open_file, length), consumer
+            )
+        )
+
     def __exit__(
         self,
         exc_type: Optional[Type[BaseException]],
@@ -339,6 +440,19 @@ class FileResponder(Responder):
         self.open_file.close()
 
 
+class _LimitedFileReader:
+    """Wraps an open file so that at most `length` bytes can be read from it."""
+
+    def __init__(self, open_file: IO, length: int):
+        self.open_file = open_file
+        self.remaining = length
+
+    def read(self, size: int) -> bytes:
+        data = self.open_file.read(min(size, self.remaining))
+        self.remaining -= len(data)
+        return data
+
+
 class SpamMediaException(NotFoundError):
     """The media was blocked by a spam checker, so we simply 404 the request (in
     the same way as if it was quarantined).
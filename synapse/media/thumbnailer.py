@@ -31,6 +31,13 @@ EXIF_TRANSPOSE_MAPPINGS = {
     7: Image.TRANSVERSE,
     8: Image.ROTATE_90,
 }
+# The transpositions which swap the width and height of the image.
+EXIF_TRANSPOSE_SWAPS_DIMENSIONS = {
+    Image.TRANSPOSE,
+    Image.ROTATE_270,
+    Image.TRANSVERSE,
+    Image.ROTATE_90,
+}
 
 
 class ThumbnailError(Exception):
@@ -82,6 +89,23 @@ class Thumbnailer:
             # A lot of parsing errors can happen when parsing EXIF
             logger.info("Error parsing image EXIF information: %s", e)
 
+    def draft(self, width: int, height: int) -> None:
+        """Let the decoder shrink the image while loading it, as long as it
+        stays at least as large as the given size. This is a lot cheaper than
+        decoding the full image and resizing it, but is only supported for
+        JPEGs, and is a no-op for other formats.
+
+        Must be called before the image is transposed or thumbnailed. The width
+        and height of the thumbnailer keep referring to the original image.
+
+        Args:
+            width: The width of the largest thumbnail that will be generated.
+            height: The height of the largest thumbnail that will be generated.
+        """
+        if self.transpose_method in EXIF_TRANSPOSE_SWAPS_DIMENSIONS:
+            width, height = height, width
+        self.image.draft(self.image.mode, (width, height))
+
     def transpose(self) -> Tuple[int, int]:
         """Transpose the image using its EXIF Orientation tag
 
@@ -94,11 +118,14 @@ class Thumbnailer:
             # EXIF_TRANSPOSE_MAPPINGS, and that only contains correct values.
             with self.image:
                 self.image = self.image.transpose(self.transpose_method)  # type: ignore[arg-type]
-            self.width, self.height = self.image.size
+            # We don't use the size of the transposed image, as it may have been
+            # reduced by `draft`.
+            if self.transpose_method in EXIF_TRANSPOSE_SWAPS_DIMENSIONS:
+                self.width, self.height = self.height, self.width
             self.transpose_method = None
             # We don't need EXIF any more
             self.image.info["exif"] = None
-        return self.image.size
+        return self.width, self.height
 
     def aspect(self, max_width: int, max_height: int) -> Tuple[int, int]:
         """Calculate the largest size that preserves aspect ratio which
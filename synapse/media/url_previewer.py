@@ -22,7 +22,7 @@ import shutil
 import sys
 import traceback
 from typing import TYPE_CHECKING, BinaryIO, Iterable, Optional, Tuple
-from urllib.parse import urljoin, urlparse, urlsplit
+from urllib.parse import urljoin, urlparse, urlsplit, urlunsplit
 from urllib.request import urlopen
 
 import attr
@@ -32,7 +32,11 @@ from twisted.internet.error import DNSLookupError
 
 from synapse.api.errors import Codes, SynapseError
 from synapse.http.client import SimpleHttpClient
-from synapse.logging.context import make_deferred_yieldable, run_in_background
+from synapse.logging.context import (
+    defer_to_thread,
+    make_deferred_yieldable,
+    run_in_background,
+)
 from synapse.media._base import FileInfo, get_filename_from_headers
 from synapse.media.media_storage import MediaStorage
 from synapse.media.oembed import OEmbedProvider
@@ -57,6 +61,9 @@ ONE_HOUR = 60 * 60 * 1000
 ONE_DAY = 24 * ONE_HOUR
 IMAGE_CACHE_EXPIRY_MS = 2 * ONE_DAY
 
+# The maximum number of previews to hold in the in-memory cache.
+URL_PREVIEW_CACHE_MAX_LEN = 1000
+
 
 @attr.s(slots=True, frozen=True, auto_attribs=True)
 class DownloadResult:
@@ -120,8 +127,8 @@ class UrlPreviewer:
           1. Generates thumbnails.
           2. Generates an Open Graph response based on image properties.
        5. If the media is HTML:
-          1. Decodes the HTML via the stored file.
-          2. Generates an Open Graph response from the HTML.
+          1. Decodes the HTML via the stored file, in a separate thread.
+          2. Generates an Open Graph response from the HTML, in the same thread.
           3. If a JSON oEmbed URL was found in the HTML via autodiscovery:
              1. Downloads the URL and stores it into a file via the media storage provider
                 and saves the local media metadata.
@@ -146,7 +153,8 @@ class UrlPreviewer:
     image thumbnailing, step 5.4 or 6.4) fails then the URL preview as a whole
     does not fail. As much information as possible is returned.
 
-    The in-memory cache expires after 1 hour.
+    The in-memory cache is keyed by the URL with its scheme and host lowercased and
+    any fragment removed. It holds up to 1000 entries, which expire after 1 hour.
 
     Expired entries in the database cache (and their associated media files) are
     deleted every 10 seconds. The default expiration time is 1 hour from download.
@@ -159,6 +167,7 @@ class UrlPreviewer:
         media_storage: MediaStorage,
     ):
         self.clock = hs.get_clock()
+        self.reactor = hs.get_reactor()
         self.filepaths = media_repo.filepaths
         self.max_spider_size = hs.config.media.max_spider_size
         self.server_name = hs.hostname
@@ -188,11 +197,12 @@ class UrlPreviewer:
         self.url_preview_url_blacklist = hs.config.media.url_preview_url_blacklist
         self.url_preview_accept_language = hs.config.media.url_preview_accept_language
 
-        # memory cache mapping urls to an ObservableDeferred returning
+        # memory cache mapping normalised urls to an ObservableDeferred returning
         # JSON-encoded OG metadata
         self._cache: ExpiringCache[str, ObservableDeferred] = ExpiringCache(
             cache_name="url_previews",
             clock=self.clock,
+            max_len=URL_PREVIEW_CACHE_MAX_LEN,
             # don't spider URLs more often than once an hour
             expiry_ms=ONE_HOUR,
         )
@@ -246,12 +256,13 @@ class UrlPreviewer:
         # * also caches any failures (unlike the DB) so we don't keep
         #    requesting the same endpoint
 
-        observable = self._cache.get(url)
+        cache_key = _normalise_url(url)
+        observable = self._cache.get(cache_key)
 
         if not observable:
             download = run_in_background(self._do_preview, url, user, ts)
             observable = ObservableDeferred(download, consumeErrors=True)
-            self._cache[url] = observable
+            self._cache[cache_key] = observable
         else:
             logger.info("Returning cached response")
 
@@ -320,14 +331,15 @@ class UrlPreviewer:
         elif _is_html(media_info.media_type):
             # TODO: somehow stop a big HTML tree from exploding synapse's RAM
 
-            with open(media_info.filename, "rb") as file:
-                body = file.read()
-
-            tree = decode_body(body, media_info.uri, media_info.media_type)
-            if tree is not None:
+            # Parsing the HTML can take a while for large documents, so do it
+            # off the reactor thread.
+            parsed_html = await defer_to_thread(
+                self.reactor, self._parse_html, media_info
+            )
+            if parsed_html is not None:
                 # Check if this HTML document points to oEmbed information and
                 # defer to that.
-                oembed_url = self._oembed.autodiscover_from_html(tree)
+                oembed_url, og_from_html = parsed_html
                 og_from_oembed: JsonDict = {}
                 if oembed_url:
                     try:
@@ -350,10 +362,6 @@ class UrlPreviewer:
                             url, oembed_info, expiration_ms
                         )
 
-                # Parse Open Graph information from the HTML in case the oEmbed
-                # response failed or is incomplete.
-                og_from_html = parse_html_to_open_graph(tree)
-
                 # Compile the Open Graph response by using the scraped
                 # information from the HTML and overlaying any information
                 # from the oEmbed response.
@@ -411,6 +419,34 @@ class UrlPreviewer:
 
         return jsonog.encode("utf8")
 
+    def _parse_html(
+        self, media_info: MediaInfo
+    ) -> Optional[Tuple[Optional[str], JsonDict]]:
+        """
+        Parse a downloaded HTML document. This is blocking, so should be run in a
+        separate thread.
+
+        Args:
+            media_info: The media info for the downloaded HTML document.
+
+        Returns:
+            None if the document could not be parsed, otherwise a tuple of:
+                * The oEmbed URL that the document points to, if any.
+                * The Open Graph information scraped from the document.
+        """
+        with open(media_info.filename, "rb") as file:
+            body = file.read()
+
+        tree = decode_body(body, media_info.uri, media_info.media_type)
+        if tree is None:
+            return None
+
+        oembed_url = self._oembed.autodiscover_from_html(tree)
+
+        # Parse Open Graph information from the HTML in case the oEmbed
+        # response fails or is incomplete.
+        return oembed_url, parse_html_to_open_graph(tree)
+
     async def _download_url(self, url: str, output_stream: BinaryIO) -> DownloadResult:
         """
         Fetches a remote URL and parses the headers.
@@ -811,6 +847,26 @@ class UrlPreviewer:
             logger.debug("No media removed from url preview cache")
 
 
+def _normalise_url(url: str) -> str:
+    """Normalise a URL for use as a key in the in-memory preview cache.
+
+    The scheme and host are case insensitive, and the fragment is never sent to
+    the remote server, so URLs which only differ in those map to the same
+    preview.
+    """
+    url_tuple = urlsplit(url)
+    userinfo, sep, host = url_tuple.netloc.rpartition("@")
+    return urlunsplit(
+        (
+            url_tuple.scheme.lower(),
+            userinfo + sep + host.lower(),
+            url_tuple.path,
+            url_tuple.query,
+            "",
+        )
+    )
+
+
 def _is_media(content_type: str) -> bool:
     return content_type.lower().startswith("image/")
 
@@ -0,0 +1,291 @@
+# Copyright 2023 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""A low overhead sampling profiler, which attributes the CPU used by the
+reactor thread to the request or background process that was using it.
+
+The samples are taken by a separate thread, which wakes up once per sample
+interval and reads the reactor thread's stack with `sys._current_frames`. It
+only takes a sample once the reactor thread has used another interval's worth of
+CPU time, so an idle server isn't sampled. The reactor thread's current
+logcontext is stored in thread local storage, so it is also kept somewhere the
+sampling thread can read it (see `track_current_context_of_thread`).
+
+We don't use a `SIGPROF` interval timer instead, as the signals interrupt
+system calls with `EINTR`, and each one wakes up the reactor.
+"""
+
+import logging
+import sys
+import threading
+import time
+from types import FrameType
+from typing import TYPE_CHECKING, Dict, Iterable, Optional
+
+from prometheus_client import REGISTRY, Metric
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+from synapse.logging.context import (
+    LoggingContextOrSentinel,
+    current_context,
+    get_tracked_thread_context,
+    track_current_context_of_thread,
+)
+from synapse.metrics.background_process_metrics import BackgroundProcessLoggingContext
+
+if TYPE_CHECKING:
+    from synapse.server import HomeServer
+
+logger = logging.getLogger(__name__)
+
+# The HTTP methods which are included in sample tags. The tags are used as a
+# prometheus label, so must come from a bounded set: requests with any other
+# method are tagged as `other`.
+_TAGGED_METHODS = frozenset(
+    {"GET", "POST", "PUT", "DELETE", "OPTIONS", "HEAD", "PATCH"}
+)
+
+
+def get_sample_tag(context: LoggingContextOrSentinel) -> str:
+    """Work out what the given logcontext is doing, for attributing samples.
+
+    The tags are used as a prometheus label, so they only include names which
+    are defined in the code.
+
+    Returns:
+        `servlet:<method> <servlet name>` for requests which were routed to a
+        servlet, `background_process:<description>` for background processes,
+        `reactor` if there is no active logcontext, and `other` for anything
+        else.
+    """
+    if not context:
+        return "reactor"
+
+    request = context.request
+    if request is not None:
+        if request.method not in _TAGGED_METHODS or request.servlet_name is None:
+            return "other"
+        return "servlet:%s %s" % (request.method, request.servlet_name)
+
+    while context.parent_context is not None:
+        context = context.parent_context
+
+    if isinstance(context, BackgroundProcessLoggingContext):
+        return "background_process:%s" % (context.desc,)
+
+    return "other"
+
+
+def fold_stack(frame: Optional[FrameType]) -> str:
+    """Convert a stack into the "folded" format used to render flame graphs,
+    i.e. a `;` separated list of functions, starting from the outermost frame.
+    """
+    functions = []
+    while frame is not None:
+        code = frame.f_code
+        functions.append(
+            "%s (%s:%d)" % (code.co_name, code.co_filename, code.co_firstlineno)
+        )
+        frame = frame.f_back
+
+    functions.reverse()
+    return ";".join(functions)
+
+
+class SamplingProfiler(Collector):
+    """Periodically samples the stack of the reactor thread, and aggregates the
+    samples by folded stack, for each tag returned by `get_sample_tag`.
+
+    The number of distinct stacks that are stored is bounded. Samples with a
+    stack that isn't already known are dropped once the bound is reached, but
+    are still counted against their tag.
+
+    The per-tag sample counts are also exported as a prometheus metric, so that
+    CPU usage can be graphed per servlet or background process.
+
+    The stored samples are protected by a lock, as they are written by the
+    sampling thread and read by the reactor thread.
+    """
+
+    def __init__(self, hs: "HomeServer"):
+        self._interval_sec = hs.config.metrics.sampling_profiler_interval_ms / 1000
+        self._max_stacks = hs.config.metrics.sampling_profiler_max_stacks
+
+        self._lock = threading.Lock()
+
+        # The total number of samples recorded for each tag.
+        self._samples_by_tag: Dict[str, int] = {}
+
+        # The number of samples recorded for each folded stack, by tag.
+        self._stacks_by_tag: Dict[str, Dict[str, int]] = {}
+        self._num_stacks = 0
+
+        # The number of samples which were dropped because we had already
+        # stored `_max_stacks` stacks.
+        self._dropped_samples = 0
+
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    @property
+    def sample_interval_ms(self) -> int:
+        return round(self._interval_sec * 1000)
+
+    def start(self) -> None:
+        """Start sampling the current thread, which should be the reactor
+        thread.
+        """
+        if self._thread is not None:
+            return
+
+        thread_id = threading.get_ident()
+        track_current_context_of_thread(thread_id)
+        REGISTRY.register(self)
+
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(thread_id,),
+            name="sampling-profiler",
+            daemon=True,
+        )
+        self._thread.start()
+
+        logger.info(
+            "Started sampling profiler with a %dms interval", self.sample_interval_ms
+        )
+
+    def stop(self) -> None:
+        """Stop sampling, and wait for the sampling thread to exit."""
+        if self._thread is None:
+            return
+
+        self._stopping.set()
+        self._thread.join()
+        self._thread = None
+
+        track_current_context_of_thread(None)
+        REGISTRY.unregister(self)
+
+    def _run(self, thread_id: int) -> None:
+        """The body of the sampling thread."""
+        # We only want to sample the reactor thread while it is using CPU, so we
+        # only take a sample once it has used another interval's worth of CPU
+        # time. If we can't read the thread's CPU time (e.g. on macOS) we take a
+        # sample every interval instead.
+        try:
+            clock_id: Optional[int] = time.pthread_getcpuclockid(thread_id)
+        except (AttributeError, OSError):
+            logger.warning(
+                "Unable to read the CPU time of the reactor thread: the sampling "
+                "profiler will sample it every %dms, even when idle",
+                self.sample_interval_ms,
+            )
+            clock_id = None
+
+        last_thread_time = 0.0 if clock_id is None else time.clock_gettime(clock_id)
+        unsampled_thread_time = 0.0
+
+        while not self._stopping.wait(self._interval_sec):
+            if clock_id is not None:
+                now = time.clock_gettime(clock_id)
+                unsampled_thread_time += now - last_thread_time
+                last_thread_time = now
+
+                if unsampled_thread_time < self._interval_sec:
+                    continue
+
+                # Don't let a backlog build up if we were slow to wake up.
+                unsampled_thread_time = min(
+                    unsampled_thread_time - self._interval_sec, self._interval_sec
+                )
+
+            # The reactor thread can't change its stack or logcontext while we
+            # hold the GIL, so these are consistent with each other.
+            frame = sys._current_frames().get(thread_id)
+            if frame is None:
+                # The thread has exited.
+                return
+            self.record_sample(frame, get_tracked_thread_context())
+
+    def record_sample(
+        self,
+        frame: Optional[FrameType],
+        context: Optional[LoggingContextOrSentinel] = None,
+    ) -> None:
+        """Record a sample of the given stack.
+
+        Args:
+            frame: The innermost frame of the sampled stack.
+            context: The logcontext to attribute the sample to. Defaults to the
+                current logcontext.
+        """
+        if context is None:
+            context = current_context()
+        tag = get_sample_tag(context)
+        stack = fold_stack(frame)
+
+        with self._lock:
+            self._samples_by_tag[tag] = self._samples_by_tag.get(tag, 0) + 1
+
+            stacks = self._stacks_by_tag.setdefault(tag, {})
+            if stack in stacks:
+                stacks[stack] += 1
+            elif self._num_stacks < self._max_stacks:
+                stacks[stack] = 1
+                self._num_stacks += 1
+            else:
+                self._dropped_samples += 1
+
+    def get_samples_by_tag(self) -> Dict[str, int]:
+        """Get the total number of samples recorded for each tag."""
+        with self._lock:
+            return dict(self._samples_by_tag)
+
+    def get_stacks_by_tag(self) -> Dict[str, Dict[str, int]]:
+        """Get the number of samples recorded for each folded stack, by tag."""
+        with self._lock:
+            return {tag: dict(stacks) for tag, stacks in self._stacks_by_tag.items()}
+
+    @property
+    def dropped_samples(self) -> int:
+        return self._dropped_samples
+
+    def reset(self) -> None:
+        """Discard all of the stored stacks.
+
+        The per-tag sample counts are left alone, as they are exported as
+        (monotonic) prometheus counters.
+        """
+        with self._lock:
+            self._stacks_by_tag = {}
+            self._num_stacks = 0
+            self._dropped_samples = 0
+
+    def collect(self) -> Iterable[Metric]:
+        samples = CounterMetricFamily(
+            "synapse_sampling_profiler_samples",
+            "Number of samples taken by the sampling profiler",
+            labels=["tag"],
+        )
+        for tag, count in self.get_samples_by_tag().items():
+            samples.add_metric([tag], count)
+        yield samples
+
+        yield GaugeMetricFamily(
+            "synapse_sampling_profiler_sample_interval_seconds",
+            "The CPU time represented by each sample taken by the sampling profiler",
+            value=self._interval_sec,
+        )
@@ -18,7 +18,7 @@ allowed to be sent by which side.
 """
 import abc
 import logging
-from typing import Optional, Tuple, Type, TypeVar
+from typing import List, Optional, Tuple, Type, TypeVar
 
 from synapse.replication.tcp.streams._base import StreamRow
 from synapse.util import json_decoder, json_encoder
@@ -68,6 +68,17 @@ class Command(metaclass=abc.ABCMeta):
         return prefix
 
 
+def stream_channel_name(stream_name: str) -> str:
+    """Returns the name of the Redis channel upon which updates to the given
+    replication stream are published if `replication_stream_channels` is
+    enabled, without the prefix.
+
+    Args:
+        stream_name: The name of the replication stream.
+    """
+    return f"STREAM/{stream_name}"
+
+
 SC = TypeVar("SC", bound="_SimpleCommand")
 
 
@@ -156,6 +167,60 @@ class RdataCommand(Command):
         return "RDATA-" + self.stream_name
 
 
+class RdataBatchCommand(Command):
+    """Sent by server when a subscribed stream has a batch of updates.
+
+    Format::
+
+        RDATA_BATCH <stream_name> <instance_name> <updates_json>
+
+    `<updates_json>` is a JSON list of `[token, row]` pairs, in stream order. This
+    carries the same information as the series of RDATA commands that would be
+    sent for those updates, but as a single command. Rows with the same token
+    are handled together, as for batched RDATA.
+
+    Only sent if `replication_batch_rdata` is enabled in the experimental
+    features.
+
+    An example of a RDATA_BATCH::
+
+        RDATA_BATCH presence master [[59, ["@foo:example.com", "online", ...]], ...]
+    """
+
+    NAME = "RDATA_BATCH"
+
+    def __init__(
+        self,
+        stream_name: str,
+        instance_name: str,
+        updates: List[Tuple[int, StreamRow]],
+    ):
+        self.stream_name = stream_name
+        self.instance_name = instance_name
+        self.updates = updates
+
+    @classmethod
+    def from_line(cls: Type["RdataBatchCommand"], line: str) -> "RdataBatchCommand":
+        stream_name, instance_name, updates_json = line.split(" ", 2)
+        return cls(
+            stream_name,
+            instance_name,
+            [(int(token), row) for token, row in json_decoder.decode(updates_json)],
+        )
+
+    def to_line(self) -> str:
+        return " ".join(
+            (
+                self.stream_name,
+                self.instance_name,
+                json_encoder.encode(self.updates),
+            )
+        )
+
+    def get_logcontext_id(self) -> str:
+        return "RDATA-" + self.stream_name
+
+
 class PositionCommand(Command):
     """Sent by an instance to tell others the stream position without needing to
     send an RDATA.
@@ -425,6 +490,7 @@ class RemoteServerUpCommand(_SimpleCommand):
 _COMMANDS: Tuple[Type[Command], ...] = (
     ServerCommand,
     RdataCommand,
+    RdataBatchCommand,
     PositionCommand,
     ErrorCommand,
     PingCommand,
@@ -444,6 +510,7 @@ COMMAND_MAP = {cmd.NAME: cmd for cmd in _COMMANDS}
 VALID_SERVER_COMMANDS = (
     ServerCommand.NAME,
     RdataCommand.NAME,
+    RdataBatchCommand.NAME,
     PositionCommand.NAME,
     ErrorCommand.NAME,
     PingCommand.NAME,
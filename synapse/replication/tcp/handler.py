@@ -28,11 +28,14 @@ from typing import (
     Union,
 )
 
+import attr
 from prometheus_client import Counter
 from typing_extensions import Deque
 
+from twisted.internet.defer import Deferred
 from twisted.internet.protocol import ReconnectingClientFactory
 
+from synapse.logging.context import make_deferred_yieldable, run_in_background
 from synapse.metrics import LaterGauge
 from synapse.metrics.background_process_metrics import run_as_background_process
 from synapse.replication.tcp.commands import (
@@ -40,11 +43,13 @@ from synapse.replication.tcp.commands import (
     Command,
     FederationAckCommand,
     PositionCommand,
+    RdataBatchCommand,
     RdataCommand,
     RemoteServerUpCommand,
     ReplicateCommand,
     UserIpCommand,
     UserSyncCommand,
+    stream_channel_name,
 )
 from synapse.replication.tcp.protocol import IReplicationConnection
 from synapse.replication.tcp.streams import (
@@ -61,6 +66,10 @@ from synapse.replication.tcp.streams import (
     ToDeviceStream,
     TypingStream,
 )
+from synapse.replication.tcp.streams._base import (
+    _STREAM_CATCH_UP_TARGET_ROW_COUNT,
+    StreamUpdateResult,
+)
 
 if TYPE_CHECKING:
     from synapse.server import HomeServer
@@ -79,9 +88,67 @@ remove_pusher_counter = Counter("synapse_replication_tcp_resource_remove_pusher"
 user_ip_cache_counter = Counter("synapse_replication_tcp_resource_user_ip_cache", "")
 
 
+# Streams which are only consumed by federation senders.
+_FEDERATION_SENDER_STREAMS = (FederationStream.NAME, PresenceFederationStream.NAME)
+
+# HTTP resources whose requests only need cache invalidations from replication.
+_CACHES_ONLY_RESOURCES = {"health", "media", "metrics"}
+
+
+def _get_streams_used_by_instance(
+    hs: "HomeServer", stream_names: Iterable[str]
+) -> List[str]:
+    """Work out which of the given replication streams this instance uses.
+
+    Every instance uses the caches stream, to invalidate its caches. The streams
+    only used to send federation are used by federation senders. The other
+    streams are used by the main process and by workers which serve requests
+    other than media, write to a stream, or run pushers, application service
+    notifications, the user directory or background tasks. So a worker that
+    only serves media only uses the caches stream.
+    """
+    worker_config = hs.config.worker
+    instance_name = hs.get_instance_name()
+
+    resource_names = set()
+    for listener in worker_config.worker_listeners:
+        if listener.http_options:
+            for resource in listener.http_options.resources:
+                resource_names.update(resource.names)
+
+    uses_all_streams = (
+        worker_config.worker_app is None
+        or not resource_names <= _CACHES_ONLY_RESOURCES
+        or any(
+            instance_name in instances
+            for instances in attr.astuple(worker_config.writers)
+        )
+        or hs.should_send_federation()
+        or worker_config.start_pushers
+        or worker_config.should_notify_appservices
+        or worker_config.should_update_user_directory
+        or worker_config.run_background_tasks
+    )
+
+    used_streams = []
+    for stream_name in stream_names:
+        if stream_name in _FEDERATION_SENDER_STREAMS:
+            used = hs.should_send_federation()
+        else:
+            used = uses_all_streams or stream_name == CachesStream.NAME
+
+        if used:
+            used_streams.append(stream_name)
+
+    return used_streams
+
+
 # the type of the entries in _command_queues_by_stream
 _StreamCommandQueue = Deque[
-    Tuple[Union[RdataCommand, PositionCommand], IReplicationConnection]
+    Tuple[
+        Union[RdataCommand, RdataBatchCommand, PositionCommand],
+        IReplicationConnection,
+    ]
 ]
 
 
@@ -247,6 +314,15 @@ class ReplicationCommandHandler:
         if self._is_master or self._should_insert_client_ips:
             self.subscribe_to_channel("USER_IP")
 
+        # When using Redis, updates to each stream may be published on their own
+        # channel (see `replication_stream_channels`). Only subscribe to the
+        # streams this instance uses, so that it doesn't receive and parse
+        # updates that it would ignore anyway. We subscribe to these whether or
+        # not we publish on them ourselves, so that the option can be enabled
+        # one process at a time.
+        for stream_name in _get_streams_used_by_instance(hs, self._streams):
+            self.subscribe_to_channel(stream_channel_name(stream_name))
+
     def subscribe_to_channel(self, channel_name: str) -> None:
         """
         Indicates that we wish to subscribe to a Redis channel by name.
@@ -270,7 +346,9 @@ class ReplicationCommandHandler:
             self._channels_to_subscribe_to.append(channel_name)
 
     def _add_command_to_stream_queue(
-        self, conn: IReplicationConnection, cmd: Union[RdataCommand, PositionCommand]
+        self,
+        conn: IReplicationConnection,
+        cmd: Union[RdataCommand, RdataBatchCommand, PositionCommand],
     ) -> None:
         """Queue the given received command for processing
 
@@ -316,7 +394,7 @@ class ReplicationCommandHandler:
 
     async def _process_command(
         self,
-        cmd: Union[PositionCommand, RdataCommand],
+        cmd: Union[PositionCommand, RdataCommand, RdataBatchCommand],
         conn: IReplicationConnection,
         stream_name: str,
     ) -> None:
@@ -324,6 +402,8 @@ class ReplicationCommandHandler:
             await self._process_position(stream_name, conn, cmd)
         elif isinstance(cmd, RdataCommand):
             await self._process_rdata(stream_name, conn, cmd)
+        elif isinstance(cmd, RdataBatchCommand):
+            await self._process_rdata_batch(stream_name, conn, cmd)
         else:
             # This shouldn't be possible
             raise Exception("Unrecognised command %s in stream queue", cmd.NAME)
@@ -528,6 +608,60 @@ class ReplicationCommandHandler:
         else:
             await self.on_rdata(stream_name, cmd.instance_name, cmd.token, rows)
 
+    def on_RDATA_BATCH(
+        self, conn: IReplicationConnection, cmd: RdataBatchCommand
+    ) -> None:
+        if cmd.instance_name == self._instance_name:
+            # Ignore RDATA_BATCH that are just our own echoes
+            return
+
+        stream_name = cmd.stream_name
+        inbound_rdata_count.labels(stream_name).inc(len(cmd.updates))
+
+        # As with RDATA, queue the command so that it is processed in order with
+        # the other commands for this stream.
+        self._add_command_to_stream_queue(conn, cmd)
+
+    async def _process_rdata_batch(
+        self, stream_name: str, conn: IReplicationConnection, cmd: RdataBatchCommand
+    ) -> None:
+        """Process an RDATA_BATCH command
+
+        Called after the command has been popped off the queue of inbound commands
+        """
+        try:
+            stream_row_parser = STREAMS_MAP[stream_name].parse_row
+            updates = [(token, stream_row_parser(row)) for token, row in cmd.updates]
+        except Exception as e:
+            raise Exception(
+                "Failed to parse RDATA_BATCH: %r %r" % (stream_name, cmd.updates)
+            ) from e
+
+        # As for RDATA, drop the updates if we haven't processed a POSITION for
+        # this stream on this connection.
+        sbc = self._streams_by_connection.get(conn)
+        if not sbc or stream_name not in sbc:
+            logger.debug(
+                "Discarding RDATA_BATCH for unconnected stream %s", stream_name
+            )
+            return
+
+        stream = self._streams[stream_name]
+
+        for token, rows in _batch_updates(updates):
+            # Discard any updates from before the current position, as for RDATA.
+            current_token = stream.current_token(cmd.instance_name)
+            if token <= current_token:
+                logger.debug(
+                    "Discarding RDATA_BATCH from stream %s at position %s before previous position %s",
+                    stream_name,
+                    token,
+                    current_token,
+                )
+                continue
+
+            await self.on_rdata(stream_name, cmd.instance_name, token, rows)
+
     async def on_rdata(
         self, stream_name: str, instance_name: str, token: int, rows: list
     ) -> None:
@@ -579,37 +713,59 @@ class ReplicationCommandHandler:
         # date and there's nothing to do. Otherwise, fetch all updates
         # between then and now.
         missing_updates = cmd.prev_token != current_token
-        while missing_updates:
-            # Note: There may very well not be any new updates, but we check to
-            # make sure. This can particularly happen for the event stream where
-            # event persisters continuously send `POSITION`. See `resource.py`
-            # for why this can happen.
-
+        next_updates: Optional["Deferred[StreamUpdateResult]"] = None
+        if missing_updates:
             logger.info(
                 "Fetching replication rows for '%s' between %i and %i",
                 stream_name,
                 current_token,
                 cmd.new_token,
             )
-            (updates, current_token, missing_updates) = await stream.get_updates_since(
-                cmd.instance_name, current_token, cmd.new_token
+            next_updates = self._fetch_catch_up_updates(
+                stream, cmd.instance_name, current_token, cmd.new_token
+            )
+
+        while next_updates is not None:
+            # Note: There may very well not be any new updates, but we check to
+            # make sure. This can particularly happen for the event stream where
+            # event persisters continuously send `POSITION`. See `resource.py`
+            # for why this can happen.
+            (updates, current_token, missing_updates) = await make_deferred_yieldable(
+                next_updates
             )
 
-            # TODO: add some tests for this
+            # If there are more updates to come then start fetching the next
+            # page while we process this one, so that we're not waiting on the
+            # database (or the writer) between pages.
+            next_updates = None
+            if missing_updates:
+                next_updates = self._fetch_catch_up_updates(
+                    stream, cmd.instance_name, current_token, cmd.new_token
+                )
 
             # Some streams return multiple rows with the same stream IDs,
             # which need to be processed in batches.
-
-            for token, rows in _batch_updates(updates):
-                await self.on_rdata(
-                    stream_name,
-                    cmd.instance_name,
-                    token,
-                    [stream.parse_row(row) for row in rows],
+            try:
+                for token, rows in _batch_updates(updates):
+                    await self.on_rdata(
+                        stream_name,
+                        cmd.instance_name,
+                        token,
+                        [stream.parse_row(row) for row in rows],
+                    )
+            except Exception:
+                if next_updates is not None:
+                    # We're not going to wait for the next page, so make sure
+                    # that any failure fetching it doesn't get reported as an
+                    # unhandled error.
+                    next_updates.addErrback(lambda _: None)
+                raise
+
+            if not missing_updates:
+                logger.info(
+                    "Caught up with stream '%s' to %i", stream_name, cmd.new_token
                 )
 
-            logger.info("Caught up with stream '%s' to %i", stream_name, cmd.new_token)
-
         # We've now caught up to position sent to us, notify handler.
         await self._replication_data_handler.on_position(
             cmd.stream_name, cmd.instance_name, cmd.new_token
@@ -617,6 +773,28 @@ class ReplicationCommandHandler:
 
         self._streams_by_connection.setdefault(conn, set()).add(stream_name)
 
+    def _fetch_catch_up_updates(
+        self,
+        stream: Stream,
+        instance_name: str,
+        from_token: int,
+        upto_token: int,
+    ) -> "Deferred[StreamUpdateResult]":
+        """Start fetching a page of updates for a stream we're catching up on.
+
+        Returns:
+            A deferred which resolves to the result of `get_updates_since`. It
+            follows the synapse logcontext rules, so must be awaited via
+            `make_deferred_yieldable`.
+        """
+        return run_in_background(
+            stream.get_updates_since,
+            instance_name,
+            from_token,
+            upto_token,
+            _STREAM_CATCH_UP_TARGET_ROW_COUNT,
+        )
+
     def on_REMOTE_SERVER_UP(
         self, conn: IReplicationConnection, cmd: RemoteServerUpCommand
     ) -> None:
@@ -731,6 +909,16 @@ class ReplicationCommandHandler:
         """
         self.send_command(RdataCommand(stream_name, self._instance_name, token, data))
 
+    def stream_updates(self, stream_name: str, updates: List[Tuple[int, Any]]) -> None:
+        """Called when a batch of new updates is available to stream to Redis
+        subscribers, if `replication_batch_rdata` is enabled.
+
+        Args:
+            stream_name: the stream the updates are for.
+            updates: a list of `(token, row)` pairs, in stream order.
+        """
+        self.send_command(RdataBatchCommand(stream_name, self._instance_name, updates))
+
 
 UpdateToken = TypeVar("UpdateToken")
 UpdateRow = TypeVar("UpdateRow")
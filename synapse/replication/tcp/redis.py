@@ -32,8 +32,12 @@ from synapse.metrics.background_process_metrics import (
 )
 from synapse.replication.tcp.commands import (
     Command,
+    PositionCommand,
+    RdataBatchCommand,
+    RdataCommand,
     ReplicateCommand,
     parse_command_from_line,
+    stream_channel_name,
 )
 from synapse.replication.tcp.protocol import (
     IReplicationConnection,
@@ -89,12 +93,15 @@ class RedisSubscriber(txredisapi.SubscriberProtocol):
             from (not anything to do with Synapse replication streams).
         synapse_outbound_redis_connection: The connection to redis to use to send
             commands.
+        synapse_use_stream_channels: Whether to publish updates to replication
+            streams on a channel per stream, rather than the main channel.
     """
 
     synapse_handler: "ReplicationCommandHandler"
     synapse_stream_prefix: str
     synapse_channel_names: List[str]
     synapse_outbound_redis_connection: txredisapi.ConnectionHandler
+    synapse_use_stream_channels: bool
 
     def __init__(self, *args: Any, **kwargs: Any):
         super().__init__(*args, **kwargs)
@@ -221,7 +228,14 @@ class RedisSubscriber(txredisapi.SubscriberProtocol):
         # remote instances.
         tcp_outbound_commands_counter.labels(cmd.NAME, "redis").inc()
 
-        channel_name = cmd.redis_channel_name(self.synapse_stream_prefix)
+        if self.synapse_use_stream_channels and isinstance(
+            cmd, (RdataCommand, RdataBatchCommand, PositionCommand)
+        ):
+            channel_name = (
+                f"{self.synapse_stream_prefix}/{stream_channel_name(cmd.stream_name)}"
+            )
+        else:
+            channel_name = cmd.redis_channel_name(self.synapse_stream_prefix)
 
         await make_deferred_yieldable(
             self.synapse_outbound_redis_connection.publish(channel_name, encoded_string)
@@ -340,6 +354,9 @@ class RedisDirectTcpReplicationClientFactory(SynapseRedisFactory):
         self.synapse_handler = hs.get_replication_command_handler()
         self.synapse_stream_prefix = hs.hostname
         self.synapse_channel_names = channel_names
+        self.synapse_use_stream_channels = (
+            hs.config.experimental.replication_stream_channels
+        )
 
         self.synapse_outbound_redis_connection = outbound_redis_connection
 
@@ -355,6 +372,7 @@ class RedisDirectTcpReplicationClientFactory(SynapseRedisFactory):
         p.synapse_outbound_redis_connection = self.synapse_outbound_redis_connection
         p.synapse_stream_prefix = self.synapse_stream_prefix
         p.synapse_channel_names = self.synapse_channel_names
+        p.synapse_use_stream_channels = self.synapse_use_stream_channels
 
         return p
 
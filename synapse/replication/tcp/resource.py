@@ -78,6 +78,7 @@ class ReplicationStreamer:
         self._instance_name = hs.get_instance_name()
 
         self._replication_torture_level = hs.config.server.replication_torture_level
+        self._batch_rdata = hs.config.experimental.replication_batch_rdata
 
         self.notifier.add_replication_callback(self.on_notifier_poke)
 
@@ -223,20 +224,31 @@ class ReplicationStreamer:
                             )
                             continue
 
-                        # Some streams return multiple rows with the same stream IDs,
-                        # we need to make sure they get sent out in batches. We do
-                        # this by setting the current token to all but the last of
-                        # a series of updates with the same token to have a None
-                        # token. See RdataCommand for more details.
-                        batched_updates = _batch_updates(updates)
-
-                        for token, row in batched_updates:
+                        if self._batch_rdata:
+                            # Send all the updates in a single command. See
+                            # RdataBatchCommand for more details.
                             try:
-                                self.command_handler.stream_update(
-                                    stream.NAME, token, row
+                                self.command_handler.stream_updates(
+                                    stream.NAME, updates
                                 )
                             except Exception:
                                 logger.exception("Failed to replicate")
+                        else:
+                            # Some streams return multiple rows with the same
+                            # stream IDs, we need to make sure they get sent out
+                            # in batches. We do this by setting the current token
+                            # to all but the last of a series of updates with the
+                            # same token to have a None token. See RdataCommand
+                            # for more details.
+                            batched_updates = _batch_updates(updates)
+
+                            for token, row in batched_updates:
+                                try:
+                                    self.command_handler.stream_update(
+                                        stream.NAME, token, row
+                                    )
+                                except Exception:
+                                    logger.exception("Failed to replicate")
 
                         # The last token we send may not match the current
                         # token, in which case we want to send out a `POSITION`
@@ -39,6 +39,12 @@ logger = logging.getLogger(__name__)
 # the number of rows to request from an update_function.
 _STREAM_UPDATE_TARGET_ROW_COUNT = 100
 
+# the number of rows to request from an update_function when catching up after
+# a `POSITION` command. This is larger than `_STREAM_UPDATE_TARGET_ROW_COUNT`
+# so that workers which have fallen far behind need fewer round trips to
+# catch up.
+_STREAM_CATCH_UP_TARGET_ROW_COUNT = 1000
+
 
 # Some type aliases to make things a bit easier.
 
@@ -164,11 +170,21 @@ class Stream:
         return updates, current_token, limited
 
     async def get_updates_since(
-        self, instance_name: str, from_token: Token, upto_token: Token
+        self,
+        instance_name: str,
+        from_token: Token,
+        upto_token: Token,
+        target_row_count: int = _STREAM_UPDATE_TARGET_ROW_COUNT,
     ) -> StreamUpdateResult:
         """Like get_updates except allows specifying from when we should
         stream updates
 
+        Args:
+            instance_name: the writer of the stream
+            from_token: the starting point for fetching the updates
+            upto_token: the point to get updates up to
+            target_row_count: a target for the number of rows to be returned.
+
         Returns:
             A triplet `(updates, new_last_token, limited)`, where `updates` is
             a list of `(token, row)` entries, `new_last_token` is the new
@@ -185,7 +201,7 @@ class Stream:
             instance_name,
             from_token,
             upto_token,
-            _STREAM_UPDATE_TARGET_ROW_COUNT,
+            target_row_count,
         )
         return updates, upto_token, limited
 
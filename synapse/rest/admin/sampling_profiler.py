@@ -0,0 +1,76 @@
+# Copyright 2023 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import logging
+from http import HTTPStatus
+from typing import TYPE_CHECKING, Tuple
+
+from synapse.api.errors import SynapseError
+from synapse.http.servlet import RestServlet, parse_string
+from synapse.http.site import SynapseRequest
+from synapse.rest.admin._base import admin_patterns, assert_requester_is_admin
+from synapse.types import JsonDict
+
+if TYPE_CHECKING:
+    from synapse.server import HomeServer
+
+logger = logging.getLogger(__name__)
+
+
+class SamplingProfilerRestServlet(RestServlet):
+    """Fetch or clear the stacks collected by the sampling profiler.
+
+    GET /_synapse/admin/v1/sampling_profiler?tag=<tag>
+    DELETE /_synapse/admin/v1/sampling_profiler
+    """
+
+    PATTERNS = admin_patterns("/sampling_profiler$")
+
+    def __init__(self, hs: "HomeServer"):
+        self._auth = hs.get_auth()
+        self._enabled = hs.config.metrics.sampling_profiler_enabled
+        self._profiler = hs.get_sampling_profiler()
+
+    def _assert_enabled(self) -> None:
+        if not self._enabled:
+            raise SynapseError(
+                HTTPStatus.BAD_REQUEST, "The sampling profiler is not enabled"
+            )
+
+    async def on_GET(self, request: SynapseRequest) -> Tuple[int, JsonDict]:
+        await assert_requester_is_admin(self._auth, request)
+        self._assert_enabled()
+
+        tag = parse_string(request, "tag")
+
+        samples_by_tag = self._profiler.get_samples_by_tag()
+        stacks_by_tag = self._profiler.get_stacks_by_tag()
+        if tag is not None:
+            stacks_by_tag = {tag: stacks_by_tag.get(tag, {})}
+
+        return HTTPStatus.OK, {
+            "sample_interval_ms": self._profiler.sample_interval_ms,
+            "dropped_samples": self._profiler.dropped_samples,
+            "tags": {
+                tag: {"samples": samples_by_tag.get(tag, 0), "stacks": stacks}
+                for tag, stacks in stacks_by_tag.items()
+            },
+        }
+
+    async def on_DELETE(self, request: SynapseRequest) -> Tuple[int, JsonDict]:
+        await assert_requester_is_admin(self._auth, request)
+        self._assert_enabled()
+
+        self._profiler.reset()
+
+        return HTTPStatus.OK, {}
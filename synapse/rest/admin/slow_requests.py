@@ -0,0 +1,77 @@
+# Copyright 2023 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import logging
+from http import HTTPStatus
+from typing import TYPE_CHECKING, Tuple
+
+from synapse.api.errors import Codes, SynapseError
+from synapse.http.servlet import RestServlet, parse_integer, parse_string
+from synapse.http.site import SynapseRequest
+from synapse.rest.admin._base import admin_patterns, assert_requester_is_admin
+from synapse.types import JsonDict
+
+if TYPE_CHECKING:
+    from synapse.server import HomeServer
+
+logger = logging.getLogger(__name__)
+
+
+class SlowRequestsRestServlet(RestServlet):
+    """Fetch or clear the requests captured for exceeding the slow request
+    thresholds.
+
+    GET /_synapse/admin/v1/slow_requests?servlet=<servlet>&limit=<limit>
+    DELETE /_synapse/admin/v1/slow_requests
+    """
+
+    PATTERNS = admin_patterns("/slow_requests$")
+
+    def __init__(self, hs: "HomeServer"):
+        self._auth = hs.get_auth()
+        self._capture = hs.get_slow_request_capture()
+
+    def _assert_enabled(self) -> None:
+        if not self._capture.enabled:
+            raise SynapseError(
+                HTTPStatus.BAD_REQUEST, "Slow request capture is not enabled"
+            )
+
+    async def on_GET(self, request: SynapseRequest) -> Tuple[int, JsonDict]:
+        await assert_requester_is_admin(self._auth, request)
+        self._assert_enabled()
+
+        servlet = parse_string(request, "servlet")
+        limit = parse_integer(request, "limit")
+        if limit is not None and limit < 0:
+            raise SynapseError(
+                HTTPStatus.BAD_REQUEST,
+                "Query parameter limit must be a string representing a positive integer.",
+                errcode=Codes.INVALID_PARAM,
+            )
+
+        captured = self._capture.get_captured_requests()
+        if servlet is not None:
+            captured = [c for c in captured if c["servlet"] == servlet]
+        if limit is not None:
+            captured = captured[:limit]
+
+        return HTTPStatus.OK, {"requests": captured}
+
+    async def on_DELETE(self, request: SynapseRequest) -> Tuple[int, JsonDict]:
+        await assert_requester_is_admin(self._auth, request)
+        self._assert_enabled()
+
+        self._capture.clear()
+
+        return HTTPStatus.OK, {}
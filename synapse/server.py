@@ -107,8 +107,10 @@ from synapse.handlers.typing import FollowerTypingHandler, TypingWriterHandler
 from synapse.handlers.user_directory import UserDirectoryHandler
 from synapse.http.client import InsecureInterceptableContextFactory, SimpleHttpClient
 from synapse.http.matrixfederationclient import MatrixFederationHttpClient
+from synapse.http.slow_requests import SlowRequestCapture
 from synapse.media.media_repository import MediaRepository
 from synapse.metrics.common_usage_metrics import CommonUsageMetricsManager
+from synapse.metrics.sampling_profiler import SamplingProfiler
 from synapse.module_api import ModuleApi
 from synapse.module_api.callbacks import ModuleApiCallbacks
 from synapse.notifier import Notifier, ReplicationNotifier
@@ -131,6 +133,7 @@ from synapse.storage.controllers import StorageControllers
 from synapse.streams.events import EventSources
 from synapse.types import DomainSpecificString, ISynapseReactor
 from synapse.util import Clock
+from synapse.util.caches.factor_autotuner import CacheFactorAutotuner
 from synapse.util.distributor import Distributor
 from synapse.util.macaroons import MacaroonGenerator
 from synapse.util.ratelimitutils import FederationRateLimiter
@@ -871,6 +874,18 @@ class HomeServer(metaclass=abc.ABCMeta):
             self.config.ratelimiting.rc_admin_redaction,
         )
 
+    @cache_in_self
+    def get_sampling_profiler(self) -> SamplingProfiler:
+        return SamplingProfiler(self)
+
+    @cache_in_self
+    def get_slow_request_capture(self) -> SlowRequestCapture:
+        return SlowRequestCapture(self)
+
+    @cache_in_self
+    def get_cache_factor_autotuner(self) -> CacheFactorAutotuner:
+        return CacheFactorAutotuner(self)
+
     @cache_in_self
     def get_common_usage_metrics_manager(self) -> CommonUsageMetricsManager:
         """Usage metrics shared between phone home stats and the prometheus exporter."""
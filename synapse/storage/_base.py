@@ -134,15 +134,11 @@ class SQLBaseStore(metaclass=ABCMeta):
                 cache.
         """
 
-        try:
-            cache = getattr(self, cache_name)
-        except AttributeError:
-            # Check if an externally defined module cache has been registered
-            cache = self.external_cached_functions.get(cache_name)
-            if not cache:
-                # We probably haven't pulled in the cache in this worker,
-                # which is fine.
-                return False
+        cache = self._get_cached_function(cache_name)
+        if not cache:
+            # We probably haven't pulled in the cache in this worker,
+            # which is fine.
+            return False
 
         if key is None:
             cache.invalidate_all()
@@ -154,6 +150,40 @@ class SQLBaseStore(metaclass=ABCMeta):
 
         return True
 
+    def _attempt_to_invalidate_cache_bulk(
+        self, cache_name: str, keys: Iterable[Collection[Any]]
+    ) -> bool:
+        """Like `_attempt_to_invalidate_cache`, but invalidates many entries of
+        the same cache, only looking the cache up once.
+
+        As with `_attempt_to_invalidate_cache`, for caches with `tree=True` a
+        key may be a prefix of the full key, in which case every entry under
+        that prefix is invalidated.
+
+        Args:
+            cache_name
+            keys: The entries to invalidate.
+        """
+        cache = self._get_cached_function(cache_name)
+        if not cache:
+            return False
+
+        invalidate_method = getattr(cache, "invalidate_local", cache.invalidate)
+        for key in keys:
+            invalidate_method(tuple(key))
+
+        return True
+
+    def _get_cached_function(self, cache_name: str) -> Optional[CachedFunction]:
+        """Look up the cached function with the given name, including any
+        externally registered module caches.
+        """
+        try:
+            return getattr(self, cache_name)
+        except AttributeError:
+            # Check if an externally defined module cache has been registered
+            return self.external_cached_functions.get(cache_name)
+
     def register_external_cached_function(
         self, cache_name: str, func: CachedFunction
     ) -> None:
@@ -46,6 +46,9 @@ ON_UPDATE_CALLBACK = Callable[[str, str, bool], AsyncContextManager[int]]
 DEFAULT_BATCH_SIZE_CALLBACK = Callable[[str, str], Awaitable[int]]
 MIN_BATCH_SIZE_CALLBACK = Callable[[str, str], Awaitable[int]]
 
+# The most we will scale back background updates by when the database is busy.
+MAX_LOAD_BACKOFF_FACTOR = 10.0
+
 
 @attr.s(slots=True, frozen=True, auto_attribs=True)
 class _BackgroundUpdateHandler:
@@ -174,6 +177,9 @@ class BackgroundUpdater:
         self.update_duration_ms = hs.config.background_updates.update_duration_ms
         self.sleep_duration_ms = hs.config.background_updates.sleep_duration_ms
         self.sleep_enabled = hs.config.background_updates.sleep_enabled
+        self.max_db_scheduling_time_ms = (
+            hs.config.background_updates.max_db_scheduling_time_ms
+        )
 
     def register_update_controller_callbacks(
         self,
@@ -231,9 +237,38 @@ class BackgroundUpdater:
         if self._on_update_callback is not None:
             return self._on_update_callback(update_name, database_name, oneshot)
 
+        # If the database is busy, run smaller batches less often so that we
+        # don't compete with foreground requests for connections.
+        backoff = self._get_load_backoff_factor()
+        if backoff > 1:
+            logger.info(
+                "Database is busy: slowing background update %r by a factor of %.1f",
+                update_name,
+                backoff,
+            )
+
         return _BackgroundUpdateContextManager(
-            sleep, self._clock, self.sleep_duration_ms, self.update_duration_ms
+            sleep,
+            self._clock,
+            int(self.sleep_duration_ms * backoff),
+            max(int(self.update_duration_ms / backoff), 1),
+        )
+
+    def _get_load_backoff_factor(self) -> float:
+        """How much to scale back background updates by, based on how long
+        transactions currently wait for a database connection.
+
+        Returns:
+            A factor between 1 (no backoff) and `MAX_LOAD_BACKOFF_FACTOR`.
+        """
+        if not self.max_db_scheduling_time_ms:
+            return 1.0
+
+        load = (
+            self.db_pool.get_average_scheduling_time_ms()
+            / self.max_db_scheduling_time_ms
         )
+        return min(max(load, 1.0), MAX_LOAD_BACKOFF_FACTOR)
 
     async def _default_batch_size(self, update_name: str, database_name: str) -> int:
         """The batch size to use for the first iteration of a new background
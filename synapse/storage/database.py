@@ -529,6 +529,11 @@ class DatabasePool:
         self._current_txn_total_time = 0.0
         self._previous_loop_ts = 0.0
 
+        # An exponential moving average of how long (in seconds) we have had to
+        # wait for a database connection. Used as a measure of how loaded the
+        # database is.
+        self._avg_scheduling_time_sec = 0.0
+
         # Transaction counter: key is the twisted thread id, value is the current count
         self._txn_counters: Dict[int, int] = defaultdict(int)
 
@@ -565,6 +570,12 @@ class DatabasePool:
         """Is the database pool currently running"""
         return self._db_pool.running
 
+    def get_average_scheduling_time_ms(self) -> float:
+        """Returns a moving average of how long recent transactions had to wait
+        for a free database connection, in milliseconds.
+        """
+        return self._avg_scheduling_time_sec * 1000
+
     async def _check_safe_to_upsert(self) -> None:
         """
         Is it safe to use native UPSERT?
@@ -809,7 +820,10 @@ class DatabasePool:
             end = monotonic_time()
             duration = end - start
 
-            current_context().add_database_transaction(duration)
+            context = current_context()
+            context.add_database_transaction(duration)
+            if context.request is not None and context.request.trace is not None:
+                context.request.trace.record_transaction(desc, duration)
 
             transaction_logger.debug("[TXN END] {%s} %f sec", name, duration)
 
@@ -954,6 +968,9 @@ class DatabasePool:
                     sched_duration_sec = monotonic_time() - start_time
                     sql_scheduling_timer.observe(sched_duration_sec)
                     context.add_database_scheduled(sched_duration_sec)
+                    self._avg_scheduling_time_sec += 0.1 * (
+                        sched_duration_sec - self._avg_scheduling_time_sec
+                    )
 
                     if self._txn_limit > 0:
                         tid = self._db_pool.threadID()
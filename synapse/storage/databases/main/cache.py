@@ -15,7 +15,7 @@
 
 import itertools
 import logging
-from typing import TYPE_CHECKING, Any, Collection, Iterable, List, Optional, Tuple
+from typing import TYPE_CHECKING, Any, Collection, Dict, Iterable, List, Optional, Tuple
 
 from synapse.api.constants import EventTypes
 from synapse.replication.tcp.streams import BackfillStream, CachesStream
@@ -25,7 +25,7 @@ from synapse.replication.tcp.streams.events import (
     EventsStreamEventRow,
     EventsStreamRow,
 )
-from synapse.storage._base import SQLBaseStore
+from synapse.storage._base import SQLBaseStore, db_to_json
 from synapse.storage.database import (
     DatabasePool,
     LoggingDatabaseConnection,
@@ -33,11 +33,13 @@ from synapse.storage.database import (
 )
 from synapse.storage.engines import PostgresEngine
 from synapse.storage.util.id_generators import MultiWriterIdGenerator
+from synapse.util import json_encoder
 from synapse.util.caches.descriptors import CachedFunction
 from synapse.util.iterutils import batch_iter
 
 if TYPE_CHECKING:
     from synapse.server import HomeServer
+    from synapse.storage.databases.main.events import DeltaState
 
 logger = logging.getLogger(__name__)
 
@@ -46,6 +48,16 @@ logger = logging.getLogger(__name__)
 # based on the current state when notifying workers over replication.
 CURRENT_STATE_CACHE_NAME = "cs_cache_fake"
 
+# This is a special cache name we use to batch many invalidations of a single
+# cache into one row when notifying workers over replication. The first key is
+# the name of the cache being invalidated, and each subsequent key is the JSON
+# encoded list of arguments of an entry to invalidate. (The keys are stored in a
+# `TEXT[]` column, so each entry has to be a single string.)
+BULK_INVALIDATION_CACHE_NAME = "bulk_cache_fake"
+
+# The maximum number of entries to send in each bulk invalidation row.
+BULK_INVALIDATION_BATCH_SIZE = 50
+
 
 class CacheInvalidationWorkerStore(SQLBaseStore):
     def __init__(
@@ -58,6 +70,10 @@ class CacheInvalidationWorkerStore(SQLBaseStore):
 
         self._instance_name = hs.get_instance_name()
 
+        self._send_bulk_cache_invalidations = (
+            hs.config.experimental.replication_bulk_cache_invalidation
+        )
+
         self.db_pool.updates.register_background_index_update(
             update_name="cache_invalidation_index_by_instance",
             index_name="cache_invalidation_stream_by_instance_instance_index",
@@ -175,6 +191,15 @@ class CacheInvalidationWorkerStore(SQLBaseStore):
                     room_id = row.keys[0]
                     members_changed = set(row.keys[1:])
                     self._invalidate_state_caches(room_id, members_changed)
+                elif row.cache_func == BULK_INVALIDATION_CACHE_NAME:
+                    if row.keys is None:
+                        raise Exception(
+                            "Can't send an 'invalidate all' for a bulk invalidation"
+                        )
+
+                    self._attempt_to_invalidate_cache_bulk(
+                        row.keys[0], [db_to_json(keys) for keys in row.keys[1:]]
+                    )
                 else:
                     self._attempt_to_invalidate_cache(row.cache_func, row.keys)
 
@@ -307,6 +332,72 @@ class CacheInvalidationWorkerStore(SQLBaseStore):
         txn.call_after(cache_func.invalidate, keys)
         self._send_invalidation_to_replication(txn, cache_func.__name__, keys)
 
+    def _invalidate_cache_and_stream_bulk(
+        self,
+        txn: LoggingTransaction,
+        cache_func: CachedFunction,
+        key_tuples: Collection[Tuple[Any, ...]],
+    ) -> None:
+        """Invalidates many entries of a cache and adds them to the cache stream
+        so slaves will know to invalidate their caches.
+
+        Unlike calling `_invalidate_cache_and_stream` for each entry, this
+        batches the entries into a small number of rows of the cache stream.
+
+        Args:
+            txn
+            cache_func: The cache to invalidate.
+            key_tuples: The entries to invalidate. For caches with `tree=True`
+                these may be prefixes of the full key.
+        """
+        key_tuples = list(key_tuples)
+
+        def _invalidate_keys() -> None:
+            for keys in key_tuples:
+                cache_func.invalidate(keys)
+
+        txn.call_after(_invalidate_keys)
+        self._send_invalidation_to_replication_bulk(
+            txn, cache_func.__name__, key_tuples
+        )
+
+    def _update_state_caches(
+        self, room_id: str, members_changed: Collection[str], state_delta: "DeltaState"
+    ) -> None:
+        """Invalidates caches that are based on the current state, as
+        `_invalidate_state_caches` does, but then applies the delta to the
+        previously cached current state of the room (if any) rather than
+        forcing it to be refetched from the database.
+
+        Args:
+            room_id: Room where state changed
+            members_changed: The user_ids of members that have changed
+            state_delta: The change that was made to the current state
+        """
+        cache_func: Optional[CachedFunction] = getattr(
+            self, "get_partial_current_state_ids", None
+        )
+
+        prev_state = None
+        if cache_func is not None and not state_delta.no_longer_in_room:
+            prev_state = cache_func.cache.get_immediate(
+                room_id, None, update_metrics=False
+            )
+
+        # We still invalidate first, so that any lookups that are in flight
+        # don't go on to populate the cache with the old state.
+        self._invalidate_state_caches(room_id, members_changed)
+
+        if cache_func is None or prev_state is None:
+            return
+
+        new_state = dict(prev_state)
+        for key in state_delta.to_delete:
+            new_state.pop(key, None)
+        new_state.update(state_delta.to_insert)
+
+        cache_func.prefill((room_id,), new_state)
+
     def _invalidate_all_cache_and_stream(
         self, txn: LoggingTransaction, cache_func: CachedFunction
     ) -> None:
@@ -318,7 +409,11 @@ class CacheInvalidationWorkerStore(SQLBaseStore):
         self._send_invalidation_to_replication(txn, cache_func.__name__, None)
 
     def _invalidate_state_caches_and_stream(
-        self, txn: LoggingTransaction, room_id: str, members_changed: Collection[str]
+        self,
+        txn: LoggingTransaction,
+        room_id: str,
+        members_changed: Collection[str],
+        state_delta: Optional["DeltaState"] = None,
     ) -> None:
         """Special case invalidation of caches based on current state.
 
@@ -329,8 +424,16 @@ class CacheInvalidationWorkerStore(SQLBaseStore):
             txn
             room_id: Room where state changed
             members_changed: The user_ids of members that have changed
+            state_delta: The change that was made to the current state of the
+                room, if known. If given, any locally cached copy of the current
+                state is updated in place rather than being dropped.
         """
-        txn.call_after(self._invalidate_state_caches, room_id, members_changed)
+        if state_delta is not None:
+            txn.call_after(
+                self._update_state_caches, room_id, members_changed, state_delta
+            )
+        else:
+            txn.call_after(self._invalidate_state_caches, room_id, members_changed)
 
         if members_changed:
             # We need to be careful that the size of the `members_changed` list
@@ -400,8 +503,90 @@ class CacheInvalidationWorkerStore(SQLBaseStore):
                 },
             )
 
+    def _send_invalidation_to_replication_bulk(
+        self,
+        txn: LoggingTransaction,
+        cache_name: str,
+        key_tuples: Collection[Tuple[Any, ...]],
+    ) -> None:
+        """Notifies replication that the given entries of a cache have been
+        invalidated, batching many entries into each row.
+
+        Note that this does *not* invalidate the cache locally.
+
+        Unless `replication_bulk_cache_invalidation` is enabled, this sends a
+        row per entry, as workers running older versions of Synapse ignore the
+        batched rows.
+
+        Args:
+            txn
+            cache_name
+            key_tuples: The entries to invalidate.
+        """
+        if not self._send_bulk_cache_invalidations:
+            for keys in key_tuples:
+                self._send_invalidation_to_replication(txn, cache_name, keys)
+            return
+
+        # Workers apply each row in one go, so we bound the size of the rows to
+        # avoid a large purge turning into one huge row that blocks their
+        # reactors.
+        for chunk in batch_iter(key_tuples, BULK_INVALIDATION_BATCH_SIZE):
+            if len(chunk) == 1:
+                self._send_invalidation_to_replication(txn, cache_name, chunk[0])
+                continue
+
+            self._send_invalidation_to_replication(
+                txn,
+                BULK_INVALIDATION_CACHE_NAME,
+                [cache_name, *(json_encoder.encode(list(keys)) for keys in chunk)],
+            )
+
     def get_cache_stream_token_for_writer(self, instance_name: str) -> int:
         if self._cache_id_gen:
             return self._cache_id_gen.get_current_token_for_writer(instance_name)
         else:
             return 0
+
+    async def get_tuned_cache_factors(self) -> Dict[str, float]:
+        """Get the cache factors previously chosen by this instance's cache factor
+        autotuner.
+
+        Returns:
+            A map from canonical cache name to cache factor.
+        """
+        rows = await self.db_pool.simple_select_list(
+            table="cache_factors",
+            keyvalues={"instance_name": self._instance_name},
+            retcols=("cache_name", "factor"),
+            desc="get_tuned_cache_factors",
+        )
+        return {row["cache_name"]: row["factor"] for row in rows}
+
+    async def set_tuned_cache_factors(self, factors: Dict[str, float]) -> None:
+        """Replace the stored cache factors chosen by this instance's cache factor
+        autotuner.
+
+        Args:
+            factors: A map from canonical cache name to cache factor.
+        """
+
+        def _set_tuned_cache_factors_txn(txn: LoggingTransaction) -> None:
+            self.db_pool.simple_delete_txn(
+                txn,
+                table="cache_factors",
+                keyvalues={"instance_name": self._instance_name},
+            )
+            self.db_pool.simple_insert_many_txn(
+                txn,
+                table="cache_factors",
+                keys=("instance_name", "cache_name", "factor"),
+                values=[
+                    (self._instance_name, cache_name, factor)
+                    for cache_name, factor in factors.items()
+                ],
+            )
+
+        await self.db_pool.runInteraction(
+            "set_tuned_cache_factors", _set_tuned_cache_factors_txn
+        )
@@ -1176,7 +1176,7 @@ class PersistEventsStore:
 
             # Invalidate the various caches
             self.store._invalidate_state_caches_and_stream(
-                txn, room_id, members_changed
+                txn, room_id, members_changed, delta_state
             )
 
             # Check if any of the remote membership changes requires us to
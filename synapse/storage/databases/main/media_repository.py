@@ -32,6 +32,7 @@ from synapse.storage.database import (
     DatabasePool,
     LoggingDatabaseConnection,
     LoggingTransaction,
+    make_tuple_comparison_clause,
 )
 from synapse.types import JsonDict, UserID
 
@@ -42,6 +43,10 @@ BG_UPDATE_REMOVE_MEDIA_REPO_INDEX_WITHOUT_METHOD_2 = (
     "media_repository_drop_index_wo_method_2"
 )
 
+# How many rows of the remote media cache to fetch at a time when looking for
+# media to evict.
+REMOTE_MEDIA_TO_EVICT_BATCH_SIZE = 1000
+
 
 class MediaSortOrder(Enum):
     """
@@ -76,6 +81,14 @@ class MediaRepositoryBackgroundUpdateStore(SQLBaseStore):
             where_clause="url_cache IS NOT NULL",
         )
 
+        self.db_pool.updates.register_background_index_update(
+            update_name="local_media_repository_sha256_idx",
+            index_name="local_media_repository_sha256_idx",
+            table="local_media_repository",
+            columns=["sha256"],
+            where_clause="sha256 IS NOT NULL",
+        )
+
         # The following the updates add the method to the unique constraint of
         # the thumbnail databases. That fixes an issue, where thumbnails of the
         # same resolution, but different methods could overwrite one another.
@@ -337,6 +350,7 @@ class MediaRepositoryStore(MediaRepositoryBackgroundUpdateStore):
         media_length: int,
         user_id: UserID,
         url_cache: Optional[str] = None,
+        sha256: Optional[str] = None,
     ) -> None:
         await self.db_pool.simple_insert(
             "local_media_repository",
@@ -348,10 +362,90 @@ class MediaRepositoryStore(MediaRepositoryBackgroundUpdateStore):
                 "media_length": media_length,
                 "user_id": user_id.to_string(),
                 "url_cache": url_cache,
+                "sha256": sha256,
             },
             desc="store_local_media",
         )
 
+    async def get_local_media_id_by_sha256(self, sha256: str) -> Optional[str]:
+        """Get the ID of a local piece of media whose content has the given
+        SHA-256 hash, if any. Media in the URL cache is ignored.
+        """
+
+        def get_local_media_id_by_sha256_txn(txn: LoggingTransaction) -> Optional[str]:
+            txn.execute(
+                """
+                SELECT media_id FROM local_media_repository
+                WHERE sha256 = ? AND url_cache IS NULL
+                LIMIT 1
+                """,
+                (sha256,),
+            )
+            row = txn.fetchone()
+            return row[0] if row else None
+
+        return await self.db_pool.runInteraction(
+            "get_local_media_id_by_sha256", get_local_media_id_by_sha256_txn
+        )
+
+    async def get_local_media_without_sha256(
+        self, from_media_id: str, limit: int
+    ) -> List[str]:
+        """Get the IDs of local media that doesn't have a SHA-256 hash of its
+        content stored, ordered by media ID. Media in the URL cache is ignored.
+
+        Args:
+            from_media_id: Only media with an ID after this one is returned.
+            limit: The maximum number of media IDs to return.
+        """
+
+        def get_local_media_without_sha256_txn(txn: LoggingTransaction) -> List[str]:
+            txn.execute(
+                """
+                SELECT media_id FROM local_media_repository
+                WHERE sha256 IS NULL AND url_cache IS NULL AND media_id > ?
+                ORDER BY media_id
+                LIMIT ?
+                """,
+                (from_media_id, limit),
+            )
+            return [row[0] for row in txn]
+
+        return await self.db_pool.runInteraction(
+            "get_local_media_without_sha256", get_local_media_without_sha256_txn
+        )
+
+    async def get_local_media_deduplication_position(self) -> str:
+        """Get the media ID that deduplicating existing local media has got up
+        to.
+        """
+        return await self.db_pool.simple_select_one_onecol(
+            table="local_media_deduplication_position",
+            keyvalues={},
+            retcol="media_id",
+            desc="get_local_media_deduplication_position",
+        )
+
+    async def set_local_media_deduplication_position(self, media_id: str) -> None:
+        """Record the media ID that deduplicating existing local media has got
+        up to.
+        """
+        await self.db_pool.simple_update_one(
+            table="local_media_deduplication_position",
+            keyvalues={},
+            updatevalues={"media_id": media_id},
+            desc="set_local_media_deduplication_position",
+        )
+
+    async def set_local_media_sha256(self, media_id: str, sha256: str) -> None:
+        """Store the SHA-256 hash of the content of a local piece of media."""
+        await self.db_pool.simple_update_one(
+            table="local_media_repository",
+            keyvalues={"media_id": media_id},
+            updatevalues={"sha256": sha256},
+            desc="set_local_media_sha256",
+        )
+
     async def mark_local_media_as_safe(self, media_id: str, safe: bool = True) -> None:
         """Mark a local media as safe or unsafe from quarantining."""
         await self.db_pool.simple_update_one(
@@ -658,6 +752,96 @@ class MediaRepositoryStore(MediaRepositoryBackgroundUpdateStore):
             "get_remote_media_ids", self.db_pool.cursor_to_dict, sql, before_ts
         )
 
+    async def get_remote_media_to_evict(self, max_size: int) -> List[Dict[str, str]]:
+        """
+        Retrieve the least recently accessed media from the remote media cache
+        that needs to be removed to bring its total size down to `max_size`.
+
+        Quarantined media is counted towards the total size, but is never
+        returned. Media which has never been accessed is treated as the least
+        recently accessed.
+
+        Args:
+            max_size: The maximum total size, in bytes, of the remote media cache.
+
+        Returns:
+            A list of dicts, least recently accessed first, containing:
+                * media_origin
+                * media_id
+                * filesystem_id
+        """
+
+        def get_remote_media_to_evict_txn(
+            txn: LoggingTransaction,
+        ) -> List[Dict[str, str]]:
+            txn.execute("SELECT COALESCE(SUM(media_length), 0) FROM remote_media_cache")
+            row = txn.fetchone()
+            assert row is not None
+            total_size = row[0]
+
+            to_evict: List[Dict[str, str]] = []
+
+            # We fetch the media in batches, so that we don't pull the whole
+            # table into memory when only a few rows need evicting. NULLs sort
+            # differently on SQLite and Postgres, so we treat media which has
+            # never been accessed as having been accessed at the epoch.
+            last_row: Optional[Tuple[int, str, str]] = None
+            while total_size > max_size:
+                args: List[Any] = []
+                clause = ""
+                if last_row is not None:
+                    clause, args = make_tuple_comparison_clause(
+                        [
+                            ("COALESCE(last_access_ts, 0)", last_row[0]),
+                            ("media_origin", last_row[1]),
+                            ("media_id", last_row[2]),
+                        ]
+                    )
+                    clause = "AND " + clause
+
+                txn.execute(
+                    """
+                    SELECT COALESCE(last_access_ts, 0), media_origin, media_id,
+                        filesystem_id, media_length
+                    FROM remote_media_cache
+                    WHERE quarantined_by IS NULL %s
+                    ORDER BY COALESCE(last_access_ts, 0), media_origin, media_id
+                    LIMIT ?
+                    """
+                    % (clause,),
+                    args + [REMOTE_MEDIA_TO_EVICT_BATCH_SIZE],
+                )
+                rows = txn.fetchall()
+
+                for (
+                    last_access_ts,
+                    media_origin,
+                    media_id,
+                    filesystem_id,
+                    length,
+                ) in rows:
+                    if total_size <= max_size:
+                        break
+
+                    to_evict.append(
+                        {
+                            "media_origin": media_origin,
+                            "media_id": media_id,
+                            "filesystem_id": filesystem_id,
+                        }
+                    )
+                    total_size -= length or 0
+                    last_row = (last_access_ts, media_origin, media_id)
+
+                if len(rows) < REMOTE_MEDIA_TO_EVICT_BATCH_SIZE:
+                    break
+
+            return to_evict
+
+        return await self.db_pool.runInteraction(
+            "get_remote_media_to_evict", get_remote_media_to_evict_txn
+        )
+
     async def delete_remote_media(self, media_origin: str, media_id: str) -> None:
         def delete_remote_media_txn(txn: LoggingTransaction) -> None:
             self.db_pool.simple_delete_txn(
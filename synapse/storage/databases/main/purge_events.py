@@ -291,20 +291,26 @@ class PurgeEventsStore(StateGroupWorkerStore, CacheInvalidationWorkerStore):
         # so make sure to keep this actually last.
         txn.execute("DROP TABLE events_to_purge")
 
-        for event_id, should_delete in event_rows:
-            self._invalidate_cache_and_stream(
-                txn, self._get_state_group_for_event, (event_id,)
-            )
+        self._invalidate_cache_and_stream_bulk(
+            txn,
+            self._get_state_group_for_event,
+            [(event_id,) for event_id, _ in event_rows],
+        )
 
-            # XXX: This is racy, since have_seen_events could be called between the
-            #    transaction completing and the invalidation running. On the other hand,
-            #    that's no different to calling `have_seen_events` just before the
-            #    event is deleted from the database.
-            if should_delete:
-                self._invalidate_cache_and_stream(
-                    txn, self.have_seen_event, (room_id, event_id)
-                )
-                self.invalidate_get_event_cache_after_txn(txn, event_id)
+        # XXX: This is racy, since have_seen_events could be called between the
+        #    transaction completing and the invalidation running. On the other hand,
+        #    that's no different to calling `have_seen_events` just before the
+        #    event is deleted from the database.
+        deleted_event_ids = [
+            event_id for event_id, should_delete in event_rows if should_delete
+        ]
+        self._invalidate_cache_and_stream_bulk(
+            txn,
+            self.have_seen_event,
+            [(room_id, event_id) for event_id in deleted_event_ids],
+        )
+        for event_id in deleted_event_ids:
+            self.invalidate_get_event_cache_after_txn(txn, event_id)
 
         logger.info("[purge] done")
 
@@ -43,7 +43,7 @@ from synapse.storage.util.id_generators import (
     MultiWriterIdGenerator,
     StreamIdGenerator,
 )
-from synapse.types import JsonDict
+from synapse.types import JsonDict, ReadReceipt
 from synapse.util import json_encoder
 from synapse.util.caches.descriptors import cached, cachedList
 from synapse.util.caches.stream_change_cache import StreamChangeCache
@@ -569,10 +569,13 @@ class ReceiptsWorkerStore(SQLBaseStore):
         self._get_receipts_for_user_with_orderings.invalidate((user_id, receipt_type))
         self._get_linearized_receipts_for_room.invalidate((room_id,))
 
+        # A receipt only changes the unread counts of the user that sent it, so
+        # there's no need to throw away the counts of everyone else in the room.
+        #
         # We use this method to invalidate so that we don't end up with circular
         # dependencies between the receipts and push action stores.
         self._attempt_to_invalidate_cache(
-            "get_unread_event_push_actions_by_room_for_user", (room_id,)
+            "get_unread_event_push_actions_by_room_for_user", (room_id, user_id)
         )
 
     def process_replication_rows(
@@ -813,6 +816,133 @@ class ReceiptsWorkerStore(SQLBaseStore):
 
         return stream_id, max_persisted_id
 
+    async def insert_receipts(
+        self, receipts: Sequence[ReadReceipt]
+    ) -> Tuple[List[ReadReceipt], Optional[Tuple[int, int]]]:
+        """Insert a batch of receipts in a single transaction.
+
+        If there are several receipts for the same room, receipt type, user and
+        thread, only the receipt that would have been kept had they been
+        inserted one at a time is stored.
+
+        Returns:
+            The receipts which were newer than what was previously persisted
+            and, if there were any, the lowest of their stream IDs and the
+            receipts stream token.
+        """
+        assert self._can_write_to_receipts
+
+        receipts = [receipt for receipt in receipts if receipt.event_ids]
+        if not receipts:
+            return [], None
+
+        async with self._receipts_id_gen.get_next_mult(len(receipts)) as stream_ids:
+            new_receipts = await self.db_pool.runInteraction(
+                "insert_receipts",
+                self._insert_receipts_txn,
+                receipts,
+                stream_ids,
+                # See `insert_receipt`.
+                isolation_level=IsolationLevel.READ_COMMITTED,
+            )
+
+        if not new_receipts:
+            return [], None
+
+        min_stream_id = min(stream_id for _, stream_id in new_receipts)
+        max_persisted_id = self._receipts_id_gen.get_current_token()
+
+        return [receipt for receipt, _ in new_receipts], (
+            min_stream_id,
+            max_persisted_id,
+        )
+
+    def _insert_receipts_txn(
+        self,
+        txn: LoggingTransaction,
+        receipts: Sequence[ReadReceipt],
+        stream_ids: Sequence[int],
+    ) -> List[Tuple[ReadReceipt, int]]:
+        """Inserts the given receipts, coalescing receipts for the same room,
+        receipt type, user and thread.
+
+        Returns:
+            The receipts that were newer than the current ones, along with the
+            stream ID each was persisted with.
+        """
+        linearized_event_ids = [
+            receipt.event_ids[0]
+            if len(receipt.event_ids) == 1
+            else self._graph_to_linear(txn, receipt.room_id, receipt.event_ids)
+            for receipt in receipts
+        ]
+
+        rows = self.db_pool.simple_select_many_txn(
+            txn,
+            table="events",
+            column="event_id",
+            iterable=set(linearized_event_ids),
+            keyvalues={},
+            retcols=("event_id", "stream_ordering"),
+        )
+        stream_orderings = {row["event_id"]: row["stream_ordering"] for row in rows}
+
+        # Pick which receipt to keep for each (room, receipt type, user, thread).
+        # As with `_insert_linearized_receipt_txn`, a receipt replaces an
+        # earlier one unless they're both for known events and it is for an
+        # event that is no later.
+        latest: Dict[Tuple[str, str, str, Optional[str]], Tuple[ReadReceipt, str]] = {}
+        for receipt, event_id in zip(receipts, linearized_event_ids):
+            key = (
+                receipt.room_id,
+                receipt.receipt_type,
+                receipt.user_id,
+                receipt.thread_id,
+            )
+            existing = latest.get(key)
+            if existing is not None:
+                new_ordering = stream_orderings.get(event_id)
+                existing_ordering = stream_orderings.get(existing[1])
+                if (
+                    new_ordering is not None
+                    and existing_ordering is not None
+                    and new_ordering <= existing_ordering
+                ):
+                    continue
+
+            latest[key] = (receipt, event_id)
+
+        new_receipts = []
+        for (receipt, event_id), stream_id in zip(latest.values(), stream_ids):
+            event_ts = self._insert_linearized_receipt_txn(
+                txn,
+                receipt.room_id,
+                receipt.receipt_type,
+                receipt.user_id,
+                event_id,
+                receipt.thread_id,
+                receipt.data,
+                stream_id=stream_id,
+            )
+
+            # If the receipt was older than the currently persisted one, nothing
+            # to do.
+            if event_ts is None:
+                continue
+
+            self._insert_graph_receipt_txn(
+                txn,
+                receipt.room_id,
+                receipt.receipt_type,
+                receipt.user_id,
+                receipt.event_ids,
+                receipt.thread_id,
+                receipt.data,
+            )
+            new_receipts.append((receipt, stream_id))
+
+        return new_receipts
+
     def _insert_graph_receipt_txn(
         self,
         txn: LoggingTransaction,
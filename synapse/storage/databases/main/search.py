@@ -20,6 +20,7 @@ from typing import (
     TYPE_CHECKING,
     Any,
     Collection,
+    Dict,
     Iterable,
     List,
     Optional,
@@ -32,6 +33,7 @@ import attr
 
 from synapse.api.errors import SynapseError
 from synapse.events import EventBase
+from synapse.logging.context import make_deferred_yieldable, run_in_background
 from synapse.storage._base import SQLBaseStore, db_to_json, make_in_list_sql_clause
 from synapse.storage.database import (
     DatabasePool,
@@ -41,6 +43,8 @@ from synapse.storage.database import (
 from synapse.storage.databases.main.events_worker import EventRedactBehaviour
 from synapse.storage.engines import PostgresEngine, Sqlite3Engine
 from synapse.types import JsonDict
+from synapse.util import unwrapFirstError
+from synapse.util.async_helpers import gather_results
 
 if TYPE_CHECKING:
     from synapse.server import HomeServer
@@ -443,8 +447,10 @@ class SearchStore(SearchBackgroundUpdateStore):
         args: List[Any] = []
 
         # Make sure we don't explode because the person is in too many rooms.
-        # We filter the results below regardless.
-        if len(room_ids) < 500:
+        # We filter the results below regardless. This isn't a problem if the
+        # room IDs are passed as a single array, and filtering in the database
+        # means we don't rank or limit matches from rooms that aren't wanted.
+        if self.database_engine.supports_using_any_list or len(room_ids) < 500:
             clause, args = make_in_list_sql_clause(
                 self.database_engine, "room_id", room_ids
             )
@@ -503,9 +509,10 @@ class SearchStore(SearchBackgroundUpdateStore):
         # We add an arbitrary limit here to ensure we don't try to pull the
         # entire table from the database.
         sql += " ORDER BY rank DESC LIMIT 500"
+        count_sql += " GROUP BY room_id"
 
-        results = await self.db_pool.execute(
-            "search_msgs", self.db_pool.cursor_to_dict, sql, *args
+        results, count_results = await self._execute_search_and_count(
+            "search_msgs", sql, args, "search_msgs_count", count_sql, count_args
         )
 
         results = list(filter(lambda row: row["room_id"] in room_ids, results))
@@ -523,12 +530,6 @@ class SearchStore(SearchBackgroundUpdateStore):
         if isinstance(self.database_engine, PostgresEngine):
             highlights = await self._find_highlights_in_postgres(search_query, events)
 
-        count_sql += " GROUP BY room_id"
-
-        count_results = await self.db_pool.execute(
-            "search_rooms_count", self.db_pool.cursor_to_dict, count_sql, *count_args
-        )
-
         count = sum(row["count"] for row in count_results if row["room_id"] in room_ids)
         return {
             "results": [
@@ -564,8 +565,10 @@ class SearchStore(SearchBackgroundUpdateStore):
         args: List[Any] = []
 
         # Make sure we don't explode because the person is in too many rooms.
-        # We filter the results below regardless.
-        if len(room_ids) < 500:
+        # We filter the results below regardless. This isn't a problem if the
+        # room IDs are passed as a single array, and filtering in the database
+        # means we don't rank or limit matches from rooms that aren't wanted.
+        if self.database_engine.supports_using_any_list or len(room_ids) < 500:
             clause, args = make_in_list_sql_clause(
                 self.database_engine, "room_id", room_ids
             )
@@ -663,8 +666,10 @@ class SearchStore(SearchBackgroundUpdateStore):
         # mypy expects to append only a `str`, not an `int`
         args.append(limit)
 
-        results = await self.db_pool.execute(
-            "search_rooms", self.db_pool.cursor_to_dict, sql, *args
+        count_sql += " GROUP BY room_id"
+
+        results, count_results = await self._execute_search_and_count(
+            "search_rooms", sql, args, "search_rooms_count", count_sql, count_args
         )
 
         results = list(filter(lambda row: row["room_id"] in room_ids, results))
@@ -682,12 +687,6 @@ class SearchStore(SearchBackgroundUpdateStore):
         if isinstance(self.database_engine, PostgresEngine):
             highlights = await self._find_highlights_in_postgres(search_query, events)
 
-        count_sql += " GROUP BY room_id"
-
-        count_results = await self.db_pool.execute(
-            "search_rooms_count", self.db_pool.cursor_to_dict, count_sql, *count_args
-        )
-
         count = sum(row["count"] for row in count_results if row["room_id"] in room_ids)
 
         return {
@@ -705,6 +704,54 @@ class SearchStore(SearchBackgroundUpdateStore):
             "count": count,
         }
 
+    async def _execute_search_and_count(
+        self,
+        desc: str,
+        sql: str,
+        args: List[Any],
+        count_desc: str,
+        count_sql: str,
+        count_args: List[Any],
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Runs a search query and the query counting its matches per room.
+
+        Both have to find every match in the full text index, so they are run at
+        the same time on separate connections, rather than one after another.
+
+        Args:
+            desc: A description of the search query, for logging and metrics.
+            sql: The search query.
+            args: The arguments for the search query.
+            count_desc: A description of the count query.
+            count_sql: The count query.
+            count_args: The arguments for the count query.
+
+        Returns:
+            A tuple of the rows returned by the search query and the rows returned
+            by the count query.
+        """
+        return await make_deferred_yieldable(
+            gather_results(
+                (
+                    run_in_background(
+                        self.db_pool.execute,
+                        desc,
+                        self.db_pool.cursor_to_dict,
+                        sql,
+                        *args,
+                    ),
+                    run_in_background(
+                        self.db_pool.execute,
+                        count_desc,
+                        self.db_pool.cursor_to_dict,
+                        count_sql,
+                        *count_args,
+                    ),
+                ),
+                consumeErrors=True,
+            ).addErrback(unwrapFirstError)
+        )
+
     async def _find_highlights_in_postgres(
         self, search_query: str, events: List[EventBase]
     ) -> Set[str]:
@@ -0,0 +1,22 @@
+/* Copyright 2023 The Matrix.org Foundation C.I.C
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *    http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+
+-- The SHA-256 hash of the content of local media, hex encoded. This is only
+-- filled in when media deduplication is enabled, and is used to find media
+-- with identical content.
+ALTER TABLE local_media_repository ADD COLUMN sha256 TEXT;
+
+INSERT INTO background_updates (ordering, update_name, progress_json) VALUES
+  (7403, 'local_media_repository_sha256_idx', '{}');
@@ -0,0 +1,25 @@
+/* Copyright 2023 The Matrix.org Foundation C.I.C
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *    http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+
+-- The cache factors chosen by each instance's cache factor autotuner, so that
+-- they survive restarts. `cache_name` is the canonical name of the cache.
+CREATE TABLE IF NOT EXISTS cache_factors (
+    instance_name TEXT NOT NULL,
+    cache_name TEXT NOT NULL,
+    factor DOUBLE PRECISION NOT NULL
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS cache_factors_instance_cache
+    ON cache_factors (instance_name, cache_name);
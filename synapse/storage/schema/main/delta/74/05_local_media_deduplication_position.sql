@@ -0,0 +1,25 @@
+/* Copyright 2023 The Matrix.org Foundation C.I.C
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *    http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+
+-- The media ID that the background job which deduplicates local media stored
+-- before deduplication was enabled has got up to, so that it can carry on from
+-- there after a restart.
+CREATE TABLE IF NOT EXISTS local_media_deduplication_position (
+    Lock CHAR(1) NOT NULL DEFAULT 'X' UNIQUE,  -- Makes sure this table only has one row.
+    media_id TEXT NOT NULL,
+    CHECK (Lock='X')
+);
+
+INSERT INTO local_media_deduplication_position (media_id) VALUES ('');
@@ -24,6 +24,7 @@ from prometheus_client import REGISTRY
 from prometheus_client.core import Gauge
 
 from synapse.config.cache import add_resizable_cache
+from synapse.logging.context import current_context
 from synapse.util.metrics import DynamicCollectorRegistry
 
 logger = logging.getLogger(__name__)
@@ -32,6 +33,14 @@ logger = logging.getLogger(__name__)
 # Whether to track estimated memory usage of the LruCaches.
 TRACK_MEMORY_USAGE = False
 
+# Whether new LruCaches should store their entries in a `NativeLruCache`, if
+# possible. Set from the config when the process starts.
+USE_NATIVE_LRU_CACHE = False
+
+# Whether to record cache lookups against the request being processed, for slow
+# request capture. Set from the config when the process starts.
+TRACE_REQUEST_CACHE_LOOKUPS = False
+
 # We track cache metrics in a special registry that lets us update the metrics
 # just before they are returned from the scrape endpoint.
 CACHE_METRIC_REGISTRY = DynamicCollectorRegistry()
@@ -112,9 +121,18 @@ class CacheMetric:
 
     def inc_hits(self) -> None:
         self.hits += 1
+        if TRACE_REQUEST_CACHE_LOOKUPS:
+            self._trace_lookup(hit=True)
 
     def inc_misses(self) -> None:
         self.misses += 1
+        if TRACE_REQUEST_CACHE_LOOKUPS:
+            self._trace_lookup(hit=False)
+
+    def _trace_lookup(self, hit: bool) -> None:
+        request = current_context().request
+        if request is not None and request.trace is not None:
+            request.trace.record_cache_lookup(self._cache_name, hit)
 
     def inc_evictions(self, reason: EvictionReason, size: int = 1) -> None:
         self.eviction_size_by_reason[reason] += size
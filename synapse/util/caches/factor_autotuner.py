@@ -0,0 +1,283 @@
+# Copyright 2023 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Periodically moves capacity between caches, towards the caches where it is
+expected to save the most cache misses.
+
+The total capacity (i.e. the sum of the caches' maximum sizes) of the tuned
+caches is kept constant, so the tuner only redistributes the capacity implied by
+`caches.global_factor`. Caches with a factor in `caches.per_cache_factors` are
+never tuned.
+"""
+
+import logging
+from typing import TYPE_CHECKING, Dict, List, Set
+
+import attr
+from prometheus_client import Counter, Gauge
+
+from synapse.config.cache import _canonicalise_cache_name, set_tuned_cache_factors
+from synapse.metrics.background_process_metrics import wrap_as_background_process
+from synapse.util.caches import EvictionReason, caches_by_name
+from synapse.util.caches.lrucache import LruCache
+
+if TYPE_CHECKING:
+    from synapse.server import HomeServer
+
+logger = logging.getLogger(__name__)
+
+tuned_cache_factor = Gauge(
+    "synapse_util_caches_tuned_cache_factor",
+    "The cache factor chosen by the cache factor autotuner",
+    ["name"],
+)
+
+cache_miss_rate_per_entry = Gauge(
+    "synapse_util_caches_autotuning_misses_per_entry",
+    "The number of cache misses in the last tuning interval per unit of cache "
+    "capacity, for caches which were evicting entries due to their size",
+    ["name"],
+)
+
+capacity_moved = Counter(
+    "synapse_util_caches_autotuning_capacity_moved",
+    "The amount of cache capacity moved between caches by the cache factor "
+    "autotuner",
+)
+
+
+@attr.s(slots=True, frozen=True, auto_attribs=True)
+class _CacheSample:
+    """A snapshot of a cache's metrics."""
+
+    hits: int
+    misses: int
+    size_evictions: int
+
+
+@attr.s(slots=True, auto_attribs=True)
+class _TuningCandidate:
+    name: str
+    factor: float
+    # The cache capacity which corresponds to a cache factor of 1.
+    capacity_per_factor: float
+    # The number of misses in the last interval per unit of capacity, if the
+    # cache was evicting entries because it was full. This is used to estimate
+    # how many misses extra capacity would save.
+    misses_per_entry: float
+
+
+class CacheFactorAutotuner:
+    """Redistributes cache capacity between the resizable LRU caches, based on
+    their hit, miss and eviction metrics.
+
+    Each interval, capacity is moved away from caches which are not evicting
+    entries due to their size (or which have few misses for their size), and
+    towards caches which are full and have many misses for their size. The
+    factor of each cache changes by at most `max_step` of its value per
+    interval, and is kept within `min_factor` and `max_factor`.
+
+    The chosen factors are stored in the database, and restored on startup.
+    """
+
+    def __init__(self, hs: "HomeServer"):
+        self._clock = hs.get_clock()
+        self._store = hs.get_datastores().main
+        # We keep a reference to the root config, as the cache config is
+        # replaced when it is reloaded.
+        self._config = hs.config
+
+        self._interval_ms = hs.config.caches.factor_autotuning_interval_ms
+        self._min_factor = hs.config.caches.factor_autotuning_min_factor
+        self._max_factor = hs.config.caches.factor_autotuning_max_factor
+        self._max_step = hs.config.caches.factor_autotuning_max_step
+
+        # The factors which we have chosen, by canonical cache name.
+        self._tuned_factors: Dict[str, float] = {}
+
+        # The metrics of each cache at the end of the last interval, by
+        # canonical cache name.
+        self._previous_samples: Dict[str, _CacheSample] = {}
+
+    async def start(self) -> None:
+        """Restore the previously chosen cache factors, and start tuning."""
+        pinned = self._config.caches.cache_factors
+        stored_factors = await self._store.get_tuned_cache_factors()
+        self._tuned_factors = {
+            name: min(max(factor, self._min_factor), self._max_factor)
+            for name, factor in stored_factors.items()
+            if name not in pinned
+        }
+        if self._tuned_factors:
+            logger.info(
+                "Restoring tuned factors for %d caches", len(self._tuned_factors)
+            )
+            self._apply_tuned_factors()
+
+        self._clock.looping_call(self._tune_cache_factors, self._interval_ms)
+
+    @wrap_as_background_process("tune_cache_factors")
+    async def _tune_cache_factors(self) -> None:
+        if self.tune_once():
+            await self._store.set_tuned_cache_factors(self._tuned_factors)
+
+    def tune_once(self) -> bool:
+        """Run one round of tuning.
+
+        Returns:
+            Whether any of the cache factors were changed.
+        """
+        candidates = self._get_candidates()
+
+        # The caches which could use more capacity, most deserving first, and
+        # the caches which could give up capacity, least deserving first.
+        recipients = sorted(
+            (c for c in candidates if c.misses_per_entry > 0),
+            key=lambda c: c.misses_per_entry,
+            reverse=True,
+        )
+        donors = sorted(candidates, key=lambda c: c.misses_per_entry)
+
+        # The amount of capacity which each donor can still give up this round.
+        available: Dict[str, float] = {
+            c.name: max(min(self._max_step * c.factor, c.factor - self._min_factor), 0)
+            * c.capacity_per_factor
+            for c in donors
+        }
+        receivers: Set[str] = set()
+        givers: Set[str] = set()
+
+        total_moved = 0.0
+        for recipient in recipients:
+            if recipient.name in givers:
+                continue
+
+            wanted = (
+                max(
+                    min(
+                        self._max_step * recipient.factor,
+                        self._max_factor - recipient.factor,
+                    ),
+                    0,
+                )
+                * recipient.capacity_per_factor
+            )
+
+            for donor in donors:
+                if wanted <= 0:
+                    break
+
+                # Only take capacity from caches which need it much less, so that
+                # we don't shuffle capacity back and forth between caches which
+                # are similarly busy.
+                if donor.misses_per_entry * 2 >= recipient.misses_per_entry:
+                    break
+
+                if donor.name in receivers or available[donor.name] <= 0:
+                    continue
+
+                amount = min(wanted, available[donor.name])
+                available[donor.name] -= amount
+                wanted -= amount
+
+                donor.factor -= amount / donor.capacity_per_factor
+                recipient.factor += amount / recipient.capacity_per_factor
+                givers.add(donor.name)
+                receivers.add(recipient.name)
+                total_moved += amount
+
+        if total_moved == 0:
+            return False
+
+        for candidate in candidates:
+            if candidate.name in givers or candidate.name in receivers:
+                self._tuned_factors[candidate.name] = candidate.factor
+                tuned_cache_factor.labels(candidate.name).set(candidate.factor)
+
+        logger.info(
+            "Moved %d units of capacity from %d caches to %d caches",
+            total_moved,
+            len(givers),
+            len(receivers),
+        )
+        capacity_moved.inc(total_moved)
+
+        self._apply_tuned_factors()
+        return True
+
+    def _get_candidates(self) -> List[_TuningCandidate]:
+        """Sample the metrics of each of the caches which can be tuned, and work
+        out how much they would benefit from extra capacity.
+        """
+        caches_config = self._config.caches
+        pinned = caches_config.cache_factors
+
+        # Forget about any caches which have since been given a factor in the
+        # config.
+        for name in list(self._tuned_factors):
+            if name in pinned:
+                del self._tuned_factors[name]
+
+        candidates = []
+        for cache_name, cache in list(caches_by_name.items()):
+            if (
+                not isinstance(cache, LruCache)
+                or not cache.apply_cache_factor_from_config
+                or cache.metrics is None
+            ):
+                continue
+
+            name = _canonicalise_cache_name(cache_name)
+            if name in pinned:
+                continue
+
+            metrics = cache.metrics
+            sample = _CacheSample(
+                hits=metrics.hits,
+                misses=metrics.misses,
+                size_evictions=metrics.eviction_size_by_reason[EvictionReason.size],
+            )
+            previous = self._previous_samples.get(name)
+            self._previous_samples[name] = sample
+
+            factor = self._tuned_factors.get(name, caches_config.global_factor)
+            if previous is None or factor <= 0 or cache.max_size <= 0:
+                continue
+
+            misses = sample.misses - previous.misses
+            size_evictions = sample.size_evictions - previous.size_evictions
+            if misses < 0 or size_evictions < 0:
+                # The cache has been replaced by a new one with the same name.
+                continue
+
+            # If the cache isn't evicting entries to stay within its maximum
+            # size, then more capacity won't save any misses.
+            misses_per_entry = 0.0
+            if size_evictions > 0:
+                misses_per_entry = misses / cache.max_size
+            cache_miss_rate_per_entry.labels(name).set(misses_per_entry)
+
+            candidates.append(
+                _TuningCandidate(
+                    name=name,
+                    factor=factor,
+                    capacity_per_factor=cache.max_size / factor,
+                    misses_per_entry=misses_per_entry,
+                )
+            )
+
+        return candidates
+
+    def _apply_tuned_factors(self) -> None:
+        set_tuned_cache_factors(self._tuned_factors)
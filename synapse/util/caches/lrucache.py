@@ -15,6 +15,7 @@
 import logging
 import math
 import threading
+import time
 import weakref
 from enum import Enum
 from functools import wraps
@@ -36,6 +37,7 @@ from typing import (
     overload,
 )
 
+from prometheus_client import Counter, Gauge, Histogram
 from typing_extensions import Literal
 
 from twisted.internet import reactor
@@ -56,6 +58,14 @@ from synapse.util.linked_list import ListNode
 if TYPE_CHECKING:
     from synapse.server import HomeServer
 
+try:
+    from synapse.synapse_rust.lru_cache import NativeLruCache, UnsupportedKeyError
+except ImportError:
+    # The native cache is not available if the Rust extension was built without
+    # it.
+    NativeLruCache = None  # type: ignore[assignment,misc]
+    UnsupportedKeyError = None  # type: ignore[assignment,misc]
+
 logger = logging.getLogger(__name__)
 
 try:
@@ -93,123 +103,230 @@ VT = TypeVar("VT")
 # a general type var, distinct from either KT or VT
 T = TypeVar("T")
 
-P = TypeVar("P")
+# Whether to record when cache entries were last accessed. We only do so if
+# time based eviction is enabled.
+TRACK_LAST_ACCESS = False
 
+# The LruCaches whose entries should be expired if they haven't been accessed
+# recently.
+EXPIRABLE_CACHES: "weakref.WeakSet[LruCache]" = weakref.WeakSet()
 
-class _TimedListNode(ListNode[P]):
-    """A `ListNode` that tracks last access time."""
+# How often we look for cache entries to expire.
+_EXPIRY_INTERVAL_MS = 1000
 
-    __slots__ = ["last_access_ts_secs"]
+# How often we check the memory usage, if evicting due to memory usage is
+# enabled.
+_MEMORY_CHECK_INTERVAL_SECS = 10
 
-    def update_last_access(self, clock: Clock) -> None:
-        self.last_access_ts_secs = int(clock.time())
+# The number of entries we expire from a cache at a time, between checks of the
+# time spent.
+_EXPIRY_BATCH_SIZE = 100
 
+# The largest fraction by which we reduce the maximum age of cache entries at
+# each memory check, if memory usage is above the configured maximum.
+_MAX_MEMORY_TTL_STEP = 0.5
 
-# Whether to insert new cache entries to the global list. We only add to it if
-# time based eviction is enabled.
-USE_GLOBAL_LIST = False
+expiry_tick_duration = Histogram(
+    "synapse_util_caches_expiry_tick_duration_seconds",
+    "Time spent expiring cache entries in each tick of the cache expiry loop",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1),
+)
+
+expiry_tick_entries = Histogram(
+    "synapse_util_caches_expiry_tick_entries",
+    "Number of cache entries expired in each tick of the cache expiry loop",
+    buckets=(0, 1, 10, 100, 1000, 10000, 100000),
+)
+
+expired_entries = Counter(
+    "synapse_util_caches_expiry_expired_entries",
+    "Number of cache entries expired by the cache expiry loop, by whether they "
+    "were expired due to their age or due to memory usage",
+    ["reason"],
+)
+
+expiry_ticks_over_budget = Counter(
+    "synapse_util_caches_expiry_ticks_over_budget",
+    "Number of ticks of the cache expiry loop which ran out of time before "
+    "expiring all the entries due to be expired",
+)
+
+memory_ttl_gauge = Gauge(
+    "synapse_util_caches_expiry_memory_ttl_seconds",
+    "The age beyond which cache entries are being expired due to memory usage, "
+    "or 0 if cache entries are not being expired due to memory usage",
+)
 
-# A linked list of all cache entries, allowing efficient time based eviction.
-GLOBAL_ROOT = ListNode["_Node"].create_root_node()
 
+class _CacheExpiry:
+    """Expires the entries of the LruCaches which haven't been accessed for a
+    given time, or, if memory usage is too high, for a shorter time.
 
-@wrap_as_background_process("LruCache._expire_old_entries")
-async def _expire_old_entries(
-    clock: Clock, expiry_seconds: float, autotune_config: Optional[dict]
-) -> None:
-    """Walks the global cache list to find cache entries that haven't been
-    accessed in the given number of seconds, or if a given memory threshold has been breached.
+    The work is done in ticks, each of which stops after `budget_secs`. If there
+    are still entries to expire at the end of a tick, another tick is scheduled
+    straight away, so the reactor gets to handle other work in between. Within a
+    tick, the caches with the highest cost (i.e. estimated memory usage, or
+    size if memory usage isn't tracked) are handled first.
+
+    If memory usage exceeds `max_cache_memory_usage`, the maximum age of cache
+    entries is reduced step by step, by more the further memory usage is above
+    `target_cache_memory_usage`, down to `min_cache_ttl`. Once memory usage drops
+    below `target_cache_memory_usage`, we go back to the configured expiry time.
     """
-    if autotune_config:
-        max_cache_memory_usage = autotune_config["max_cache_memory_usage"]
-        target_cache_memory_usage = autotune_config["target_cache_memory_usage"]
-        min_cache_ttl = autotune_config["min_cache_ttl"] / 1000
 
-    now = int(clock.time())
-    node = GLOBAL_ROOT.prev_node
-    assert node is not None
+    def __init__(
+        self,
+        clock: Clock,
+        expiry_seconds: float,
+        autotune_config: Optional[dict],
+        budget_secs: float,
+    ):
+        self._clock = clock
+        self._expiry_seconds = expiry_seconds
+        self._budget_secs = budget_secs
+
+        self._max_memory_usage: Optional[int] = None
+        if autotune_config:
+            self._max_memory_usage = autotune_config["max_cache_memory_usage"]
+            self._target_memory_usage = autotune_config["target_cache_memory_usage"]
+            self._min_cache_ttl = autotune_config["min_cache_ttl"] / 1000
+
+        # The maximum age of cache entries while we're evicting due to memory
+        # usage, or None if we're not.
+        self._memory_ttl: Optional[float] = None
+        self._last_memory_check = -math.inf
+
+        # Whether we have scheduled a tick to continue expiring entries.
+        self._continuation_scheduled = False
 
-    i = 0
+    def start(self) -> None:
+        self._clock.looping_call(self._tick, _EXPIRY_INTERVAL_MS)
 
-    logger.debug("Searching for stale caches")
+    @wrap_as_background_process("LruCache._expire_old_entries")
+    async def _tick(self) -> None:
+        self._continuation_scheduled = False
 
-    evicting_due_to_memory = False
+        start = time.perf_counter()
+        deadline = start + self._budget_secs
+        now = int(self._clock.time())
+
+        if (
+            self._max_memory_usage is not None
+            and now - self._last_memory_check >= _MEMORY_CHECK_INTERVAL_SECS
+        ):
+            self._last_memory_check = now
+            self._check_memory_usage(now)
+
+        max_age = self._expiry_seconds
+        reason = "time"
+        if self._memory_ttl is not None and self._memory_ttl < max_age:
+            max_age = self._memory_ttl
+            reason = "memory"
+
+        count = 0
+        finished = True
+        # Nothing can be older than the epoch.
+        if now - max_age >= 0:
+            count, finished = self._expire_entries(int(now - max_age), deadline)
+
+        expiry_tick_duration.observe(time.perf_counter() - start)
+        expiry_tick_entries.observe(count)
+        if count:
+            expired_entries.labels(reason).inc(count)
+            logger.debug("Expired %d cache entries", count)
+
+        if not finished:
+            expiry_ticks_over_budget.inc()
+            if not self._continuation_scheduled:
+                self._continuation_scheduled = True
+                self._clock.call_later(0, self._tick)
+
+    def _expire_entries(self, cutoff: int, deadline: float) -> Tuple[int, bool]:
+        """Expire the cache entries which were last accessed at or before
+        `cutoff`, until `deadline`.
+
+        Returns:
+            The number of entries expired, and whether all the entries due to be
+            expired have been.
+        """
+        candidates = []
+        for cache in list(EXPIRABLE_CACHES):
+            oldest = cache._oldest_access_ts()
+            if oldest is not None and oldest <= cutoff:
+                candidates.append(cache)
+        candidates.sort(key=lambda cache: cache._expiry_cost(), reverse=True)
+
+        count = 0
+        for cache in candidates:
+            while True:
+                expired = cache._expire_entries(cutoff, _EXPIRY_BATCH_SIZE)
+                count += expired
+                if expired < _EXPIRY_BATCH_SIZE:
+                    break
+                if time.perf_counter() >= deadline:
+                    return count, False
+
+            if time.perf_counter() >= deadline:
+                return count, cache is candidates[-1]
+
+        return count, True
+
+    def _check_memory_usage(self, now: int) -> None:
+        """Update the maximum age of cache entries based on the current memory
+        usage.
+        """
+        assert self._max_memory_usage is not None
+
+        jemalloc_interface = get_jemalloc_stats()
+        if not jemalloc_interface:
+            return
 
-    # determine if we're evicting due to memory
-    jemalloc_interface = get_jemalloc_stats()
-    if jemalloc_interface and autotune_config:
         try:
             jemalloc_interface.refresh_stats()
             mem_usage = jemalloc_interface.get_stat("allocated")
-            if mem_usage > max_cache_memory_usage:
-                logger.info("Begin memory-based cache eviction.")
-                evicting_due_to_memory = True
         except Exception:
             logger.warning(
                 "Unable to read allocated memory, skipping memory-based cache eviction."
             )
+            self._set_memory_ttl(None)
+            return
 
-    while node is not GLOBAL_ROOT:
-        # Only the root node isn't a `_TimedListNode`.
-        assert isinstance(node, _TimedListNode)
-
-        # if node has not aged past expiry_seconds and we are not evicting due to memory usage, there's
-        # nothing to do here
-        if (
-            node.last_access_ts_secs > now - expiry_seconds
-            and not evicting_due_to_memory
-        ):
-            break
-
-        # if entry is newer than min_cache_entry_ttl then do not evict and don't evict anything newer
-        if evicting_due_to_memory and now - node.last_access_ts_secs < min_cache_ttl:
-            break
-
-        cache_entry = node.get_cache_entry()
-        next_node = node.prev_node
-
-        # The node should always have a reference to a cache entry and a valid
-        # `prev_node`, as we only drop them when we remove the node from the
-        # list.
-        assert next_node is not None
-        assert cache_entry is not None
-        cache_entry.drop_from_cache()
-
-        # Check mem allocation periodically if we are evicting a bunch of caches
-        if jemalloc_interface and evicting_due_to_memory and (i + 1) % 100 == 0:
-            try:
-                jemalloc_interface.refresh_stats()
-                mem_usage = jemalloc_interface.get_stat("allocated")
-                if mem_usage < target_cache_memory_usage:
-                    evicting_due_to_memory = False
-                    logger.info("Stop memory-based cache eviction.")
-            except Exception:
-                logger.warning(
-                    "Unable to read allocated memory, this may affect memory-based cache eviction."
-                )
-                # If we've failed to read the current memory usage then we
-                # should stop trying to evict based on memory usage
-                evicting_due_to_memory = False
-
-        # If we do lots of work at once we yield to allow other stuff to happen.
-        if (i + 1) % 10000 == 0:
-            logger.debug("Waiting during drop")
-            if node.last_access_ts_secs > now - expiry_seconds:
-                await clock.sleep(0.5)
-            else:
-                await clock.sleep(0)
-            logger.debug("Waking during drop")
-
-        node = next_node
+        if mem_usage < self._target_memory_usage:
+            if self._memory_ttl is not None:
+                logger.info("Stop memory-based cache eviction.")
+            self._set_memory_ttl(None)
+            return
 
-        # If we've yielded then our current node may have been evicted, so we
-        # need to check that its still valid.
-        if node.prev_node is None:
-            break
+        if self._memory_ttl is None:
+            if mem_usage <= self._max_memory_usage:
+                return
+            logger.info("Begin memory-based cache eviction.")
+            # Start from the age of the oldest entry, so that the first step
+            # takes effect straight away.
+            oldest_access = min(
+                (
+                    ts
+                    for ts in (cache._oldest_access_ts() for cache in EXPIRABLE_CACHES)
+                    if ts is not None
+                ),
+                default=now,
+            )
+            ttl = min(float(now - oldest_access), self._expiry_seconds)
+        else:
+            ttl = self._memory_ttl
 
-        i += 1
+        # Reduce the maximum age by more the further we are above the target.
+        pressure = min(
+            (mem_usage - self._target_memory_usage)
+            / max(self._max_memory_usage - self._target_memory_usage, 1),
+            1,
+        )
+        ttl *= 1 - _MAX_MEMORY_TTL_STEP * pressure
+        self._set_memory_ttl(max(ttl, self._min_cache_ttl))
 
-    logger.info("Dropped %d items from caches", i)
+    def _set_memory_ttl(self, ttl: Optional[float]) -> None:
+        self._memory_ttl = ttl
+        memory_ttl_gauge.set(ttl or 0)
 
 
 def setup_expire_lru_cache_entries(hs: "HomeServer") -> None:
@@ -226,24 +343,22 @@ def setup_expire_lru_cache_entries(hs: "HomeServer") -> None:
     else:
         expiry_time = math.inf
 
-    global USE_GLOBAL_LIST
-    USE_GLOBAL_LIST = True
+    global TRACK_LAST_ACCESS
+    TRACK_LAST_ACCESS = True
 
-    clock = hs.get_clock()
-    clock.looping_call(
-        _expire_old_entries,
-        30 * 1000,
-        clock,
+    _CacheExpiry(
+        hs.get_clock(),
         expiry_time,
         hs.config.caches.cache_autotuning,
-    )
+        hs.config.caches.expiry_tick_budget_ms / 1000,
+    ).start()
 
 
 class _Node(Generic[KT, VT]):
     __slots__ = [
         "_list_node",
-        "_global_list_node",
         "_cache",
+        "last_access_ts_secs",
         "key",
         "value",
         "callbacks",
@@ -258,13 +373,12 @@ class _Node(Generic[KT, VT]):
         cache: "weakref.ReferenceType[LruCache[KT, VT]]",
         clock: Clock,
         callbacks: Collection[Callable[[], None]] = (),
-        prune_unread_entries: bool = True,
     ):
         self._list_node = ListNode.insert_after(self, root)
-        self._global_list_node: Optional[_TimedListNode] = None
-        if USE_GLOBAL_LIST and prune_unread_entries:
-            self._global_list_node = _TimedListNode.insert_after(self, GLOBAL_ROOT)
-            self._global_list_node.update_last_access(clock)
+
+        # When the entry was last accessed, for time based eviction. The cache
+        # list is in order of this.
+        self.last_access_ts_secs = int(clock.time()) if TRACK_LAST_ACCESS else 0
 
         # We store a weak reference to the cache object so that this _Node can
         # remove itself from the cache. If the cache is dropped we ensure we
@@ -297,10 +411,7 @@ class _Node(Generic[KT, VT]):
                 + _get_size_of(self, recurse=False)
             )
             self.memory += _get_size_of(self.memory, recurse=False)
-
-            if self._global_list_node:
-                self.memory += _get_size_of(self._global_list_node, recurse=False)
-                self.memory += _get_size_of(self._global_list_node.last_access_ts_secs)
+            self.memory += _get_size_of(self.last_access_ts_secs)
 
     def add_callbacks(self, callbacks: Collection[Callable[[], None]]) -> None:
         """Add to stored list of callbacks, removing duplicates."""
@@ -344,18 +455,14 @@ class _Node(Generic[KT, VT]):
             self.drop_from_lists()
 
     def drop_from_lists(self) -> None:
-        """Remove this node from the cache lists."""
+        """Remove this node from the cache list."""
         self._list_node.remove_from_list()
 
-        if self._global_list_node:
-            self._global_list_node.remove_from_list()
-
     def move_to_front(self, clock: Clock, cache_list_root: ListNode) -> None:
-        """Moves this node to the front of all the lists its in."""
+        """Moves this node to the front of the cache list."""
         self._list_node.move_after(cache_list_root)
-        if self._global_list_node:
-            self._global_list_node.move_after(GLOBAL_ROOT)
-            self._global_list_node.update_last_access(clock)
+        if TRACK_LAST_ACCESS:
+            self.last_access_ts_secs = int(clock.time())
 
 
 class _Sentinel(Enum):
@@ -419,8 +526,6 @@ class LruCache(Generic[KT, VT]):
         else:
             real_clock = clock
 
-        cache: Union[Dict[KT, _Node[KT, VT]], TreeCache] = cache_type()
-        self.cache = cache  # Used for introspection.
         self.apply_cache_factor_from_config = apply_cache_factor_from_config
 
         # Save the original max size, and apply the default size factor.
@@ -450,6 +555,36 @@ class LruCache(Generic[KT, VT]):
         # this is exposed for access from outside this class
         self.metrics = metrics
 
+        if prune_unread_entries:
+            EXPIRABLE_CACHES.add(self)
+
+        if (
+            caches.USE_NATIVE_LRU_CACHE
+            and NativeLruCache is not None
+            # The native cache can't estimate the memory usage of its entries.
+            and not caches.TRACK_MEMORY_USAGE
+            and cache_type in (dict, TreeCache)
+        ):
+            self._setup_native_cache(cache_name, cache_type, size_callback, real_clock)
+        else:
+            self._setup_python_cache(cache_type, size_callback, real_clock)
+
+    def _setup_python_cache(
+        self,
+        cache_type: Type[Union[dict, TreeCache]],
+        size_callback: Optional[Callable[[VT], int]],
+        real_clock: Clock,
+    ) -> None:
+        """Set up the cache methods to store the entries in `cache_type`, with
+        a linked list of `_Node`s to keep track of the order they were used in.
+        """
+        metrics = self.metrics
+
+        cache: Union[Dict[KT, _Node[KT, VT]], TreeCache] = cache_type()
+        self.cache: Union[
+            Dict[KT, _Node[KT, VT]], TreeCache, "NativeLruCache"
+        ] = cache  # Used for introspection.
+
         # We create a single weakref to self here so that we don't need to keep
         # creating more each time we create a `_Node`.
         weak_ref_to_self = weakref.ref(self)
@@ -509,7 +644,6 @@ class LruCache(Generic[KT, VT]):
                 weak_ref_to_self,
                 real_clock,
                 callbacks,
-                prune_unread_entries,
             )
             cache[key] = node
 
@@ -727,11 +861,19 @@ class LruCache(Generic[KT, VT]):
                 return
             # for each deleted node, we now need to remove it from the linked list
             # and run its callbacks.
+            deleted_len = 0
             for leaf in iterate_tree_cache_entry(popped):
-                delete_node(leaf)
+                deleted_len += delete_node(leaf)
+
+            if deleted_len and metrics:
+                metrics.inc_evictions(EvictionReason.invalidation, deleted_len)
 
         @synchronized
         def cache_clear() -> None:
+            cleared_len = cache_len()
+            if cleared_len and metrics:
+                metrics.inc_evictions(EvictionReason.invalidation, cleared_len)
+
             for node in cache.values():
                 node.run_and_clear_callbacks()
                 node.drop_from_lists()
@@ -750,6 +892,42 @@ class LruCache(Generic[KT, VT]):
         def cache_contains(key: KT) -> bool:
             return key in cache
 
+        @synchronized
+        def cache_expire(cutoff: int, limit: int) -> int:
+            """Remove up to `limit` entries which were last accessed at or before
+            `cutoff`, least recently used first. Returns the number of entries
+            removed.
+            """
+            expired = 0
+            while expired < limit:
+                todelete = list_root.prev_node
+                assert todelete is not None
+
+                # Only the list root doesn't have a cache entry, in which case
+                # the cache is empty.
+                node = todelete.get_cache_entry()
+                if node is None or node.last_access_ts_secs > cutoff:
+                    break
+
+                evicted_len = delete_node(node)
+                cache.pop(node.key, None)
+                if metrics:
+                    metrics.inc_evictions(EvictionReason.time, evicted_len)
+                expired += 1
+
+            return expired
+
+        def cache_oldest_access_ts() -> Optional[int]:
+            todelete = list_root.prev_node
+            assert todelete is not None
+            node = todelete.get_cache_entry()
+            return node.last_access_ts_secs if node is not None else None
+
+        def cache_expiry_cost() -> int:
+            if metrics and metrics.memory_usage is not None:
+                return metrics.memory_usage
+            return cache_len()
+
         # make sure that we clear out any excess entries after we get resized.
         self._on_resize = evict
 
@@ -767,6 +945,262 @@ class LruCache(Generic[KT, VT]):
         self.contains = cache_contains
         self.clear = cache_clear
 
+        # Used by the cache expiry loop.
+        self._expire_entries = cache_expire
+        self._oldest_access_ts = cache_oldest_access_ts
+        self._expiry_cost = cache_expiry_cost
+
+    def _setup_native_cache(
+        self,
+        cache_name: Optional[str],
+        cache_type: Type[Union[dict, TreeCache]],
+        size_callback: Optional[Callable[[VT], int]],
+        clock: Clock,
+    ) -> None:
+        """Set up the cache methods to store the entries in a `NativeLruCache`.
+
+        Unlike the Python implementation, we don't hold a lock around calls into
+        the native cache: it holds the GIL for the whole of each call, which it
+        can do as it only supports keys made up of builtin types. If we're given
+        any other key, the entries are moved into the Python implementation,
+        which is used from then on.
+        """
+        assert NativeLruCache is not None
+        native = NativeLruCache(cache_type is TreeCache)
+        self.cache = native  # Used for introspection.
+
+        metrics = self.metrics
+
+        fall_back_lock = threading.Lock()
+
+        def fall_back() -> None:
+            """Move the entries into the Python implementation, unless another
+            thread already has.
+
+            Once drained, the native cache raises `UnsupportedKeyError` on
+            every call, so callers which race with us retry with the Python
+            implementation once we're done.
+            """
+            with fall_back_lock:
+                if self.cache is not native:
+                    return
+
+                logger.info(
+                    "Moving the entries of LRU cache %s into the Python"
+                    " implementation, as it has keys which the native cache"
+                    " doesn't support",
+                    cache_name,
+                )
+                entries = native.drain()
+                self._setup_python_cache(cache_type, size_callback, clock)
+                for key, value, callbacks in entries:
+                    self.set(key, value, callbacks)
+
+        def access_ts() -> int:
+            # We only need to know when entries were last accessed if they
+            # might be expired.
+            if TRACK_LAST_ACCESS:
+                return int(clock.time())
+            return 0
+
+        def native_callbacks(
+            callbacks: Collection[Callable[[], None]]
+        ) -> Optional[Collection[Callable[[], None]]]:
+            # The native cache only accepts the builtin collections, as iterating
+            # over anything else may run Python code.
+            if not callbacks:
+                return None
+            if type(callbacks) in (list, tuple, set, frozenset):
+                return callbacks
+            return tuple(callbacks)
+
+        def handle_removed(
+            removed: Optional[Tuple[List[Callable[[], None]], int, List[VT]]],
+            reason: EvictionReason,
+        ) -> None:
+            # The values of the removed entries are dropped when we return, once
+            # we're done with the native cache.
+            if removed is None:
+                return
+
+            callbacks, removed_size, _ = removed
+            if removed_size and metrics:
+                metrics.inc_evictions(reason, removed_size)
+            for callback in callbacks:
+                callback()
+
+        def evict() -> None:
+            try:
+                removed = native.evict(self.max_size)
+            except UnsupportedKeyError:
+                fall_back()
+                assert self._on_resize is not None
+                self._on_resize()
+                return
+            handle_removed(removed, EvictionReason.size)
+
+        def cache_len() -> int:
+            try:
+                return native.total_size
+            except UnsupportedKeyError:
+                fall_back()
+                return self.len()
+
+        def cache_get(
+            key: KT,
+            default: Optional[T] = None,
+            callbacks: Collection[Callable[[], None]] = (),
+            update_metrics: bool = True,
+            update_last_access: bool = True,
+        ) -> Union[None, T, VT]:
+            try:
+                value = native.get(
+                    key,
+                    _Sentinel.sentinel,
+                    update_last_access,
+                    access_ts() if update_last_access else 0,
+                    native_callbacks(callbacks),
+                )
+            except UnsupportedKeyError:
+                fall_back()
+                return self.get(
+                    key, default, callbacks, update_metrics, update_last_access
+                )
+
+            if value is _Sentinel.sentinel:
+                if update_metrics and metrics:
+                    metrics.inc_misses()
+                return default
+
+            if update_metrics and metrics:
+                metrics.inc_hits()
+            return value
+
+        def cache_get_multi(
+            key: tuple,
+            default: Optional[T] = None,
+            update_metrics: bool = True,
+        ) -> Union[None, T, Iterable[Tuple[KT, VT]]]:
+            try:
+                items = native.get_multi(key)
+            except UnsupportedKeyError:
+                fall_back()
+                return self.get_multi(key, default, update_metrics)
+
+            if items is None:
+                if update_metrics and metrics:
+                    metrics.inc_misses()
+                return default
+
+            if update_metrics and metrics:
+                metrics.inc_hits()
+            return items
+
+        def cache_set(
+            key: KT, value: VT, callbacks: Collection[Callable[[], None]] = ()
+        ) -> None:
+            try:
+                removed = native.set(
+                    key,
+                    value,
+                    size_callback(value) if size_callback else 1,
+                    access_ts(),
+                    self.max_size,
+                    native_callbacks(callbacks),
+                )
+            except UnsupportedKeyError:
+                fall_back()
+                return self.set(key, value, callbacks)
+            handle_removed(removed, EvictionReason.size)
+
+        def cache_set_default(key: KT, value: VT) -> VT:
+            try:
+                existing = native.get(key, _Sentinel.sentinel, False, 0)
+            except UnsupportedKeyError:
+                fall_back()
+                return self.setdefault(key, value)
+
+            if existing is not _Sentinel.sentinel:
+                return existing
+
+            cache_set(key, value)
+            return value
+
+        def cache_pop(key: KT, default: Optional[T] = None) -> Union[None, T, VT]:
+            try:
+                popped = native.pop(key)
+            except UnsupportedKeyError:
+                fall_back()
+                return self.pop(key, default)
+
+            if popped is None:
+                return default
+
+            value, callbacks, evicted_size = popped
+            if metrics:
+                metrics.inc_evictions(EvictionReason.invalidation, evicted_size)
+            for callback in callbacks:
+                callback()
+            return value
+
+        def cache_del_multi(key: KT) -> None:
+            try:
+                removed = native.del_multi(key)
+            except UnsupportedKeyError:
+                fall_back()
+                return self.del_multi(key)
+            handle_removed(removed, EvictionReason.invalidation)
+
+        def cache_clear() -> None:
+            try:
+                removed = native.clear()
+            except UnsupportedKeyError:
+                fall_back()
+                return self.clear()
+            handle_removed(removed, EvictionReason.invalidation)
+
+        def cache_contains(key: KT) -> bool:
+            try:
+                return native.contains(key)
+            except UnsupportedKeyError:
+                fall_back()
+                return self.contains(key)
+
+        def cache_oldest_access_ts() -> Optional[int]:
+            try:
+                return native.oldest_access
+            except UnsupportedKeyError:
+                fall_back()
+                return self._oldest_access_ts()
+
+        def cache_expire(cutoff: int, limit: int) -> int:
+            try:
+                expired, removed = native.expire(cutoff, limit)
+            except UnsupportedKeyError:
+                fall_back()
+                return self._expire_entries(cutoff, limit)
+            handle_removed(removed, EvictionReason.time)
+            return expired
+
+        self._on_resize = evict
+
+        self.get = cache_get
+        self.set = cache_set
+        self.setdefault = cache_set_default
+        self.pop = cache_pop
+        self.del_multi = cache_del_multi
+        if cache_type is TreeCache:
+            self.get_multi = cache_get_multi
+        self.invalidate = cache_del_multi
+        self.len = cache_len
+        self.contains = cache_contains
+        self.clear = cache_clear
+
+        # Used by the cache expiry loop.
+        self._expire_entries = cache_expire
+        self._oldest_access_ts = cache_oldest_access_ts
+        self._expiry_cost = cache_len
+
     def __getitem__(self, key: KT) -> VT:
         result = self.get(key, _Sentinel.sentinel)
         if result is _Sentinel.sentinel:
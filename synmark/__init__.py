@@ -33,3 +33,21 @@ def make_reactor():
     installReactor(reactor)
 
     return reactor
+
+
+def make_lru_cache(max_size, native=False):
+    """
+    Create an LruCache, storing its entries in a `NativeLruCache` if `native` is
+    set.
+    """
+    from synapse.util import caches
+    from synapse.util.caches.lrucache import LruCache, NativeLruCache
+
+    if native and NativeLruCache is None:
+        raise Exception("The native LRU cache is not available")
+
+    caches.USE_NATIVE_LRU_CACHE = native
+    try:
+        return LruCache(max_size)
+    finally:
+        caches.USE_NATIVE_LRU_CACHE = False
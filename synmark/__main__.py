@@ -96,3 +96,11 @@ if __name__ == "__main__":
             suite.__name__ + "_" + str(loops),
             make_test(suite.main),
         )
+
+        # Suites can define variants of their benchmark, e.g. to compare
+        # implementations, which are run with the same number of loops.
+        for variant, main in getattr(suite, "VARIANTS", {}).items():
+            runner.bench_time_func(
+                suite.__name__ + "_" + variant + "_" + str(loops),
+                make_test(main),
+            )
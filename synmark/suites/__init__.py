@@ -1,9 +1,21 @@
-from . import logging, lrucache, lrucache_evict
+from . import (
+    logcontext,
+    logging,
+    lrucache,
+    lrucache_evict,
+    lrucache_get,
+    presence,
+    thumbnail,
+)
 
 SUITES = [
+    (logcontext, None),
     (logging, 1000),
     (logging, 10000),
     (logging, None),
     (lrucache, None),
     (lrucache_evict, None),
+    (lrucache_get, None),
+    (presence, 1000),
+    (thumbnail, 20),
 ]
@@ -0,0 +1,46 @@
+# Copyright 2023 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from pyperf import perf_counter
+
+from twisted.internet.defer import Deferred
+
+from synapse.logging.context import (
+    LoggingContext,
+    make_deferred_yieldable,
+    run_in_background,
+)
+
+
+async def main(reactor, loops):
+    """
+    Benchmark `loops` iterations of waiting on, and then resolving, a Deferred
+    from within a logcontext via `run_in_background` and
+    `make_deferred_yieldable`. Each iteration switches the logcontext out and
+    back in again.
+    """
+    parent = LoggingContext("parent")
+
+    start = perf_counter()
+
+    with LoggingContext("bench", parent_context=parent):
+        for _ in range(loops):
+            d: "Deferred[None]" = Deferred()
+            run_in_background(lambda: d)
+            make_deferred_yieldable(d)
+            d.callback(None)
+
+    end = perf_counter() - start
+
+    return end
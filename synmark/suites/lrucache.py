@@ -14,14 +14,15 @@
 
 from pyperf import perf_counter
 
-from synapse.util.caches.lrucache import LruCache
+from synapse.util.caches.lrucache import NativeLruCache
+from synmark import make_lru_cache
 
 
-async def main(reactor, loops):
+async def main(reactor, loops, native=False):
     """
     Benchmark `loops` number of insertions into LruCache without eviction.
     """
-    cache = LruCache(loops)
+    cache = make_lru_cache(loops, native)
 
     start = perf_counter()
 
@@ -31,3 +32,11 @@ async def main(reactor, loops):
     end = perf_counter() - start
 
     return end
+
+
+async def main_native(reactor, loops):
+    return await main(reactor, loops, native=True)
+
+
+# The variants of the benchmark to report alongside it.
+VARIANTS = {"native": main_native} if NativeLruCache is not None else {}
@@ -14,15 +14,16 @@
 
 from pyperf import perf_counter
 
-from synapse.util.caches.lrucache import LruCache
+from synapse.util.caches.lrucache import NativeLruCache
+from synmark import make_lru_cache
 
 
-async def main(reactor, loops):
+async def main(reactor, loops, native=False):
     """
     Benchmark `loops` number of insertions into LruCache where half of them are
     evicted.
     """
-    cache = LruCache(loops // 2)
+    cache = make_lru_cache(loops // 2, native)
 
     start = perf_counter()
 
@@ -32,3 +33,11 @@ async def main(reactor, loops):
     end = perf_counter() - start
 
     return end
+
+
+async def main_native(reactor, loops):
+    return await main(reactor, loops, native=True)
+
+
+# The variants of the benchmark to report alongside it.
+VARIANTS = {"native": main_native} if NativeLruCache is not None else {}
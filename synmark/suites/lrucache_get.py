@@ -0,0 +1,45 @@
+# Copyright 2023 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from pyperf import perf_counter
+
+from synapse.util.caches.lrucache import NativeLruCache
+from synmark import make_lru_cache
+
+
+async def main(reactor, loops, native=False):
+    """
+    Benchmark `loops` number of lookups of entries in LruCache.
+    """
+    cache = make_lru_cache(loops, native)
+
+    for i in range(loops):
+        cache[i] = True
+
+    start = perf_counter()
+
+    for i in range(loops):
+        cache.get(i)
+
+    end = perf_counter() - start
+
+    return end
+
+
+async def main_native(reactor, loops):
+    return await main(reactor, loops, native=True)
+
+
+# The variants of the benchmark to report alongside it.
+VARIANTS = {"native": main_native} if NativeLruCache is not None else {}
@@ -0,0 +1,85 @@
+# Copyright 2023 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import random
+
+from pyperf import perf_counter
+
+from synapse.api.presence import UserPresenceState
+from synapse.handlers.presence import get_interested_remotes
+
+NUM_USERS = 100000
+NUM_ROOMS = 10000
+ROOMS_PER_USER = 10
+NUM_HOSTS = 1000
+
+
+class FakeStore:
+    """A store holding a fixed set of room memberships in memory, so that only
+    the cost of working out who is interested in presence updates is measured.
+    """
+
+    def __init__(self):
+        rng = random.Random(0)
+
+        self.rooms_for_user = {}
+        hosts_in_room = {}
+        for i in range(NUM_USERS):
+            user_id = "@user%d:host%d" % (i, i % NUM_HOSTS)
+            rooms = frozenset(
+                "!room%d:host0" % (rng.randrange(NUM_ROOMS),)
+                for _ in range(ROOMS_PER_USER)
+            )
+            self.rooms_for_user[user_id] = rooms
+            for room_id in rooms:
+                hosts_in_room.setdefault(room_id, set()).add("host%d" % (i % NUM_HOSTS))
+
+        self.hosts_in_room = {
+            room_id: frozenset(hosts) for room_id, hosts in hosts_in_room.items()
+        }
+
+    async def get_rooms_for_users(self, user_ids):
+        return {user_id: self.rooms_for_user[user_id] for user_id in user_ids}
+
+    async def get_current_hosts_in_room(self, room_id):
+        return self.hosts_in_room[room_id]
+
+
+class FakePresenceRouter:
+    async def get_users_for_states(self, states):
+        return {}
+
+
+async def main(reactor, loops):
+    """
+    Benchmark working out the remote servers interested in `loops` presence
+    updates, with 100k users spread across 10k rooms.
+    """
+    store = FakeStore()
+    presence_router = FakePresenceRouter()
+
+    user_ids = list(store.rooms_for_user)
+    states = [
+        UserPresenceState.default(user_ids[i % len(user_ids)]) for i in range(loops)
+    ]
+
+    start = perf_counter()
+
+    # Presence updates are handled in batches by the presence handler.
+    for i in range(0, loops, 100):
+        await get_interested_remotes(store, presence_router, states[i : i + 100])
+
+    end = perf_counter() - start
+
+    return end
@@ -0,0 +1,90 @@
+# Copyright 2023 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import random
+import shutil
+import tempfile
+
+from PIL import Image
+from pyperf import perf_counter
+
+from synapse.media.thumbnailer import Thumbnailer
+
+# The default thumbnail sizes from the config, as (width, height, method).
+THUMBNAIL_SIZES = [
+    (32, 32, "crop"),
+    (96, 96, "crop"),
+    (320, 240, "scale"),
+    (640, 480, "scale"),
+    (800, 600, "scale"),
+]
+
+# The corpus of images to thumbnail, as (format, width, height).
+CORPUS = [
+    ("JPEG", 4032, 3024),
+    ("JPEG", 1920, 1080),
+    ("JPEG", 1080, 1920),
+    ("PNG", 1920, 1080),
+    ("PNG", 512, 512),
+]
+
+
+def make_image(path, fmt, width, height):
+    """Write an image with some noise, so that it doesn't compress away."""
+    rng = random.Random(0)
+    image = Image.new("RGB", (width // 16, height // 16))
+    image.putdata(
+        [
+            (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+            for _ in range(image.width * image.height)
+        ]
+    )
+    image = image.resize((width, height), Image.BILINEAR)
+    image.save(path, fmt)
+
+
+async def main(reactor, loops):
+    """
+    Benchmark generating the default set of thumbnails for `loops` images from
+    a corpus of JPEGs and PNGs of various sizes.
+    """
+    tmpdir = tempfile.mkdtemp()
+    try:
+        paths = []
+        for i, (fmt, width, height) in enumerate(CORPUS):
+            path = os.path.join(tmpdir, "%d.%s" % (i, fmt.lower()))
+            make_image(path, fmt, width, height)
+            paths.append(path)
+
+        start = perf_counter()
+
+        for i in range(loops):
+            with Thumbnailer(paths[i % len(paths)]) as thumbnailer:
+                thumbnailer.draft(
+                    max(width for width, _, _ in THUMBNAIL_SIZES),
+                    max(height for _, height, _ in THUMBNAIL_SIZES),
+                )
+                for width, height, method in THUMBNAIL_SIZES:
+                    if method == "crop":
+                        thumbnailer.crop(width, height, "image/jpeg")
+                    else:
+                        width, height = thumbnailer.aspect(width, height)
+                        thumbnailer.scale(width, height, "image/jpeg")
+
+        end = perf_counter() - start
+    finally:
+        shutil.rmtree(tmpdir)
+
+    return end
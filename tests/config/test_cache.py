@@ -12,9 +12,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from synapse.config.cache import CacheConfig, add_resizable_cache
+from synapse.config import ConfigError
+from synapse.config.cache import (
+    CacheConfig,
+    add_resizable_cache,
+    set_tuned_cache_factors,
+)
 from synapse.types import JsonDict
-from synapse.util.caches.lrucache import LruCache
+from synapse.util.caches.lrucache import LruCache, NativeLruCache
 
 from tests.unittest import TestCase
 
@@ -165,3 +170,52 @@ class CacheConfigTests(TestCase):
         add_resizable_cache("event_cache", cache_resize_callback=cache.set_cache_factor)
 
         self.assertEqual(cache.max_size, 10240)
+
+    def test_tuned_factors(self) -> None:
+        """Factors chosen by the autotuner override the global factor, but not
+        any per-cache factors.
+        """
+        config: JsonDict = {
+            "caches": {"global_factor": 1, "per_cache_factors": {"foo": 2}}
+        }
+        self.config.read_config(config, config_dir_path="", data_dir_path="")
+        self.config.resize_all_caches()
+
+        foo: LruCache = LruCache(100)
+        add_resizable_cache("foo", cache_resize_callback=foo.set_cache_factor)
+        bar: LruCache = LruCache(100)
+        add_resizable_cache("bar", cache_resize_callback=bar.set_cache_factor)
+
+        set_tuned_cache_factors({"foo": 3, "bar": 0.5})
+        self.assertEqual(foo.max_size, 200)
+        self.assertEqual(bar.max_size, 50)
+
+        # Tuned factors should also be applied to new caches.
+        baz: LruCache = LruCache(100)
+        set_tuned_cache_factors({"baz": 1.5})
+        add_resizable_cache("baz", cache_resize_callback=baz.set_cache_factor)
+        self.assertEqual(baz.max_size, 150)
+        self.assertEqual(bar.max_size, 100)
+
+    def test_native_lru_cache(self) -> None:
+        """Enabling the native LRU cache fails if it is not available."""
+        config: JsonDict = {"caches": {"native_lru_cache": True}}
+        if NativeLruCache is None:
+            with self.assertRaises(ConfigError):
+                self.config.read_config(config, config_dir_path="", data_dir_path="")
+        else:
+            self.config.read_config(config, config_dir_path="", data_dir_path="")
+            self.assertTrue(self.config.native_lru_cache)
+
+    def test_expiry_tick_budget(self) -> None:
+        """The expiry tick budget is parsed as a duration, and must be positive."""
+        self.config.read_config({}, config_dir_path="", data_dir_path="")
+        self.assertEqual(self.config.expiry_tick_budget_ms, 10)
+
+        config: JsonDict = {"caches": {"expiry_tick_budget": "1s"}}
+        self.config.read_config(config, config_dir_path="", data_dir_path="")
+        self.assertEqual(self.config.expiry_tick_budget_ms, 1000)
+
+        config = {"caches": {"expiry_tick_budget": 0}}
+        with self.assertRaises(ConfigError):
+            self.config.read_config(config, config_dir_path="", data_dir_path="")
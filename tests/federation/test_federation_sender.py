@@ -11,8 +11,8 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from typing import Callable, FrozenSet, List, Optional, Set
-from unittest.mock import Mock
+from typing import Callable, Collection, Dict, FrozenSet, List, Optional, Set
+from unittest.mock import Mock, patch
 
 from signedjson import key, sign
 from signedjson.types import BaseKey, SigningKey
@@ -20,7 +20,10 @@ from signedjson.types import BaseKey, SigningKey
 from twisted.internet import defer
 from twisted.test.proto_helpers import MemoryReactor
 
-from synapse.api.constants import EduTypes, RoomEncryptionAlgorithms
+from synapse.api.constants import EduTypes, PresenceState, RoomEncryptionAlgorithms
+from synapse.api.presence import UserPresenceState
+from synapse.federation.sender import FederationSender
+from synapse.federation.sender.per_destination_queue import PRESENCE_RESEND_INTERVAL_MS
 from synapse.federation.units import Transaction
 from synapse.handlers.device import DeviceHandler
 from synapse.rest import admin
@@ -259,6 +262,139 @@ class FederationSenderReceiptsTestCases(HomeserverTestCase):
         )
 
 
+class FederationSenderPresenceTestCases(HomeserverTestCase):
+    """
+    Test federation sending of presence updates.
+    """
+
+    def make_homeserver(self, reactor: MemoryReactor, clock: Clock) -> HomeServer:
+        self.federation_transport_client = Mock(spec=["send_transaction"])
+        self.federation_transport_client.send_transaction.return_value = make_awaitable(
+            {}
+        )
+        return self.setup_test_homeserver(
+            federation_transport_client=self.federation_transport_client,
+        )
+
+    def default_config(self) -> JsonDict:
+        config = super().default_config()
+        config["federation_sender_instances"] = None
+        return config
+
+    def get_sent_presence(self) -> List[JsonDict]:
+        """Get the presence updates sent since the last call."""
+        mock_send_transaction = self.federation_transport_client.send_transaction
+        presence = []
+        for call in mock_send_transaction.call_args_list:
+            for edu in call[0][1]()["edus"]:
+                if edu["edu_type"] == EduTypes.PRESENCE:
+                    presence.extend(edu["content"]["push"])
+        mock_send_transaction.reset_mock()
+        return presence
+
+    def test_skip_unchanged_presence(self) -> None:
+        sender = self.hs.get_federation_sender()
+        now = self.clock.time_msec()
+        state = UserPresenceState.default("@user:test").copy_and_replace(
+            state=PresenceState.ONLINE,
+            last_active_ts=now,
+            currently_active=True,
+        )
+
+        sender.send_presence_to_destinations([state], ["host2"], skip_unchanged=True)
+        self.reactor.advance(1)
+        self.assertEqual(len(self.get_sent_presence()), 1)
+
+        # Only the last active time has moved on, so nothing is sent.
+        self.reactor.advance(60)
+        state = state.copy_and_replace(last_active_ts=self.clock.time_msec())
+        sender.send_presence_to_destinations([state], ["host2"], skip_unchanged=True)
+        self.reactor.advance(1)
+        self.assertEqual(self.get_sent_presence(), [])
+
+        # Unless we're asked to send it anyway.
+        sender.send_presence_to_destinations([state], ["host2"])
+        self.reactor.advance(1)
+        self.assertEqual(len(self.get_sent_presence()), 1)
+
+        # A change which the destination can see is always sent.
+        state = state.copy_and_replace(status_msg="Busy")
+        sender.send_presence_to_destinations([state], ["host2"], skip_unchanged=True)
+        self.reactor.advance(1)
+        sent = self.get_sent_presence()
+        self.assertEqual(len(sent), 1)
+        self.assertEqual(sent[0]["status_msg"], "Busy")
+
+        # As is the unchanged state once enough time has passed.
+        self.reactor.advance(PRESENCE_RESEND_INTERVAL_MS / 1000)
+        sender.send_presence_to_destinations([state], ["host2"], skip_unchanged=True)
+        self.reactor.advance(1)
+        self.assertEqual(len(self.get_sent_presence()), 1)
+
+    def test_resend_presence_changed_back_while_in_flight(self) -> None:
+        """If a user's presence changes back to what the destination last had
+        while the change is being sent, the presence is sent again.
+        """
+        sender = self.hs.get_federation_sender()
+        state = UserPresenceState.default("@user:test").copy_and_replace(
+            state=PresenceState.ONLINE,
+            last_active_ts=self.clock.time_msec(),
+        )
+
+        sender.send_presence_to_destinations([state], ["host2"], skip_unchanged=True)
+        self.reactor.advance(1)
+        self.assertEqual(len(self.get_sent_presence()), 1)
+
+        # Hold the next transaction in flight while the user goes back to their
+        # previous presence.
+        transaction_result: "defer.Deferred[JsonDict]" = defer.Deferred()
+        self.federation_transport_client.send_transaction.return_value = (
+            transaction_result
+        )
+        busy_state = state.copy_and_replace(status_msg="Busy")
+        sender.send_presence_to_destinations(
+            [busy_state], ["host2"], skip_unchanged=True
+        )
+        self.reactor.advance(1)
+        sender.send_presence_to_destinations([state], ["host2"], skip_unchanged=True)
+        sent = self.get_sent_presence()
+        self.assertEqual([p.get("status_msg") for p in sent], ["Busy"])
+
+        self.federation_transport_client.send_transaction.return_value = make_awaitable(
+            {}
+        )
+        transaction_result.callback({})
+        self.reactor.advance(1)
+        sent = self.get_sent_presence()
+        self.assertEqual([p.get("status_msg") for p in sent], [None])
+
+    def test_recently_sent_presence_is_bounded(self) -> None:
+        """Only a limited number of users' sent presence is remembered for each
+        destination.
+        """
+        sender = self.hs.get_federation_sender()
+        assert isinstance(sender, FederationSender)
+        states = [
+            UserPresenceState.default("@user%i:test" % (i,)).copy_and_replace(
+                state=PresenceState.ONLINE
+            )
+            for i in range(5)
+        ]
+
+        with patch(
+            "synapse.federation.sender.per_destination_queue.MAX_RECENTLY_SENT_PRESENCE",
+            3,
+        ):
+            sender.send_presence_to_destinations(states, ["host2"], skip_unchanged=True)
+            self.reactor.advance(1)
+
+        queue = sender._get_per_destination_queue("host2")
+        self.assertEqual(
+            list(queue._recently_sent_presence),
+            ["@user2:test", "@user3:test", "@user4:test"],
+        )
+
+
 class FederationSenderDevicesTestCases(HomeserverTestCase):
     """
     Test federation sending to update devices.
@@ -289,13 +425,21 @@ class FederationSenderDevicesTestCases(HomeserverTestCase):
     def prepare(self, reactor: MemoryReactor, clock: Clock, hs: HomeServer) -> None:
         test_room_id = "!room:host1"
 
-        # stub out `get_rooms_for_user` and `get_current_hosts_in_room` so that the
-        # server thinks the user shares a room with `@user2:host2`
+        # stub out `get_rooms_for_user`, `get_rooms_for_users` and
+        # `get_current_hosts_in_room` so that the server thinks the user shares
+        # a room with `@user2:host2`
         def get_rooms_for_user(user_id: str) -> "defer.Deferred[FrozenSet[str]]":
             return defer.succeed(frozenset({test_room_id}))
 
         hs.get_datastores().main.get_rooms_for_user = get_rooms_for_user  # type: ignore[assignment]
 
+        async def get_rooms_for_users(
+            user_ids: Collection[str],
+        ) -> Dict[str, FrozenSet[str]]:
+            return {user_id: frozenset({test_room_id}) for user_id in user_ids}
+
+        hs.get_datastores().main.get_rooms_for_users = get_rooms_for_users  # type: ignore[assignment]
+
         async def get_current_hosts_in_room(room_id: str) -> Set[str]:
             if room_id == test_room_id:
                 return {"host2"}
@@ -32,6 +32,7 @@ from synapse.handlers.presence import (
     IDLE_TIMER,
     LAST_ACTIVE_GRANULARITY,
     SYNC_ONLINE_TIMEOUT,
+    PresenceHandler,
     handle_timeout,
     handle_update,
 )
@@ -345,6 +346,36 @@ class PresenceUpdateTestCase(unittest.HomeserverTestCase):
         # They should be identical.
         self.assertEqual(presence_states_compare, db_presence_states)
 
+    def test_syncing_user_does_not_time_out(self) -> None:
+        """Test that a user with an ongoing sync is not timed out, and is
+        forgotten about once their syncs finish.
+        """
+        presence_handler = self.hs.get_presence_handler()
+        assert isinstance(presence_handler, PresenceHandler)
+        user_id = "@test:test"
+
+        sync_context = self.get_success(
+            presence_handler.user_syncing(user_id, True, PresenceState.ONLINE)
+        )
+        with sync_context:
+            self.reactor.pump([5] * int(SYNC_ONLINE_TIMEOUT * 2 / 5000))
+
+            state = self.get_success(
+                presence_handler.get_state(UserID.from_string(user_id))
+            )
+            self.assertEqual(state.state, PresenceState.ONLINE)
+
+        self.reactor.advance(0)
+        self.assertNotIn(user_id, presence_handler.user_to_num_current_syncs)
+
+        # Now the sync has finished the user should time out.
+        self.reactor.pump([5] * int(SYNC_ONLINE_TIMEOUT * 2 / 5000))
+
+        state = self.get_success(
+            presence_handler.get_state(UserID.from_string(user_id))
+        )
+        self.assertEqual(state.state, PresenceState.OFFLINE)
+
 
 class PresenceTimeoutTestCase(unittest.TestCase):
     """Tests different timers and that the timer does not change `status_msg` of user."""
@@ -13,12 +13,17 @@
 # limitations under the License.
 
 from copy import deepcopy
-from typing import List
+from typing import Any, List, Optional
+from unittest.mock import Mock, patch
 
+from twisted.internet import defer
 from twisted.test.proto_helpers import MemoryReactor
 
 from synapse.api.constants import EduTypes, ReceiptTypes
+from synapse.rest import admin
+from synapse.rest.client import login, room
 from synapse.server import HomeServer
+from synapse.storage.database import LoggingTransaction
 from synapse.types import JsonDict
 from synapse.util import Clock
 
@@ -334,3 +339,125 @@ class ReceiptsTestCase(unittest.HomeserverTestCase):
             events, "@me:server.org"
         )
         self.assertEqual(filtered_events, expected_output)
+
+
+class ClientReceiptsTestCase(unittest.HomeserverTestCase):
+    servlets = [
+        admin.register_servlets,
+        login.register_servlets,
+        room.register_servlets,
+    ]
+
+    def prepare(self, reactor: MemoryReactor, clock: Clock, hs: HomeServer) -> None:
+        self.receipts_handler = hs.get_receipts_handler()
+        self.store = hs.get_datastores().main
+
+        self.user_id = self.register_user("user", "pass")
+        self.tok = self.login("user", "pass")
+        self.room_id = self.helper.create_room_as(self.user_id, tok=self.tok)
+
+    def test_concurrent_receipts_are_batched(self) -> None:
+        """Receipts from clients that arrive together should be persisted, but
+        only cause a single notifier wake up.
+        """
+        event_id_1 = self.helper.send(self.room_id, "one", tok=self.tok)["event_id"]
+        event_id_2 = self.helper.send(self.room_id, "two", tok=self.tok)["event_id"]
+
+        self.receipts_handler.notifier = Mock()
+
+        d1 = defer.ensureDeferred(
+            self.receipts_handler.received_client_receipt(
+                self.room_id, ReceiptTypes.READ, self.user_id, event_id_1, None
+            )
+        )
+        d2 = defer.ensureDeferred(
+            self.receipts_handler.received_client_receipt(
+                self.room_id, ReceiptTypes.READ, self.user_id, event_id_2, None
+            )
+        )
+        self.get_success(d1)
+        self.get_success(d2)
+
+        self.receipts_handler.notifier.on_new_event.assert_called_once()
+
+        receipts = self.get_success(
+            self.store.get_receipts_for_user(self.user_id, [ReceiptTypes.READ])
+        )
+        self.assertEqual(receipts, {self.room_id: event_id_2})
+
+    def test_coalesced_receipts_keep_latest_event(self) -> None:
+        """Receipts for the same room and user that arrive together are stored
+        once, for the latest event, regardless of the order they arrived in.
+        """
+        event_id_1 = self.helper.send(self.room_id, "one", tok=self.tok)["event_id"]
+        event_id_2 = self.helper.send(self.room_id, "two", tok=self.tok)["event_id"]
+
+        with patch.object(
+            self.store,
+            "_insert_linearized_receipt_txn",
+            wraps=self.store._insert_linearized_receipt_txn,
+        ) as insert_linearized_receipt_txn:
+            d1 = defer.ensureDeferred(
+                self.receipts_handler.received_client_receipt(
+                    self.room_id, ReceiptTypes.READ, self.user_id, event_id_2, None
+                )
+            )
+            d2 = defer.ensureDeferred(
+                self.receipts_handler.received_client_receipt(
+                    self.room_id, ReceiptTypes.READ, self.user_id, event_id_1, None
+                )
+            )
+            self.get_success(d1)
+            self.get_success(d2)
+
+        insert_linearized_receipt_txn.assert_called_once()
+
+        receipts = self.get_success(
+            self.store.get_receipts_for_user(self.user_id, [ReceiptTypes.READ])
+        )
+        self.assertEqual(receipts, {self.room_id: event_id_2})
+
+    def test_failed_receipt_only_fails_its_request(self) -> None:
+        """If a receipt in a batch can't be stored, only the request which sent
+        it fails.
+        """
+        room_id_2 = self.helper.create_room_as(self.user_id, tok=self.tok)
+        event_id_1 = self.helper.send(self.room_id, "one", tok=self.tok)["event_id"]
+        event_id_2 = self.helper.send(room_id_2, "two", tok=self.tok)["event_id"]
+
+        insert_linearized_receipt_txn = self.store._insert_linearized_receipt_txn
+
+        def insert_linearized_receipt_txn_failing_for_event_1(
+            txn: LoggingTransaction,
+            room_id: str,
+            receipt_type: str,
+            user_id: str,
+            event_id: str,
+            *args: Any,
+            **kwargs: Any,
+        ) -> Optional[int]:
+            if event_id == event_id_1:
+                raise Exception("Failed to store receipt")
+            return insert_linearized_receipt_txn(
+                txn, room_id, receipt_type, user_id, event_id, *args, **kwargs
+            )
+
+        self.store._insert_linearized_receipt_txn = insert_linearized_receipt_txn_failing_for_event_1  # type: ignore[assignment]
+
+        d1 = defer.ensureDeferred(
+            self.receipts_handler.received_client_receipt(
+                self.room_id, ReceiptTypes.READ, self.user_id, event_id_1, None
+            )
+        )
+        d2 = defer.ensureDeferred(
+            self.receipts_handler.received_client_receipt(
+                room_id_2, ReceiptTypes.READ, self.user_id, event_id_2, None
+            )
+        )
+        self.get_failure(d1, Exception)
+        self.get_success(d2)
+
+        receipts = self.get_success(
+            self.store.get_receipts_for_user(self.user_id, [ReceiptTypes.READ])
+        )
+        self.assertEqual(receipts, {room_id_2: event_id_2})
@@ -15,6 +15,7 @@ from typing import Any, Tuple
 from unittest.mock import Mock, patch
 from urllib.parse import quote
 
+from twisted.internet import defer
 from twisted.test.proto_helpers import MemoryReactor
 
 import synapse.rest.admin
@@ -22,10 +23,11 @@ from synapse.api.constants import UserTypes
 from synapse.api.errors import SynapseError
 from synapse.api.room_versions import RoomVersion, RoomVersions
 from synapse.appservice import ApplicationService
+from synapse.handlers.user_directory import SEARCH_RESULTS_CACHE_TIMEOUT_MS
 from synapse.rest.client import login, register, room, user_directory
 from synapse.server import HomeServer
 from synapse.storage.roommember import ProfileInfo
-from synapse.types import JsonDict, UserProfile, create_requester
+from synapse.types import JsonDict, UserID, UserProfile, create_requester
 from synapse.util import Clock
 
 from tests import unittest
@@ -200,6 +202,68 @@ class UserDirectoryTestCase(unittest.HomeserverTestCase):
         u1 = self.register_user("user1", "pass")
         self.get_success(self.handler.search_users(u1, "haha:paamayim-nekudotayim", 10))
 
+    def test_concurrent_identical_searches_are_coalesced(self) -> None:
+        """Identical searches made at the same time only query the database once."""
+        u1 = self.register_user("user1", "pass")
+
+        search_result: "defer.Deferred[JsonDict]" = defer.Deferred()
+        mock_search_user_dir = Mock(return_value=search_result)
+        with patch.object(self.store, "search_user_dir", mock_search_user_dir):
+            d1 = defer.ensureDeferred(self.handler.search_users(u1, "bob", 10))
+            d2 = defer.ensureDeferred(self.handler.search_users(u1, "bob", 10))
+            self.pump()
+            mock_search_user_dir.assert_called_once_with(u1, "bob", 10)
+
+            search_result.callback({"limited": False, "results": []})
+
+        self.assertEqual(self.get_success(d1), {"limited": False, "results": []})
+        self.assertEqual(self.get_success(d2), {"limited": False, "results": []})
+
+        # The results are kept for a short while, so repeating the search
+        # doesn't query the database again.
+        self.assertEqual(
+            self.get_success(self.handler.search_users(u1, "bob", 10)),
+            {"limited": False, "results": []},
+        )
+        self.assertEqual(mock_search_user_dir.call_count, 1)
+
+        # Once they time out, the same search queries the database again.
+        self.reactor.advance(SEARCH_RESULTS_CACHE_TIMEOUT_MS / 1000)
+        mock_search_user_dir.return_value = make_awaitable(
+            {"limited": False, "results": []}
+        )
+        with patch.object(self.store, "search_user_dir", mock_search_user_dir):
+            self.get_success(self.handler.search_users(u1, "bob", 10))
+        self.assertEqual(mock_search_user_dir.call_count, 2)
+
+    def test_search_results_invalidated_by_directory_changes(self) -> None:
+        """Cached search results are dropped when the directory changes."""
+        alice = self.register_user("alice", "pass")
+        alice_token = self.login(alice, "pass")
+        bob = self.register_user("bob", "pass")
+        bob_token = self.login(bob, "pass")
+        room = self.helper.create_room_as(bob, is_public=True, tok=bob_token)
+        self.helper.join(room, alice, tok=alice_token)
+
+        s = self.get_success(self.handler.search_users(alice, "bob", 10))
+        self.assertEqual(s["results"][0]["display_name"], "bob")
+
+        # Repeated searches don't query the database.
+        with patch.object(
+            self.store, "search_user_dir", wraps=self.store.search_user_dir
+        ) as mock_search_user_dir:
+            self.get_success(self.handler.search_users(alice, "bob", 10))
+            mock_search_user_dir.assert_not_called()
+
+        # Bob changes their display name, which invalidates the cached results.
+        self.get_success(
+            self.hs.get_profile_handler().set_displayname(
+                UserID.from_string(bob), create_requester(bob), "Bobby"
+            )
+        )
+        s = self.get_success(self.handler.search_users(alice, "bob", 10))
+        self.assertEqual(s["results"][0]["display_name"], "Bobby")
+
     def test_user_not_in_users_table(self) -> None:
         """Unclear how it happens, but on matrix.org we've seen join events
         for users who aren't in the users table. Test that we don't fall over
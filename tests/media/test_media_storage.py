@@ -17,7 +17,7 @@ import tempfile
 from binascii import unhexlify
 from io import BytesIO
 from typing import Any, BinaryIO, ClassVar, Dict, List, Optional, Tuple, Union
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 from urllib import parse
 
 import attr
@@ -42,7 +42,7 @@ from synapse.module_api import ModuleApi
 from synapse.rest import admin
 from synapse.rest.client import login
 from synapse.server import HomeServer
-from synapse.types import JsonDict, RoomAlias
+from synapse.types import JsonDict, RoomAlias, UserID
 from synapse.util import Clock
 
 from tests import unittest
@@ -113,6 +113,161 @@ class MediaStorageTests(unittest.HomeserverTestCase):
         self.assertEqual(test_body, body)
 
 
+class MediaDeduplicationTests(unittest.HomeserverTestCase):
+    needs_threadpool = True
+
+    def default_config(self) -> JsonDict:
+        config = super().default_config()
+        config["media_store_path"] = self.mktemp()
+        config["deduplicate_media"] = True
+        return config
+
+    def prepare(self, reactor: MemoryReactor, clock: Clock, hs: HomeServer) -> None:
+        self.media_repo = hs.get_media_repository()
+        self.store = hs.get_datastores().main
+        self.filepaths = self.media_repo.filepaths
+
+    def _upload(self, content: bytes) -> str:
+        d = defer.ensureDeferred(
+            self.media_repo.create_content(
+                "image/png",
+                "test.png",
+                BytesIO(content),
+                len(content),
+                UserID.from_string("@user:test"),
+            )
+        )
+        self.wait_on_thread(d)
+        return self.get_success(d).media_id
+
+    def test_identical_uploads_are_linked(self) -> None:
+        media_id1 = self._upload(SMALL_PNG)
+        media_id2 = self._upload(SMALL_PNG)
+
+        self.assertTrue(
+            os.path.samefile(
+                self.filepaths.local_media_filepath(media_id1),
+                self.filepaths.local_media_filepath(media_id2),
+            )
+        )
+
+        # The thumbnails of the first upload are reused for the second.
+        thumbnails1 = self.get_success(self.store.get_local_media_thumbnails(media_id1))
+        thumbnails2 = self.get_success(self.store.get_local_media_thumbnails(media_id2))
+        self.assertGreater(len(thumbnails1), 0)
+        self.assertCountEqual(thumbnails1, thumbnails2)
+        for thumbnail in thumbnails2:
+            path = self.filepaths.local_media_thumbnail(
+                media_id2,
+                thumbnail["thumbnail_width"],
+                thumbnail["thumbnail_height"],
+                thumbnail["thumbnail_type"],
+                thumbnail["thumbnail_method"],
+            )
+            self.assertTrue(os.path.exists(path))
+
+        # Different content is stored separately.
+        media_id3 = self._upload(SMALL_PNG + b"\x00")
+        self.assertFalse(
+            os.path.samefile(
+                self.filepaths.local_media_filepath(media_id1),
+                self.filepaths.local_media_filepath(media_id3),
+            )
+        )
+
+    def test_thumbnail_link_failure(self) -> None:
+        """If some of the thumbnails can't be linked, the thumbnails which were
+        linked are removed before new ones are generated, rather than written
+        over.
+        """
+        media_id1 = self._upload(SMALL_PNG)
+        thumbnails = self.get_success(self.store.get_local_media_thumbnails(media_id1))
+        self.assertGreater(len(thumbnails), 1)
+
+        # Let the media itself and the first thumbnail be linked, but not the
+        # rest of the thumbnails.
+        store_file_as_link = self.media_repo.media_storage.store_file_as_link
+        calls = []
+
+        async def fail_after_first_thumbnail(
+            existing_file_info: FileInfo, file_info: FileInfo
+        ) -> Optional[str]:
+            calls.append(file_info)
+            if len(calls) > 2:
+                return None
+            return await store_file_as_link(existing_file_info, file_info)
+
+        with patch.object(
+            self.media_repo.media_storage,
+            "store_file_as_link",
+            side_effect=fail_after_first_thumbnail,
+        ):
+            media_id2 = self._upload(SMALL_PNG)
+
+        self.assertEqual(len(calls), 3)
+        self.assertCountEqual(
+            self.get_success(self.store.get_local_media_thumbnails(media_id2)),
+            thumbnails,
+        )
+        for thumbnail in thumbnails:
+            args = (
+                thumbnail["thumbnail_width"],
+                thumbnail["thumbnail_height"],
+                thumbnail["thumbnail_type"],
+                thumbnail["thumbnail_method"],
+            )
+            self.assertFalse(
+                os.path.samefile(
+                    self.filepaths.local_media_thumbnail(media_id1, *args),
+                    self.filepaths.local_media_thumbnail(media_id2, *args),
+                )
+            )
+
+    def test_deduplicate_existing_media(self) -> None:
+        media_id1 = self._upload(SMALL_PNG)
+        media_id2 = self._upload(SMALL_PNG)
+
+        # Make it look like the second upload was stored before deduplication
+        # was enabled.
+        path2 = self.filepaths.local_media_filepath(media_id2)
+        os.remove(path2)
+        with open(path2, "wb") as f:
+            f.write(SMALL_PNG)
+        self.get_success(
+            self.store.db_pool.simple_update_one(
+                table="local_media_repository",
+                keyvalues={"media_id": media_id2},
+                updatevalues={"sha256": None},
+            )
+        )
+
+        # The job carries on from the position stored in the database, so media
+        # before it is left alone until the job starts again from the beginning.
+        self.get_success(
+            self.store.set_local_media_deduplication_position(max(media_id1, media_id2))
+        )
+        d = defer.ensureDeferred(self.media_repo._deduplicate_local_media())
+        self.wait_on_thread(d)
+        self.get_success(d)
+
+        self.assertFalse(
+            os.path.samefile(self.filepaths.local_media_filepath(media_id1), path2)
+        )
+        self.assertEqual(
+            self.get_success(self.store.get_local_media_deduplication_position()), ""
+        )
+
+        d = defer.ensureDeferred(self.media_repo._deduplicate_local_media())
+        self.wait_on_thread(d)
+        self.get_success(d)
+
+        self.assertTrue(
+            os.path.samefile(self.filepaths.local_media_filepath(media_id1), path2)
+        )
+        media_ids = self.get_success(self.store.get_local_media_without_sha256("", 10))
+        self.assertEqual(media_ids, [])
+
+
 @attr.s(auto_attribs=True, slots=True, frozen=True)
 class _TestImage:
     """An image for testing thumbnailing with the expected results
@@ -375,6 +530,65 @@ class MediaRepoTests(unittest.HomeserverTestCase):
         )
         self.assertEqual(headers.getRawHeaders(b"Content-Disposition"), None)
 
+    def _req_range(self, range_header: str) -> FakeChannel:
+        channel = make_request(
+            self.reactor,
+            FakeSite(self.download_resource, self.reactor),
+            "GET",
+            self.media_id,
+            shorthand=False,
+            await_result=False,
+            custom_headers=[("Range", range_header)],
+        )
+        # Each range is written by its own producer, which takes a little time.
+        self.pump(1)
+        return channel
+
+    def test_range_requests(self) -> None:
+        """Test that parts of the media can be requested once it is cached."""
+        self._req(b"inline; filename=out" + self.test_image.extension)
+        data = self.test_image.data
+
+        # Ranges past the end of the media can't be satisfied.
+        channel = self._req_range("bytes=%d-" % (len(data),))
+        self.assertEqual(channel.code, 416)
+        self.assertEqual(
+            channel.headers.getRawHeaders(b"Content-Range"),
+            [b"bytes */%d" % (len(data),)],
+        )
+
+        if not data:
+            return
+
+        channel = self._req_range("bytes=2-5")
+        self.assertEqual(channel.code, 206)
+        self.assertEqual(channel.result["body"], data[2:6])
+        self.assertEqual(
+            channel.headers.getRawHeaders(b"Content-Range"),
+            [b"bytes 2-5/%d" % (len(data),)],
+        )
+        self.assertEqual(channel.headers.getRawHeaders(b"Content-Length"), [b"4"])
+
+        # Multiple ranges are returned as separate parts of a multipart response.
+        channel = self._req_range("bytes=0-1, -3")
+        self.assertEqual(channel.code, 206)
+        content_type = channel.headers.getRawHeaders(b"Content-Type")[0]
+        self.assertTrue(content_type.startswith(b"multipart/byteranges; boundary="))
+        boundary = content_type.split(b"boundary=")[1]
+        parts = channel.result["body"].split(b"--" + boundary)
+        self.assertEqual(len(parts), 4)
+        self.assertTrue(parts[1].endswith(b"\r\n\r\n" + data[:2] + b"\r\n"))
+        self.assertTrue(parts[2].endswith(b"\r\n\r\n" + data[-3:] + b"\r\n"))
+        self.assertEqual(
+            channel.headers.getRawHeaders(b"Content-Length"),
+            [b"%d" % (len(channel.result["body"]),)],
+        )
+
+        # Invalid ranges are ignored.
+        channel = self._req_range("bytes=5-2")
+        self.assertEqual(channel.code, 200)
+        self.assertEqual(channel.result["body"], data)
+
     def test_thumbnail_crop(self) -> None:
         """Test that a cropped remote thumbnail is available."""
         self._test_thumbnail(
@@ -0,0 +1,60 @@
+# Copyright 2023 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import shutil
+import tempfile
+from typing import Tuple
+
+from PIL import Image
+
+from synapse.media.thumbnailer import Thumbnailer
+
+from tests import unittest
+
+
+class ThumbnailerTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.test_dir = tempfile.mkdtemp(prefix="synapse-tests-")
+        self.addCleanup(shutil.rmtree, self.test_dir)
+
+    def _make_image(self, fmt: str, size: Tuple[int, int]) -> str:
+        path = os.path.join(self.test_dir, "image." + fmt.lower())
+        Image.new("RGB", size, (255, 0, 0)).save(path, fmt)
+        return path
+
+    def test_draft_jpeg(self) -> None:
+        """Drafting a JPEG decodes it at a reduced size that still fits the
+        thumbnail, without changing the reported dimensions.
+        """
+        with Thumbnailer(self._make_image("JPEG", (1600, 1200))) as thumbnailer:
+            thumbnailer.draft(320, 240)
+
+            self.assertEqual(thumbnailer.image.size, (400, 300))
+            self.assertEqual((thumbnailer.width, thumbnailer.height), (1600, 1200))
+            self.assertEqual(thumbnailer.aspect(320, 240), (320, 240))
+
+            output = thumbnailer.crop(96, 96, "image/jpeg")
+            with Image.open(output) as thumbnail:
+                self.assertEqual(thumbnail.size, (96, 96))
+
+    def test_draft_png(self) -> None:
+        """Drafting is a no-op for formats which don't support it."""
+        with Thumbnailer(self._make_image("PNG", (800, 600))) as thumbnailer:
+            thumbnailer.draft(32, 32)
+
+            self.assertEqual(thumbnailer.image.size, (800, 600))
+
+            output = thumbnailer.scale(32, 24, "image/png")
+            with Image.open(output) as thumbnail:
+                self.assertEqual(thumbnail.size, (32, 24))
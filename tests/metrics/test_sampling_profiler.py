@@ -0,0 +1,163 @@
+# Copyright 2023 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import sys
+import threading
+import time
+from typing import Optional
+
+from synapse.logging.context import (
+    SENTINEL_CONTEXT,
+    ContextRequest,
+    LoggingContext,
+    get_tracked_thread_context,
+    nested_logging_context,
+    track_current_context_of_thread,
+)
+from synapse.metrics.background_process_metrics import BackgroundProcessLoggingContext
+from synapse.metrics.sampling_profiler import SamplingProfiler, get_sample_tag
+
+from tests import unittest
+
+
+def _burn_cpu(seconds: float) -> None:
+    end = time.thread_time() + seconds
+    while time.thread_time() < end:
+        pass
+
+
+def _make_request(method: str, servlet_name: Optional[str]) -> ContextRequest:
+    return ContextRequest(
+        request_id="%s-1" % (method,),
+        ip_address="127.0.0.1",
+        site_tag="test",
+        requester=None,
+        authenticated_entity=None,
+        method=method,
+        url="/_matrix/client/v3/sync",
+        protocol="1.1",
+        user_agent="",
+        servlet_name=servlet_name,
+    )
+
+
+class SampleTagTestCase(unittest.TestCase):
+    def test_sentinel(self) -> None:
+        self.assertEqual(get_sample_tag(SENTINEL_CONTEXT), "reactor")
+
+    def test_request(self) -> None:
+        request = _make_request("GET", "SyncRestServlet")
+        with LoggingContext("GET-1", request=request):
+            # Nested contexts should be attributed to the request too.
+            with nested_logging_context("nested") as context:
+                self.assertEqual(get_sample_tag(context), "servlet:GET SyncRestServlet")
+
+    def test_background_process(self) -> None:
+        with BackgroundProcessLoggingContext("do_stuff", 5):
+            with nested_logging_context("nested") as context:
+                self.assertEqual(get_sample_tag(context), "background_process:do_stuff")
+
+    def test_other_context(self) -> None:
+        self.assertEqual(get_sample_tag(LoggingContext("main")), "other")
+
+    def test_unknown_request(self) -> None:
+        """Requests which weren't routed to a servlet, or have an unknown method,
+        aren't tagged with values chosen by the client.
+        """
+        for method, servlet_name in (("GET", None), ("BREW", "SyncRestServlet")):
+            context = LoggingContext(
+                "request", request=_make_request(method, servlet_name)
+            )
+            self.assertEqual(get_sample_tag(context), "other")
+
+
+class TrackedContextTestCase(unittest.TestCase):
+    def test_tracked_context(self) -> None:
+        """The current logcontext of the tracked thread can be read from other
+        threads.
+        """
+        track_current_context_of_thread(threading.get_ident())
+        self.addCleanup(track_current_context_of_thread, None)
+
+        seen = []
+
+        def read_context() -> None:
+            seen.append(get_tracked_thread_context())
+
+        with LoggingContext("tracked") as context:
+            self.assertIs(get_tracked_thread_context(), context)
+
+            # Changing context on another thread doesn't change it.
+            def change_context() -> None:
+                with LoggingContext("other thread"):
+                    read_context()
+
+            thread = threading.Thread(target=change_context)
+            thread.start()
+            thread.join()
+            self.assertEqual(seen, [context])
+
+        self.assertIs(get_tracked_thread_context(), SENTINEL_CONTEXT)
+
+
+class SamplingProfilerTestCase(unittest.HomeserverTestCase):
+    @unittest.override_config({"sampling_profiler": {"enabled": True, "max_stacks": 2}})
+    def test_stacks_are_bounded(self) -> None:
+        profiler = self.hs.get_sampling_profiler()
+
+        def inner() -> None:
+            profiler.record_sample(sys._getframe())
+
+        def outer() -> None:
+            profiler.record_sample(sys._getframe())
+            inner()
+
+        with BackgroundProcessLoggingContext("test"):
+            outer()
+            outer()
+            profiler.record_sample(sys._getframe())
+
+        # All the samples should be counted, but only the first two distinct
+        # stacks stored.
+        tag = "background_process:test"
+        self.assertEqual(profiler.get_samples_by_tag(), {tag: 5})
+        stacks = profiler.get_stacks_by_tag()[tag]
+        self.assertEqual(len(stacks), 2)
+        self.assertEqual(sorted(stacks.values()), [2, 2])
+        self.assertEqual(profiler.dropped_samples, 1)
+
+        # The outermost frame should come first, so the function which took the
+        # sample should come last.
+        for stack in stacks:
+            self.assertTrue(stack.split(";")[-1].startswith(("outer", "inner")))
+
+        profiler.reset()
+        self.assertEqual(profiler.get_stacks_by_tag(), {})
+        self.assertEqual(profiler.get_samples_by_tag(), {tag: 5})
+
+    @unittest.override_config(
+        {"sampling_profiler": {"enabled": True, "sample_interval": 1}}
+    )
+    def test_samples_taken(self) -> None:
+        """Test that samples are taken while the reactor thread is busy."""
+        profiler: SamplingProfiler = self.hs.get_sampling_profiler()
+        profiler.start()
+        self.addCleanup(profiler.stop)
+
+        with BackgroundProcessLoggingContext("busy"):
+            _burn_cpu(0.1)
+
+        tag = "background_process:busy"
+        self.assertGreater(profiler.get_samples_by_tag().get(tag, 0), 0)
+        stacks = profiler.get_stacks_by_tag()[tag]
+        self.assertTrue(any("_burn_cpu" in stack for stack in stacks))
@@ -12,6 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from unittest.mock import patch
+
 from synapse.replication.tcp.streams._base import (
     _STREAM_UPDATE_TARGET_ROW_COUNT,
     AccountDataStream,
@@ -112,3 +114,33 @@ class AccountDataStreamTestCase(BaseStreamTestCase):
         self.assertEqual(row.room_id, "test_room")
 
         self.assertEqual([], received_rows)
+
+    def test_catch_up_over_several_pages(self) -> None:
+        """Test that catching up after a reconnect fetches every page of updates
+        in order, even though the next page is fetched while the previous one
+        is being processed.
+        """
+        store = self.hs.get_datastores().main
+
+        updates = []
+        for i in range(25):
+            update = "m.test_type.%i" % (i,)
+            self.get_success(store.add_account_data_for_user("test_user", update, {}))
+            updates.append(update)
+
+        # tell the notifier to catch up to avoid duplicate rows.
+        # workaround for https://github.com/matrix-org/synapse/issues/7360
+        # FIXME remove this when the above is fixed
+        self.replicate()
+
+        self.assertEqual([], self.test_handler.received_rdata_rows)
+
+        # now reconnect to pull the updates, in pages of 10 rows.
+        with patch(
+            "synapse.replication.tcp.handler._STREAM_CATCH_UP_TARGET_ROW_COUNT", 10
+        ):
+            self.reconnect()
+            self.replicate()
+
+        received_rows = self.test_handler.received_rdata_rows
+        self.assertEqual([row.data_type for _, _, row in received_rows], updates)
@@ -19,6 +19,7 @@ from unittest.mock import Mock
 from synapse.replication.tcp.streams._base import ReceiptsStream
 
 from tests.replication._base import BaseStreamTestCase
+from tests.unittest import override_config
 
 USER_ID = "@feeling:blue"
 
@@ -92,3 +93,31 @@ class ReceiptsStreamTestCase(BaseStreamTestCase):
         self.assertEqual(USER_ID, row.user_id)
         self.assertEqual("$event2:foo", row.event_id)
         self.assertEqual({"a": 2}, row.data)
+
+    @override_config({"experimental_features": {"replication_batch_rdata": True}})
+    def test_receipts_batched(self):
+        self.reconnect()
+
+        # insert two receipts, which get replicated in one go
+        store = self.hs.get_datastores().main
+        for i in range(2):
+            self.get_success(
+                store.insert_receipt(
+                    "!room%d:blue" % (i,),
+                    "m.read",
+                    USER_ID,
+                    ["$event%d:blue" % (i,)],
+                    thread_id=None,
+                    data={"a": i},
+                )
+            )
+        self.replicate()
+
+        # each receipt has its own token, so should be handled separately
+        self.assertEqual(self.test_handler.on_rdata.call_count, 2)
+        for i, call in enumerate(self.test_handler.on_rdata.call_args_list):
+            stream_name, _, token, rdata_rows = call[0]
+            self.assertEqual(stream_name, "receipts")
+            self.assertEqual(1, len(rdata_rows))
+            self.assertEqual("!room%d:blue" % (i,), rdata_rows[0].room_id)
+            self.assertEqual({"a": i}, rdata_rows[0].data)
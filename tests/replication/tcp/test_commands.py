@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 from synapse.replication.tcp.commands import (
+    RdataBatchCommand,
     RdataCommand,
     ReplicateCommand,
     parse_command_from_line,
@@ -41,3 +42,23 @@ class ParseCommandTestCase(TestCase):
         self.assertEqual(cmd.stream_name, "presence")
         self.assertEqual(cmd.instance_name, "master")
         self.assertIsNone(cmd.token)
+
+    def test_parse_rdata_batch_command(self) -> None:
+        line = 'RDATA_BATCH presence master [[58, ["@foo:example.com", "online"]], [59, ["@bar:example.com", "offline"]]]'
+        cmd = parse_command_from_line(line)
+        assert isinstance(cmd, RdataBatchCommand)
+        self.assertEqual(cmd.stream_name, "presence")
+        self.assertEqual(cmd.instance_name, "master")
+        self.assertEqual(
+            cmd.updates,
+            [
+                (58, ["@foo:example.com", "online"]),
+                (59, ["@bar:example.com", "offline"]),
+            ],
+        )
+
+        # Check it round trips.
+        self.assertEqual(
+            parse_command_from_line(cmd.NAME + " " + cmd.to_line()).updates,
+            cmd.updates,
+        )
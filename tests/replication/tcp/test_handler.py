@@ -12,19 +12,45 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from typing import Any, List
+from unittest.mock import patch
+
 from twisted.internet import defer
 
-from synapse.replication.tcp.commands import PositionCommand
+from synapse.replication.tcp.commands import PositionCommand, stream_channel_name
+from synapse.replication.tcp.streams import (
+    STREAMS_MAP,
+    CachesStream,
+    FederationStream,
+    PresenceFederationStream,
+    TypingStream,
+)
+from synapse.types import JsonDict
 
 from tests.replication._base import BaseMultiWorkerStreamTestCase
+from tests.unittest import override_config
+
+
+def _listener_for_resources(*resource_names: str) -> JsonDict:
+    return {
+        "type": "http",
+        "port": 8080,
+        "resources": [{"names": list(resource_names)}],
+    }
 
 
 class ChannelsTestCase(BaseMultiWorkerStreamTestCase):
     def test_subscribed_to_enough_redis_channels(self) -> None:
-        # The default main process is subscribed to the USER_IP channel.
+        # The default main process is subscribed to the USER_IP channel, and the
+        # channels for every stream except those only used to send federation.
         self.assertCountEqual(
             self.hs.get_replication_command_handler()._channels_to_subscribe_to,
-            ["USER_IP"],
+            ["USER_IP"]
+            + [
+                stream_channel_name(name)
+                for name in STREAMS_MAP
+                if name not in (FederationStream.NAME, PresenceFederationStream.NAME)
+            ],
         )
 
     def test_background_worker_subscribed_to_user_ip(self) -> None:
@@ -76,6 +102,93 @@ class ChannelsTestCase(BaseMultiWorkerStreamTestCase):
             len(self._redis_server._subscribers_by_channel[b"test/USER_IP"]), 1
         )
 
+    def test_only_federation_senders_subscribed_to_federation_streams(
+        self,
+    ) -> None:
+        federation_sender = self.make_worker_hs(
+            "synapse.app.generic_worker",
+            extra_config={
+                "worker_name": "federation_sender1",
+                "federation_sender_instances": ["federation_sender1"],
+                "redis": {"enabled": True},
+            },
+        )
+        channels = (
+            federation_sender.get_replication_command_handler()._channels_to_subscribe_to
+        )
+        self.assertIn(stream_channel_name(FederationStream.NAME), channels)
+        self.assertIn(stream_channel_name(PresenceFederationStream.NAME), channels)
+
+        worker = self.make_worker_hs(
+            "synapse.app.generic_worker",
+            extra_config={
+                "worker_name": "worker1",
+                "worker_listeners": [_listener_for_resources("client")],
+                "redis": {"enabled": True},
+            },
+        )
+        channels = worker.get_replication_command_handler()._channels_to_subscribe_to
+        self.assertIn(stream_channel_name(TypingStream.NAME), channels)
+        self.assertNotIn(stream_channel_name(FederationStream.NAME), channels)
+        self.assertNotIn(stream_channel_name(PresenceFederationStream.NAME), channels)
+
+        # Advance so the Redis subscriptions get processed
+        self.pump(0.1)
+
+        # The main process and both workers get typing, but only the federation
+        # sender gets the federation stream.
+        self.assertEqual(
+            len(self._redis_server._subscribers_by_channel[b"test/STREAM/typing"]), 3
+        )
+        self.assertEqual(
+            len(self._redis_server._subscribers_by_channel[b"test/STREAM/federation"]),
+            1,
+        )
+
+    def test_media_worker_only_subscribed_to_caches_stream(self) -> None:
+        worker = self.make_worker_hs(
+            "synapse.app.generic_worker",
+            extra_config={
+                "worker_name": "media1",
+                "worker_listeners": [_listener_for_resources("media", "metrics")],
+                "redis": {"enabled": True},
+            },
+        )
+        channels = worker.get_replication_command_handler()._channels_to_subscribe_to
+        self.assertEqual(
+            [channel for channel in channels if channel.startswith("STREAM/")],
+            [stream_channel_name(CachesStream.NAME)],
+        )
+
+    def test_stream_updates_published_on_main_channel_by_default(self) -> None:
+        self.assertEqual(self._publish_typing_position(), [b"test"])
+
+    @override_config({"experimental_features": {"replication_stream_channels": True}})
+    def test_stream_updates_published_on_stream_channels(self) -> None:
+        self.assertEqual(self._publish_typing_position(), [b"test/STREAM/typing"])
+
+    def _publish_typing_position(self) -> List[bytes]:
+        """Send a POSITION for the typing stream from the main process, and
+        return the Redis channels it was published on.
+        """
+        # Advance so the main process connects to Redis.
+        self.pump(0.1)
+
+        published_channels = []
+        publish = self._redis_server.publish
+
+        def record_publish(conn: Any, channel: bytes, msg: object) -> int:
+            published_channels.append(channel)
+            return publish(conn, channel, msg)
+
+        with patch.object(self._redis_server, "publish", record_publish):
+            self.hs.get_replication_command_handler().send_command(
+                PositionCommand(TypingStream.NAME, "master", 1, 2)
+            )
+            self.pump(0.1)
+
+        return published_channels
+
     def test_wait_for_stream_position(self) -> None:
         """Check that wait for stream position correctly waits for an update from the
         correct instance.
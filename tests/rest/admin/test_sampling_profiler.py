@@ -0,0 +1,90 @@
+# Copyright 2023 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import sys
+
+from twisted.test.proto_helpers import MemoryReactor
+
+import synapse.rest.admin
+from synapse.metrics.background_process_metrics import BackgroundProcessLoggingContext
+from synapse.rest.client import login
+from synapse.server import HomeServer
+from synapse.util import Clock
+
+from tests import unittest
+
+
+class SamplingProfilerTestCase(unittest.HomeserverTestCase):
+    servlets = [
+        synapse.rest.admin.register_servlets,
+        login.register_servlets,
+    ]
+
+    def prepare(self, reactor: MemoryReactor, clock: Clock, hs: HomeServer) -> None:
+        self.admin_user = self.register_user("admin", "pass", admin=True)
+        self.admin_user_tok = self.login("admin", "pass")
+
+        self.url = "/_synapse/admin/v1/sampling_profiler"
+
+    def test_requires_admin(self) -> None:
+        self.register_user("user", "pass")
+        user_tok = self.login("user", "pass")
+
+        channel = self.make_request("GET", self.url, access_token=user_tok)
+        self.assertEqual(403, channel.code, msg=channel.json_body)
+
+    def test_not_enabled(self) -> None:
+        channel = self.make_request("GET", self.url, access_token=self.admin_user_tok)
+        self.assertEqual(400, channel.code, msg=channel.json_body)
+
+    @unittest.override_config({"sampling_profiler": {"enabled": True}})
+    def test_get_and_reset(self) -> None:
+        profiler = self.hs.get_sampling_profiler()
+        with BackgroundProcessLoggingContext("one"):
+            profiler.record_sample(sys._getframe())
+        with BackgroundProcessLoggingContext("two"):
+            profiler.record_sample(sys._getframe())
+            profiler.record_sample(sys._getframe())
+
+        channel = self.make_request("GET", self.url, access_token=self.admin_user_tok)
+        self.assertEqual(200, channel.code, msg=channel.json_body)
+        self.assertEqual(channel.json_body["sample_interval_ms"], 10)
+        self.assertEqual(channel.json_body["dropped_samples"], 0)
+        tags = channel.json_body["tags"]
+        self.assertEqual(
+            set(tags), {"background_process:one", "background_process:two"}
+        )
+        self.assertEqual(tags["background_process:two"]["samples"], 2)
+        self.assertEqual(list(tags["background_process:two"]["stacks"].values()), [2])
+
+        # Filter by tag
+        channel = self.make_request(
+            "GET",
+            self.url + "?tag=background_process:one",
+            access_token=self.admin_user_tok,
+        )
+        self.assertEqual(200, channel.code, msg=channel.json_body)
+        self.assertEqual(set(channel.json_body["tags"]), {"background_process:one"})
+        self.assertEqual(
+            channel.json_body["tags"]["background_process:one"]["samples"], 1
+        )
+
+        # Clearing the stacks
+        channel = self.make_request(
+            "DELETE", self.url, access_token=self.admin_user_tok
+        )
+        self.assertEqual(200, channel.code, msg=channel.json_body)
+
+        channel = self.make_request("GET", self.url, access_token=self.admin_user_tok)
+        self.assertEqual(200, channel.code, msg=channel.json_body)
+        self.assertEqual(channel.json_body["tags"], {})
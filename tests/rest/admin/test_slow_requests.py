@@ -0,0 +1,151 @@
+# Copyright 2023 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from unittest.mock import patch
+
+from twisted.test.proto_helpers import MemoryReactor
+
+import synapse.rest.admin
+from synapse.rest.client import login, profile
+from synapse.server import HomeServer
+from synapse.util import Clock
+
+from tests import unittest
+
+
+class SlowRequestsTestCase(unittest.HomeserverTestCase):
+    servlets = [
+        synapse.rest.admin.register_servlets,
+        login.register_servlets,
+        profile.register_servlets,
+    ]
+
+    def prepare(self, reactor: MemoryReactor, clock: Clock, hs: HomeServer) -> None:
+        self.admin_user = self.register_user("admin", "pass", admin=True)
+        self.admin_user_tok = self.login("admin", "pass")
+
+        self.url = "/_synapse/admin/v1/slow_requests"
+
+        # Forget about any requests made while registering and logging in.
+        hs.get_slow_request_capture().clear()
+
+    def test_not_enabled(self) -> None:
+        channel = self.make_request("GET", self.url, access_token=self.admin_user_tok)
+        self.assertEqual(400, channel.code, msg=channel.json_body)
+
+    @unittest.override_config(
+        {
+            "slow_request_capture": {
+                "enabled": True,
+                "db_time_threshold": 0,
+                "cpu_time_threshold": None,
+            }
+        }
+    )
+    def test_requires_admin(self) -> None:
+        self.register_user("user", "pass")
+        user_tok = self.login("user", "pass")
+
+        channel = self.make_request("GET", self.url, access_token=user_tok)
+        self.assertEqual(403, channel.code, msg=channel.json_body)
+
+    @unittest.override_config(
+        {
+            "slow_request_capture": {
+                "enabled": True,
+                "db_time_threshold": 0,
+                "cpu_time_threshold": None,
+            },
+            "require_auth_for_profile_requests": True,
+        }
+    )
+    def test_capture(self) -> None:
+        with patch("synapse.util.caches.TRACE_REQUEST_CACHE_LOOKUPS", True):
+            channel = self.make_request(
+                "GET",
+                "/_matrix/client/v3/profile/%s" % (self.admin_user,),
+                access_token=self.admin_user_tok,
+            )
+            self.assertEqual(200, channel.code, msg=channel.json_body)
+
+        channel = self.make_request("GET", self.url, access_token=self.admin_user_tok)
+        self.assertEqual(200, channel.code, msg=channel.json_body)
+        self.assertEqual(len(channel.json_body["requests"]), 1)
+
+        captured = channel.json_body["requests"][0]
+        self.assertEqual(captured["method"], "GET")
+        self.assertEqual(captured["servlet"], "ProfileRestServlet")
+        self.assertEqual(captured["code"], "200")
+        self.assertEqual(captured["exceeded_thresholds"], ["db_time"])
+        self.assertEqual(captured["requester"], self.admin_user)
+
+        # Every database transaction should have been recorded.
+        self.assertGreater(captured["db_txn_count"], 0)
+        self.assertEqual(len(captured["db_txns"]), captured["db_txn_count"])
+        self.assertEqual(captured["dropped_db_txns"], 0)
+
+        # Authenticating the request looks up the access token in a cache.
+        self.assertIn("get_user_by_access_token", captured["caches"])
+
+        # The most recent request should come first, and can be filtered by
+        # servlet.
+        channel = self.make_request(
+            "GET",
+            self.url + "?servlet=ProfileRestServlet",
+            access_token=self.admin_user_tok,
+        )
+        self.assertEqual(200, channel.code, msg=channel.json_body)
+        self.assertEqual(len(channel.json_body["requests"]), 1)
+
+        channel = self.make_request(
+            "GET", self.url + "?limit=1", access_token=self.admin_user_tok
+        )
+        self.assertEqual(200, channel.code, msg=channel.json_body)
+        self.assertEqual(len(channel.json_body["requests"]), 1)
+        self.assertEqual(
+            channel.json_body["requests"][0]["servlet"], "SlowRequestsRestServlet"
+        )
+
+        # Clearing the captured requests
+        channel = self.make_request(
+            "DELETE", self.url, access_token=self.admin_user_tok
+        )
+        self.assertEqual(200, channel.code, msg=channel.json_body)
+
+        # Only the DELETE request itself should be left.
+        captured_requests = self.hs.get_slow_request_capture().get_captured_requests()
+        self.assertEqual(
+            [c["servlet"] for c in captured_requests], ["SlowRequestsRestServlet"]
+        )
+
+    @unittest.override_config(
+        {
+            "slow_request_capture": {
+                "enabled": True,
+                "db_time_threshold": None,
+                "cpu_time_threshold": None,
+                "response_size_threshold": "1M",
+            }
+        }
+    )
+    def test_fast_requests_not_captured(self) -> None:
+        channel = self.make_request(
+            "GET",
+            "/_matrix/client/v3/profile/%s" % (self.admin_user,),
+            access_token=self.admin_user_tok,
+        )
+        self.assertEqual(200, channel.code, msg=channel.json_body)
+
+        channel = self.make_request("GET", self.url, access_token=self.admin_user_tok)
+        self.assertEqual(200, channel.code, msg=channel.json_body)
+        self.assertEqual(channel.json_body["requests"], [])
@@ -14,6 +14,7 @@
 
 import io
 from typing import Iterable, Optional
+from unittest.mock import patch
 
 from matrix_common.types.mxc_uri import MXCUri
 
@@ -261,6 +262,39 @@ class MediaRetentionTestCase(unittest.HomeserverTestCase):
             ],
         )
 
+    @override_config(
+        {
+            "media_retention": {
+                # Limit the remote media cache to two of the three cached media
+                "remote_media_max_size": 2
+            }
+        }
+    )
+    def test_remote_media_cache_max_size(self) -> None:
+        """
+        Tests that the least recently accessed entries are purged from the remote
+        media cache when it grows too large, while local media is unaffected.
+        """
+        # Advance a day, so that the retention rules are applied
+        self.reactor.advance(24 * 60 * 60)
+
+        # The quarantined media counts towards the size of the cache but can't be
+        # purged, so only the least recently accessed other media is removed.
+        self._assert_if_mxc_uris_purged(
+            purged=[
+                self.remote_not_recently_accessed_media,
+            ],
+            not_purged=[
+                self.remote_recently_accessed_media,
+                self.remote_not_recently_accessed_quarantined_media,
+                self.local_recently_accessed_media,
+                self.local_not_recently_accessed_media,
+                self.local_not_recently_accessed_quarantined_media,
+                self.local_not_recently_accessed_protected_media,
+                self.local_never_accessed_media,
+            ],
+        )
+
     def _assert_if_mxc_uris_purged(
         self, purged: Iterable[MXCUri], not_purged: Iterable[MXCUri]
     ) -> None:
@@ -292,3 +326,53 @@ class MediaRetentionTestCase(unittest.HomeserverTestCase):
             _assert_mxc_uri_purge_state(mxc_uri, expect_purged=True)
         for mxc_uri in not_purged:
             _assert_mxc_uri_purge_state(mxc_uri, expect_purged=False)
+
+
+class RemoteMediaToEvictTestCase(unittest.HomeserverTestCase):
+    def prepare(self, reactor: MemoryReactor, clock: Clock, hs: HomeServer) -> None:
+        self.store = hs.get_datastores().main
+
+    def _store_remote_media(self, media_id: str, last_access_ts: Optional[int]) -> None:
+        self.get_success(
+            self.store.store_cached_remote_media(
+                origin="remote.com",
+                media_id=media_id,
+                media_type="text/plain",
+                media_length=10,
+                time_now_ms=0,
+                upload_name="testfile.txt",
+                filesystem_id=media_id,
+            )
+        )
+        self.get_success(
+            self.store.db_pool.simple_update_one(
+                table="remote_media_cache",
+                keyvalues={"media_origin": "remote.com", "media_id": media_id},
+                updatevalues={"last_access_ts": last_access_ts},
+            )
+        )
+
+    @patch(
+        "synapse.storage.databases.main.media_repository.REMOTE_MEDIA_TO_EVICT_BATCH_SIZE",
+        2,
+    )
+    def test_get_remote_media_to_evict(self) -> None:
+        """The least recently accessed media is returned, across several batches,
+        with media that has never been accessed first.
+        """
+        self._store_remote_media("d", 300)
+        self._store_remote_media("b", 100)
+        self._store_remote_media("e", 400)
+        self._store_remote_media("a", None)
+        self._store_remote_media("c", 100)
+
+        to_evict = self.get_success(self.store.get_remote_media_to_evict(25))
+        self.assertEqual([media["media_id"] for media in to_evict], ["a", "b", "c"])
+
+        to_evict = self.get_success(self.store.get_remote_media_to_evict(0))
+        self.assertEqual(
+            [media["media_id"] for media in to_evict], ["a", "b", "c", "d", "e"]
+        )
+
+        to_evict = self.get_success(self.store.get_remote_media_to_evict(50))
+        self.assertEqual(to_evict, [])
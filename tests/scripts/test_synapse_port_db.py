@@ -0,0 +1,151 @@
+# Copyright 2023 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Any, List, Optional, Tuple
+from unittest.mock import Mock
+
+from twisted.test.proto_helpers import MemoryReactor
+
+from synapse._scripts.synapse_port_db import Store, _escape_copy_value
+from synapse.server import HomeServer
+from synapse.storage.database import LoggingTransaction
+from synapse.util import Clock
+
+from tests.unittest import HomeserverTestCase, TestCase, skip_unless
+from tests.utils import USE_POSTGRES_FOR_TESTS
+
+# The columns of the rows below: (id, flag, data, body).
+HEADERS = ["id", "flag", "data", "body"]
+
+ROWS: List[Tuple[Any, ...]] = [
+    (1, None, None, None),
+    (2, True, bytearray(b"\x00\x01\xff"), "plain"),
+    (3, False, bytearray(b"\\x\t\n"), "tab\there"),
+    (4, True, bytearray(), "new\nline"),
+    (5, False, bytearray(b"\r\n"), "carriage\rreturn"),
+    (6, None, bytearray(b"\\"), "back\\slash"),
+    (7, None, None, "\\N"),
+    (8, None, None, "\\\\t\t\n\r\\n"),
+    (9, None, None, ""),
+]
+
+_COPY_ESCAPES = {"b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t", "v": "\v"}
+
+
+def _parse_copy_line(line: str) -> List[Optional[str]]:
+    """Parse a line of postgres' `COPY` text format into its fields, following
+    https://www.postgresql.org/docs/current/sql-copy.html#id-1.9.3.55.9.2
+    """
+    fields: List[Optional[str]] = []
+    for raw_field in line.split("\t"):
+        if raw_field == "\\N":
+            fields.append(None)
+            continue
+
+        field = []
+        chars = iter(raw_field)
+        for char in chars:
+            if char == "\\":
+                # The escapes we produce never include octal or hex sequences,
+                # so any other escaped character stands for itself.
+                escaped = next(chars)
+                field.append(_COPY_ESCAPES.get(escaped, escaped))
+            else:
+                field.append(char)
+        fields.append("".join(field))
+
+    return fields
+
+
+def _copy_rows(rows: List[Tuple[Any, ...]]) -> List[Tuple[Any, ...]]:
+    """Format rows as `copy_many_txn` does, and parse them back into the values
+    postgres would store for the columns in `HEADERS`.
+    """
+    parsed_rows = []
+    for row in rows:
+        line = "\t".join(_escape_copy_value(col) for col in row)
+        # Rows are separated by newlines, so escaping must remove all of them.
+        assert "\n" not in line
+
+        row_id, flag, data, body = _parse_copy_line(line)
+        assert row_id is not None
+        parsed_rows.append(
+            (
+                int(row_id),
+                None if flag is None else {"t": True, "f": False}[flag],
+                # bytea input in hex format.
+                None if data is None else bytearray.fromhex(data[2:]),
+                body,
+            )
+        )
+    return parsed_rows
+
+
+class EscapeCopyValueTestCase(TestCase):
+    def test_round_trip(self) -> None:
+        """The COPY text of each row parses back to the row's values."""
+        self.assertEqual(_copy_rows(ROWS), ROWS)
+
+    def test_bytea_prefix(self) -> None:
+        """bytea is sent in hex format, with the backslash escaped for COPY."""
+        self.assertEqual(_escape_copy_value(b"\x01\xab"), "\\\\x01ab")
+        self.assertEqual(_escape_copy_value(memoryview(b"\x01")), "\\\\x01")
+
+
+@skip_unless(USE_POSTGRES_FOR_TESTS, "Requires Postgres")
+class CopyManyTxnTestCase(HomeserverTestCase):
+    """Check that `copy_many_txn` stores the same values as `insert_many_txn`."""
+
+    def prepare(self, reactor: MemoryReactor, clock: Clock, hs: HomeServer) -> None:
+        self.db_pool = hs.get_datastores().main.db_pool
+
+        def create_tables(txn: LoggingTransaction) -> None:
+            for table in ("port_db_insert", "port_db_copy"):
+                txn.execute(
+                    "CREATE TABLE %s (id INTEGER, flag BOOLEAN, data BYTEA, body TEXT)"
+                    % (table,)
+                )
+
+        self.get_success(self.db_pool.runInteraction("create_tables", create_tables))
+
+    def _select_rows(self, table: str) -> List[Tuple[Any, ...]]:
+        rows = self.get_success(
+            self.db_pool.execute(
+                "select_rows",
+                None,
+                "SELECT id, flag, data, body FROM %s ORDER BY id" % (table,),
+            )
+        )
+        return [
+            (row_id, flag, None if data is None else bytearray(data), body)
+            for row_id, flag, data, body in rows
+        ]
+
+    def test_copy_matches_insert(self) -> None:
+        # The methods don't use the store itself, so there's no need to set up
+        # the port_db `Store`.
+        store = Mock(spec=Store)
+
+        def insert_many(txn: LoggingTransaction) -> None:
+            Store.insert_many_txn(store, txn, "port_db_insert", HEADERS, ROWS)
+
+        def copy_many(txn: LoggingTransaction) -> None:
+            Store.copy_many_txn(store, txn, "port_db_copy", HEADERS, ROWS)
+
+        self.get_success(self.db_pool.runInteraction("insert_many", insert_many))
+        self.get_success(self.db_pool.runInteraction("copy_many", copy_many))
+
+        inserted = self._select_rows("port_db_insert")
+        self.assertEqual(inserted, ROWS)
+        self.assertEqual(self._select_rows("port_db_copy"), inserted)
@@ -299,6 +299,7 @@ class FakeSite:
     server_version_string = b"1"
     site_tag = "test"
     access_logger = logging.getLogger("synapse.access.http.fake")
+    slow_request_capture = None
 
     def __init__(
         self,
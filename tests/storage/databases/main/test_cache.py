@@ -0,0 +1,181 @@
+# Copyright 2023 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from typing import Any, List, Optional, Tuple
+from unittest.mock import patch
+
+from twisted.test.proto_helpers import MemoryReactor
+
+from synapse.replication.tcp.streams import CachesStream
+from synapse.server import HomeServer
+from synapse.storage.database import LoggingTransaction
+from synapse.storage.databases.main.cache import BULK_INVALIDATION_CACHE_NAME
+from synapse.util import Clock
+
+from tests.unittest import HomeserverTestCase, override_config, skip_unless
+from tests.utils import USE_POSTGRES_FOR_TESTS
+
+
+class BulkCacheInvalidationTestCase(HomeserverTestCase):
+    def prepare(self, reactor: MemoryReactor, clock: Clock, hs: HomeServer) -> None:
+        self.store = hs.get_datastores().main
+
+    def _stream_bulk_invalidation(
+        self, cache_name: str, key_tuples: List[tuple]
+    ) -> List[CachesStream.CachesStreamRow]:
+        """Send a bulk invalidation, and return the rows that would have been
+        written to the caches stream.
+        """
+        rows = []
+
+        def _send_invalidation_to_replication(
+            txn: LoggingTransaction, cache_name: str, keys: Optional[List[Any]]
+        ) -> None:
+            rows.append(CachesStream.CachesStreamRow(cache_name, keys, 0))
+
+        with patch.object(
+            self.store,
+            "_send_invalidation_to_replication",
+            _send_invalidation_to_replication,
+        ):
+            self.get_success(
+                self.store.db_pool.runInteraction(
+                    "test",
+                    self.store._send_invalidation_to_replication_bulk,
+                    cache_name,
+                    key_tuples,
+                )
+            )
+
+        return rows
+
+    @override_config(
+        {"experimental_features": {"replication_bulk_cache_invalidation": True}}
+    )
+    def test_bulk_invalidation_is_batched(self) -> None:
+        """Test that many invalidations of the same cache are sent as a small
+        number of rows, and that applying those rows invalidates exactly the
+        given entries.
+        """
+        user_ids = ["@user%i:test" % (i,) for i in range(60)]
+        for user_id in user_ids + ["@other:test"]:
+            self.store.get_user_by_id.prefill((user_id,), {"name": user_id})
+
+        rows = self._stream_bulk_invalidation(
+            "get_user_by_id", [(user_id,) for user_id in user_ids]
+        )
+
+        # The keys should be split into a batch of 50 and a batch of 10.
+        self.assertEqual(len(rows), 2)
+        for row in rows:
+            self.assertEqual(row.cache_func, BULK_INVALIDATION_CACHE_NAME)
+            assert row.keys is not None
+            self.assertEqual(row.keys[0], "get_user_by_id")
+            # The keys are stored in a `TEXT[]` column on postgres, so must
+            # all be strings.
+            for key in row.keys:
+                self.assertIsInstance(key, str)
+
+        self.store.process_replication_rows(CachesStream.NAME, "master", 1, rows)
+
+        # Caches with a single argument are keyed by that argument alone.
+        cache = self.store.get_user_by_id.cache
+        for user_id in user_ids:
+            self.assertIsNone(cache.get_immediate(user_id, None))
+        self.assertEqual(
+            cache.get_immediate("@other:test", None), {"name": "@other:test"}
+        )
+
+    @override_config(
+        {"experimental_features": {"replication_bulk_cache_invalidation": True}}
+    )
+    def test_bulk_invalidation_of_tree_cache_prefix(self) -> None:
+        """Test that a bulk invalidation can invalidate every entry under a
+        prefix of a tree cache.
+        """
+        for room_id in ("!a:test", "!b:test", "!c:test"):
+            for event_id in ("$1", "$2"):
+                self.store.have_seen_event.prefill((room_id, event_id), True)
+
+        rows = self._stream_bulk_invalidation(
+            "have_seen_event", [("!a:test",), ("!b:test", "$1")]
+        )
+        self.store.process_replication_rows(CachesStream.NAME, "master", 1, rows)
+
+        cache = self.store.have_seen_event.cache
+        self.assertIsNone(cache.get_immediate(("!a:test", "$1"), None))
+        self.assertIsNone(cache.get_immediate(("!a:test", "$2"), None))
+        self.assertIsNone(cache.get_immediate(("!b:test", "$1"), None))
+        self.assertTrue(cache.get_immediate(("!b:test", "$2"), None))
+        self.assertTrue(cache.get_immediate(("!c:test", "$1"), None))
+
+    def test_bulk_invalidation_disabled(self) -> None:
+        """Test that a row is sent per entry unless bulk invalidations are
+        enabled, as older workers don't understand the bulk rows.
+        """
+        rows = self._stream_bulk_invalidation(
+            "get_user_by_id", [("@a:test",), ("@b:test",)]
+        )
+        self.assertEqual(
+            [(row.cache_func, row.keys) for row in rows],
+            [("get_user_by_id", ("@a:test",)), ("get_user_by_id", ("@b:test",))],
+        )
+
+
+@skip_unless(USE_POSTGRES_FOR_TESTS, "Requires Postgres")
+class BulkCacheInvalidationStreamTestCase(HomeserverTestCase):
+    """Test bulk invalidations against the real caches stream, which is only
+    written to on postgres.
+    """
+
+    @override_config(
+        {"experimental_features": {"replication_bulk_cache_invalidation": True}}
+    )
+    def test_bulk_invalidation_round_trip(self) -> None:
+        store = self.hs.get_datastores().main
+        instance_name = self.hs.get_instance_name()
+
+        user_ids = ["@user%i:test" % (i,) for i in range(3)]
+        key_tuples: List[Tuple[Any, ...]] = [(user_id,) for user_id in user_ids]
+        for user_id in user_ids + ["@other:test"]:
+            store.get_user_by_id.prefill((user_id,), {"name": user_id})
+
+        from_token = store.get_cache_stream_token_for_writer(instance_name)
+        self.get_success(
+            store.db_pool.runInteraction(
+                "test",
+                store._send_invalidation_to_replication_bulk,
+                "get_user_by_id",
+                key_tuples,
+            )
+        )
+        to_token = store.get_cache_stream_token_for_writer(instance_name)
+
+        updates, _, limited = self.get_success(
+            store.get_all_updated_caches(instance_name, from_token, to_token, 100)
+        )
+        self.assertFalse(limited)
+        self.assertEqual(len(updates), 1)
+
+        _, row_data = updates[0]
+        row = CachesStream.ROW_TYPE(*row_data)
+        self.assertEqual(row.cache_func, BULK_INVALIDATION_CACHE_NAME)
+
+        store.process_replication_rows(CachesStream.NAME, "master", to_token, [row])
+
+        cache = store.get_user_by_id.cache
+        for user_id in user_ids:
+            self.assertIsNone(cache.get_immediate(user_id, None))
+        self.assertEqual(
+            cache.get_immediate("@other:test", None), {"name": "@other:test"}
+        )
@@ -226,6 +226,43 @@ class BackgroundUpdateTestCase(unittest.HomeserverTestCase):
         # check that an update has run
         self.update_handler.assert_called()
 
+    @override_config(
+        yaml.safe_load(
+            """
+            background_updates:
+                max_db_scheduling_time_ms: 10
+            """
+        )
+    )
+    def test_background_update_backs_off_when_database_busy(self) -> None:
+        """
+        Test that we sleep for longer between updates when transactions are
+        waiting a long time for a database connection
+        """
+        self.get_success(
+            self.store.db_pool.simple_insert(
+                "background_updates",
+                values={"update_name": "test_update", "progress_json": '{"my_key": 1}'},
+            )
+        )
+
+        # pretend that transactions are waiting 4x as long as the configured limit
+        self.store.db_pool.get_average_scheduling_time_ms = Mock(  # type: ignore[assignment]
+            return_value=40
+        )
+
+        self.update_handler.side_effect = self.update
+        self.update_handler.reset_mock()
+        self.updates.start_doing_background_updates()
+
+        # advance the reactor past the default sleep duration, but less than the
+        # scaled sleep duration (4000ms)
+        self.reactor.pump([1.5])
+        self.update_handler.assert_not_called()
+
+        self.reactor.pump([5])
+        self.update_handler.assert_called()
+
     @override_config(
         yaml.safe_load(
             """
@@ -230,6 +230,30 @@ class ReceiptTestCase(HomeserverTestCase):
         )
         self.assertEqual(res, {self.room_id1: event1_2_id, self.room_id2: event2_1_id})
 
+    def test_receipt_only_invalidates_own_unread_counts(self) -> None:
+        event_id = self.create_and_send_event(
+            self.room_id1, UserID.from_string(OTHER_USER_ID)
+        )
+
+        # Populate the unread count cache for both users.
+        for user_id in (OUR_USER_ID, OTHER_USER_ID):
+            self.get_success(
+                self.store.get_unread_event_push_actions_by_room_for_user(
+                    self.room_id1, user_id
+                )
+            )
+
+        self.get_success(
+            self.store.insert_receipt(
+                self.room_id1, ReceiptTypes.READ, OUR_USER_ID, [event_id], None, {}
+            )
+        )
+
+        # Only the counts of the user that sent the receipt should be invalidated.
+        cache = self.store.get_unread_event_push_actions_by_room_for_user.cache
+        self.assertIsNone(cache.get_immediate((self.room_id1, OUR_USER_ID), None))
+        self.assertIsNotNone(cache.get_immediate((self.room_id1, OTHER_USER_ID), None))
+
     def test_get_last_receipt_event_id_for_user(self) -> None:
         # Send some events into the first room
         event1_1_id = self.create_and_send_event(
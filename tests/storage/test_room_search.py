@@ -14,6 +14,7 @@
 
 from typing import List, Tuple
 from unittest.case import SkipTest
+from unittest.mock import patch
 
 from twisted.test.proto_helpers import MemoryReactor
 
@@ -372,3 +373,120 @@ class MessageSearchTest(HomeserverTestCase):
             raise SkipTest("Test only applies when sqlite is used as the database")
 
         self._check_test_cases(store, self.COMMON_CASES)
+
+
+class SearchResultsAndCountsTest(HomeserverTestCase):
+    """Check the results and counts of searches across several rooms."""
+
+    servlets = [
+        synapse.rest.admin.register_servlets_for_client_rest_resource,
+        login.register_servlets,
+        room.register_servlets,
+    ]
+
+    def prepare(
+        self, reactor: MemoryReactor, clock: Clock, homeserver: HomeServer
+    ) -> None:
+        self.store = homeserver.get_datastores().main
+
+        self.register_user("alice", "password")
+        access_token = self.login("alice", "password")
+
+        # Two rooms to search in, and one which is left out of the search.
+        self.room_ids = []
+        for messages in (
+            ["hello world", "hello again", "goodbye"],
+            ["hello there"],
+            ["hello from elsewhere"],
+        ):
+            room_id = self.helper.create_room_as("alice", tok=access_token)
+            for message in messages:
+                self.helper.send(room_id, message, tok=access_token)
+            self.room_ids.append(room_id)
+
+        self.searched_room_ids = self.room_ids[:2]
+
+    def test_search_msgs(self) -> None:
+        with patch.object(
+            self.store.db_pool, "execute", wraps=self.store.db_pool.execute
+        ) as execute:
+            result = self.get_success(
+                self.store.search_msgs(
+                    self.searched_room_ids, "hello", ["content.body"]
+                )
+            )
+
+        self.assertEqual(result["count"], 3)
+        self.assertCountEqual(
+            [r["event"].content["body"] for r in result["results"]],
+            ["hello world", "hello again", "hello there"],
+        )
+        self.assertCountEqual(
+            [
+                call.args[0]
+                for call in execute.call_args_list
+                if call.args[0].startswith("search_")
+            ],
+            ["search_msgs", "search_msgs_count"],
+        )
+
+    def test_search_rooms(self) -> None:
+        with patch.object(
+            self.store.db_pool, "execute", wraps=self.store.db_pool.execute
+        ) as execute:
+            result = self.get_success(
+                self.store.search_rooms(
+                    self.searched_room_ids, "hello", ["content.body"], 2
+                )
+            )
+
+        # The count covers all the matches, not just the first page.
+        self.assertEqual(result["count"], 3)
+        self.assertEqual(
+            [r["event"].content["body"] for r in result["results"]],
+            ["hello there", "hello again"],
+        )
+        self.assertCountEqual(
+            [
+                call.args[0]
+                for call in execute.call_args_list
+                if call.args[0].startswith("search_")
+            ],
+            ["search_rooms", "search_rooms_count"],
+        )
+
+        result = self.get_success(
+            self.store.search_rooms(
+                self.searched_room_ids,
+                "hello",
+                ["content.body"],
+                2,
+                pagination_token=result["results"][-1]["pagination_token"],
+            )
+        )
+        self.assertEqual(result["count"], 3)
+        self.assertEqual(
+            [r["event"].content["body"] for r in result["results"]], ["hello world"]
+        )
+
+    def test_many_rooms(self) -> None:
+        """Searches in many rooms only return results and counts for those rooms.
+
+        On Postgres the rooms are passed to the database as a single array, while on
+        SQLite the results are filtered afterwards.
+        """
+        room_ids = self.searched_room_ids + [
+            "!unknown%d:test" % (i,) for i in range(600)
+        ]
+
+        result = self.get_success(
+            self.store.search_msgs(room_ids, "hello", ["content.body"])
+        )
+        self.assertEqual(result["count"], 3)
+        self.assertEqual(len(result["results"]), 3)
+
+        result = self.get_success(
+            self.store.search_rooms(room_ids, "hello", ["content.body"], 10)
+        )
+        self.assertEqual(result["count"], 3)
+        self.assertEqual(len(result["results"]), 3)
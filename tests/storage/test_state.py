@@ -501,6 +501,35 @@ class StateStoreTestCase(HomeserverTestCase):
         self.assertEqual(is_all, True)
         self.assertDictEqual({(e5.type, e5.state_key): e5.event_id}, state_dict)
 
+    def test_current_state_cache_updated_by_delta(self) -> None:
+        """Persisting new state should update, rather than drop, the cached
+        current state of the room.
+        """
+        room_id = self.room.to_string()
+        e1 = self.inject_state_event(self.room, self.u_alice, EventTypes.Create, "", {})
+
+        # Populate the cache.
+        state_ids = self.get_success(self.store.get_partial_current_state_ids(room_id))
+        self.assertEqual(state_ids, {(EventTypes.Create, ""): e1.event_id})
+
+        e2 = self.inject_state_event(
+            self.room, self.u_alice, EventTypes.Name, "", {"name": "test room"}
+        )
+
+        expected = {
+            (EventTypes.Create, ""): e1.event_id,
+            (EventTypes.Name, ""): e2.event_id,
+        }
+        cached = self.store.get_partial_current_state_ids.cache.get_immediate(
+            room_id, None
+        )
+        self.assertEqual(cached, expected)
+
+        # ... and it should match what is in the database.
+        self.store.get_partial_current_state_ids.invalidate((room_id,))
+        state_ids = self.get_success(self.store.get_partial_current_state_ids(room_id))
+        self.assertEqual(state_ids, expected)
+
     def test_batched_state_group_storing(self) -> None:
         creation_event = self.inject_state_event(
             self.room, self.u_alice, EventTypes.Create, "", {}
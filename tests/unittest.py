@@ -292,6 +292,7 @@ class HomeserverTestCase(TestCase):
             server_version_string="1",
             max_request_body_size=4096,
             reactor=self.reactor,
+            slow_request_capture=self.hs.get_slow_request_capture(),
         )
 
         from tests.rest.client.utils import RestHelper
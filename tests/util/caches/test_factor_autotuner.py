@@ -0,0 +1,126 @@
+# Copyright 2023 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from typing import Dict
+from unittest.mock import patch
+
+from twisted.test.proto_helpers import MemoryReactor
+
+from synapse.config.cache import set_tuned_cache_factors
+from synapse.server import HomeServer
+from synapse.types import JsonDict
+from synapse.util import Clock
+from synapse.util.caches.factor_autotuner import CacheFactorAutotuner
+from synapse.util.caches.lrucache import LruCache
+
+from tests import unittest
+
+
+def _miss_and_evict(cache: LruCache, count: int) -> None:
+    """Look up and then insert `count` new keys, so that the cache misses and
+    (if it is full) evicts entries.
+    """
+    for i in range(count):
+        key = ("new", i)
+        cache.get(key)
+        cache.set(key, i)
+
+
+class CacheFactorAutotunerTestCase(unittest.HomeserverTestCase):
+    def default_config(self) -> JsonDict:
+        config = super().default_config()
+        config["caches"] = {
+            "global_factor": 1,
+            "per_cache_factors": {"pinned_cache": 1},
+            "factor_autotuning": {
+                "enabled": True,
+                "min_factor": 0.25,
+                "max_factor": 4,
+                "max_step": 0.5,
+            },
+        }
+        return config
+
+    def prepare(self, reactor: MemoryReactor, clock: Clock, hs: HomeServer) -> None:
+        hs.config.caches.resize_all_caches()
+        self.addCleanup(hs.config.caches.reset)
+
+        self.store = hs.get_datastores().main
+
+        self.caches: Dict[str, LruCache] = {
+            name: LruCache(10, name)
+            for name in ("busy_cache", "idle_cache", "pinned_cache")
+        }
+        for cache in self.caches.values():
+            cache.set("existing", 1)
+
+        # Only consider the caches created by the test.
+        patcher = patch(
+            "synapse.util.caches.factor_autotuner.caches_by_name", self.caches
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.autotuner = hs.get_cache_factor_autotuner()
+        self.get_success(self.autotuner.start())
+
+        # The first round only takes a snapshot of the metrics.
+        self.assertFalse(self.autotuner.tune_once())
+
+    def test_capacity_moved_to_busy_cache(self) -> None:
+        _miss_and_evict(self.caches["busy_cache"], 100)
+        _miss_and_evict(self.caches["pinned_cache"], 100)
+        self.caches["idle_cache"].get("existing")
+
+        self.assertTrue(self.autotuner.tune_once())
+
+        # The busy cache should have grown by `max_step`, at the expense of the
+        # idle cache. The pinned cache should be left alone.
+        self.assertEqual(self.caches["busy_cache"].max_size, 15)
+        self.assertEqual(self.caches["idle_cache"].max_size, 5)
+        self.assertEqual(self.caches["pinned_cache"].max_size, 10)
+
+        # The idle cache can't shrink below `min_factor`.
+        _miss_and_evict(self.caches["busy_cache"], 100)
+        self.assertTrue(self.autotuner.tune_once())
+        self.assertEqual(self.caches["busy_cache"].max_size, 17)
+        self.assertEqual(self.caches["idle_cache"].max_size, 2)
+
+        self.assertFalse(self.autotuner.tune_once())
+
+    def test_similarly_busy_caches(self) -> None:
+        """Capacity shouldn't be moved between caches which are similarly busy."""
+        _miss_and_evict(self.caches["busy_cache"], 100)
+        _miss_and_evict(self.caches["idle_cache"], 60)
+
+        self.assertFalse(self.autotuner.tune_once())
+        self.assertEqual(self.caches["busy_cache"].max_size, 10)
+        self.assertEqual(self.caches["idle_cache"].max_size, 10)
+
+    def test_factors_persisted(self) -> None:
+        _miss_and_evict(self.caches["busy_cache"], 100)
+        self.get_success(self.autotuner._tune_cache_factors())
+
+        self.assertEqual(
+            self.get_success(self.store.get_tuned_cache_factors()),
+            {"busy_cache": 1.5, "idle_cache": 0.5},
+        )
+
+        # Simulate a restart, by resetting the cache sizes and starting a new
+        # autotuner.
+        set_tuned_cache_factors({})
+        self.assertEqual(self.caches["busy_cache"].max_size, 10)
+
+        self.get_success(CacheFactorAutotuner(self.hs).start())
+        self.assertEqual(self.caches["busy_cache"].max_size, 15)
+        self.assertEqual(self.caches["idle_cache"].max_size, 5)
@@ -11,7 +11,8 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-
+import sys
+import threading
 from typing import Callable, Generator, cast
 
 import twisted.python.failure
@@ -21,6 +22,7 @@ from synapse.logging.context import (
     SENTINEL_CONTEXT,
     LoggingContext,
     PreserveLoggingContext,
+    RequestTrace,
     current_context,
     make_deferred_yieldable,
     nested_logging_context,
@@ -184,6 +186,31 @@ class LoggingContextTestCase(unittest.TestCase):
             self.assertEqual(nested_context.name, "foo-bar")
 
 
+class RequestTraceTestCase(unittest.TestCase):
+    def test_concurrent_cache_lookups(self) -> None:
+        """Cache lookups recorded from several threads at once are all counted."""
+        trace = RequestTrace()
+
+        # Switch threads as often as possible, to make lost updates likely.
+        old_switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        self.addCleanup(sys.setswitchinterval, old_switch_interval)
+
+        def record_lookups() -> None:
+            for i in range(10000):
+                trace.record_cache_lookup("cache", hit=i % 2 == 0)
+
+        threads = [threading.Thread(target=record_lookups) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        copy = trace.copy()
+        self.assertEqual(copy.cache_hits, {"cache": 20000})
+        self.assertEqual(copy.cache_misses, {"cache": 20000})
+
+
 # a function which returns a deferred which has been "called", but
 # which had a function which returned another incomplete deferred on
 # its callback list, so won't yet call any other new callbacks.
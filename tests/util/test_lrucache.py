@@ -13,12 +13,25 @@
 # limitations under the License.
 
 
-from typing import List, Tuple
+import itertools
+from typing import Any, List, Tuple
 from unittest.mock import Mock, patch
+from weakref import WeakSet
+
+from twisted.test.proto_helpers import MemoryReactor
 
 from synapse.metrics.jemalloc import JemallocStats
+from synapse.server import HomeServer
 from synapse.types import JsonDict
-from synapse.util.caches.lrucache import LruCache, setup_expire_lru_cache_entries
+from synapse.util import Clock, caches
+from synapse.util.caches import EvictionReason, lrucache
+from synapse.util.caches.lrucache import (
+    LruCache,
+    NativeLruCache,
+    UnsupportedKeyError,
+    expiry_ticks_over_budget,
+    setup_expire_lru_cache_entries,
+)
 from synapse.util.caches.treecache import TreeCache
 
 from tests import unittest
@@ -92,6 +105,27 @@ class LruCacheTestCase(unittest.HomeserverTestCase):
         cache: LruCache = LruCache(10, "mycache")
         self.assertEqual(cache.max_size, 100)
 
+    def test_invalidation_metrics(self) -> None:
+        cache: LruCache[Tuple[str, str], int] = LruCache(
+            10, "invalidation_metrics", cache_type=TreeCache
+        )
+        cache[("animal", "cat")] = 1
+        cache[("animal", "dog")] = 2
+        cache[("vehicles", "car")] = 3
+        cache[("vehicles", "bike")] = 4
+
+        assert cache.metrics is not None
+        evictions = cache.metrics.eviction_size_by_reason
+
+        cache.pop(("animal", "cat"))
+        self.assertEqual(evictions[EvictionReason.invalidation], 1)
+
+        cache.del_multi(("vehicles",))  # type: ignore[arg-type]
+        self.assertEqual(evictions[EvictionReason.invalidation], 3)
+
+        cache.clear()
+        self.assertEqual(evictions[EvictionReason.invalidation], 4)
+
 
 class LruCacheCallbacksTestCase(unittest.HomeserverTestCase):
     def test_get(self) -> None:
@@ -376,3 +410,225 @@ class MemoryEvictionTestCase(unittest.HomeserverTestCase):
         # the items should still be in the cache
         self.assertEqual(cache.get("key1"), 1)
         self.assertEqual(cache.get("key2"), 2)
+
+    @override_config(
+        {
+            "caches": {
+                "expiry_time": "1h",
+                "cache_autotuning": {
+                    "max_cache_memory_usage": "700M",
+                    "target_cache_memory_usage": "500M",
+                    "min_cache_ttl": "1m",
+                },
+            }
+        }
+    )
+    @patch("synapse.util.caches.lrucache.get_jemalloc_stats")
+    def test_memory_ttl_shrinks_gradually(self, jemalloc_interface: Mock) -> None:
+        mock_jemalloc_class = Mock(spec=JemallocStats)
+        jemalloc_interface.return_value = mock_jemalloc_class
+        mock_jemalloc_class.get_stat.return_value = 10000
+
+        setup_expire_lru_cache_entries(self.hs)
+        cache: LruCache[str, int] = LruCache(4, clock=self.hs.get_clock())
+
+        cache["key1"] = 1
+        self.reactor.advance(25 * 60)
+        cache["key2"] = 2
+
+        # Once memory usage goes over the maximum, only the oldest entries are
+        # expired at first: the TTL starts at half the age of the oldest entry.
+        mock_jemalloc_class.get_stat.return_value = 924288000
+        self.reactor.advance(15 * 60)
+        self.assertFalse(cache.contains("key1"))
+        self.assertTrue(cache.contains("key2"))
+
+        # ... and is reduced further while memory usage stays high.
+        self.reactor.advance(10)
+        self.assertFalse(cache.contains("key2"))
+
+        # Once memory usage is below the target, we stop expiring entries
+        # early.
+        mock_jemalloc_class.get_stat.return_value = 10000
+        self.reactor.advance(10)
+        cache["key3"] = 3
+        self.reactor.advance(60 * 6)
+        self.assertTrue(cache.contains("key3"))
+
+
+class IncrementalExpiryTestCase(unittest.HomeserverTestCase):
+    """Test that expiring entries is spread across reactor ticks."""
+
+    def default_config(self) -> JsonDict:
+        config = super().default_config()
+
+        config.setdefault("caches", {})["expiry_time"] = "30m"
+
+        return config
+
+    def prepare(
+        self, reactor: MemoryReactor, clock: Clock, homeserver: HomeServer
+    ) -> None:
+        # Only expire entries from the caches created by the test.
+        patcher = patch.object(lrucache, "EXPIRABLE_CACHES", WeakSet())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        # Every call to `perf_counter` after the start of a tick sees the
+        # budget exhausted, so only one batch of entries is expired per tick.
+        patcher = patch.object(lrucache, "time")
+        mock_time = patcher.start()
+        self.addCleanup(patcher.stop)
+        mock_time.perf_counter.side_effect = itertools.count()
+
+    def test_budget(self) -> None:
+        setup_expire_lru_cache_entries(self.hs)
+
+        expired: List[str] = []
+        small_cache: LruCache[int, int] = LruCache(1000, clock=self.hs.get_clock())
+        big_cache: LruCache[int, int] = LruCache(1000, clock=self.hs.get_clock())
+        for i in range(5):
+            small_cache.set(i, i, callbacks=[lambda: expired.append("small")])
+        for i in range(250):
+            big_cache.set(i, i, callbacks=[lambda: expired.append("big")])
+
+        ticks_over_budget = expiry_ticks_over_budget._value.get()
+        self.reactor.advance(31 * 60)
+
+        # Everything has been expired, the biggest cache first, but it took
+        # several ticks to do so.
+        self.assertEqual(len(big_cache), 0)
+        self.assertEqual(len(small_cache), 0)
+        self.assertEqual(expired, ["big"] * 250 + ["small"] * 5)
+        self.assertEqual(expiry_ticks_over_budget._value.get() - ticks_over_budget, 3)
+
+
+class NativeCacheMixin(unittest.HomeserverTestCase):
+    """Runs the tests of the test case it is mixed into with the entries of the
+    LruCaches stored in a `NativeLruCache`.
+    """
+
+    if NativeLruCache is None:
+        skip = "Synapse was built without the `native-lru-cache` Cargo feature"
+
+    def setUp(self) -> None:
+        patcher = patch.object(caches, "USE_NATIVE_LRU_CACHE", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        super().setUp()
+
+
+class NativeLruCacheTestCase(NativeCacheMixin, LruCacheTestCase):
+    def test_native(self) -> None:
+        cache: LruCache[str, str] = LruCache(1)
+        self.assertIsInstance(cache.cache, NativeLruCache)
+
+    def test_get_multi(self) -> None:
+        cache: LruCache[Tuple[str, str], str] = LruCache(4, cache_type=TreeCache)
+        cache[("animal", "cat")] = "mew"
+        cache[("animal", "dog")] = "woof"
+        cache[("vehicles", "car")] = "vroom"
+
+        items: Any = cache.get_multi(("animal",))
+        self.assertCountEqual(
+            list(items), [(("animal", "cat"), "mew"), (("animal", "dog"), "woof")]
+        )
+        self.assertIsNone(cache.get_multi(("plants",)))
+        self.assertTrue(cache.contains(("animal",)))  # type: ignore[arg-type]
+
+        # Removing the last entry under a prefix removes the prefix.
+        cache.pop(("vehicles", "car"))
+        self.assertFalse(cache.contains(("vehicles",)))  # type: ignore[arg-type]
+
+    def test_resize(self) -> None:
+        cache: LruCache[int, int] = LruCache(4)
+        for i in range(4):
+            cache[i] = i
+
+        cache.set_cache_factor(0.5)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get(1))
+        self.assertEqual(cache.get(3), 3)
+
+    def test_unsupported_key(self) -> None:
+        """Using a key which isn't made up of builtin types moves the entries into
+        the Python implementation.
+        """
+
+        class Key(str):
+            pass
+
+        m = Mock()
+        cache: LruCache[str, str] = LruCache(4)
+        cache.set("a", "A", callbacks=[m])
+        cache["b"] = "B"
+        native = cache.cache
+
+        cache[Key("c")] = "C"
+        self.assertNotIsInstance(cache.cache, NativeLruCache)
+        self.assertEqual(len(cache), 3)
+        self.assertEqual(cache.get("c"), "C")
+
+        # The order of the entries and their callbacks are kept.
+        cache["d"] = "D"
+        cache["e"] = "E"
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(m.call_count, 1)
+        self.assertEqual(cache.get("b"), "B")
+
+        # The native cache can't be used once its entries have been moved.
+        with self.assertRaises(UnsupportedKeyError):
+            native.get("b", None, False, 0)
+
+    def test_callbacks_deduplicated(self) -> None:
+        """Bound methods are deduplicated like the Python implementation does,
+        without comparing them with `==`.
+        """
+        m = Mock()
+        cache: LruCache[str, str] = LruCache(1)
+        cache.set("key", "value", callbacks=[m.callback])
+        cache.get("key", callbacks=[m.callback])
+        cache.get("key", callbacks=(m.callback,))
+
+        cache.invalidate("key")
+        self.assertEqual(m.callback.call_count, 1)
+
+    def test_removed_values_dropped_outside_cache(self) -> None:
+        """The values of removed entries are only dropped once the native cache
+        has returned, so that running their finalizers can't re-enter it.
+        """
+        cache: LruCache[str, Any] = LruCache(1)
+        finalized: List[bool] = []
+
+        class Value:
+            def __del__(self) -> None:
+                finalized.append(cache.get("missing") is None)
+
+        cache["key"] = Value()
+        cache["key"] = "replaced"
+        cache["key"] = Value()
+        cache["other"] = "evicted"
+
+        self.assertEqual(finalized, [True, True])
+
+
+class NativeLruCacheCallbacksTestCase(NativeCacheMixin, LruCacheCallbacksTestCase):
+    pass
+
+
+class NativeLruCacheSizedTestCase(NativeCacheMixin, LruCacheSizedTestCase):
+    def test_zero_size_drop_from_cache(self) -> None:
+        # Native caches don't have `_Node`s.
+        pass
+
+
+class NativeTimeEvictionTestCase(NativeCacheMixin, TimeEvictionTestCase):
+    pass
+
+
+class NativeMemoryEvictionTestCase(NativeCacheMixin, MemoryEvictionTestCase):
+    pass
+
+
+class NativeIncrementalExpiryTestCase(NativeCacheMixin, IncrementalExpiryTestCase):
+    pass